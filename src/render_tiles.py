@@ -0,0 +1,17 @@
+"""
+Rendering of the static map tiles (airports, runways, navaids, waypoints) ahead of time
+Run it after each update of the ontology : tiles are written in ./cache/tiles/<build>/ and served by the app.
+"""
+import sys
+
+from web_app.query_ontology import init_ontology_individuals, init_dataframes_individuals
+from web_app.static_tiles import init_static_tiles, MIN_TILE_ZOOM
+
+
+if __name__ == "__main__":
+    max_zoom = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    init_ontology_individuals()
+    init_dataframes_individuals()
+    tile_set = init_static_tiles()
+    n_tiles = tile_set.prerender(MIN_TILE_ZOOM, max_zoom)
+    print(f"{n_tiles} tiles rendered in {tile_set.folder}")
@@ -0,0 +1,166 @@
+"""
+Adaptive tiling of the FR24 area requests
+
+The FR24 feed returns at most FR24_FEED_LIMIT aircraft per request : in dense regions, a single
+request for the whole radar box silently misses aircraft. The box is covered by tiles of a
+quadtree of the world (node (z, x, y) : 360 / 2**z degrees of longitude, 180 / 2**z of latitude),
+a node being split in 4 when :
+- the aircraft of the previous poll within it exceed FR24_TARGET_FILL of the limit, or
+- a response for it was saturated (learned : the node stays split for the next polls,
+  and its children are fetched in the same poll), until it becomes sparse again.
+The tiles are fetched in parallel (FR24_FETCH_WORKERS requests at a time), and the results merged
+by flight ID, keeping the most recent contact of the aircraft seen in several tiles.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .flightradar.coordinates import Area, Point
+from .log_utils import *
+from .metrics import AREA_TILES
+
+
+FR24_FEED_LIMIT = int(os.environ.get('FR24_FEED_LIMIT', 1500))
+FR24_FETCH_WORKERS = int(os.environ.get('FR24_FETCH_WORKERS', 4))
+# Maximum number of requests for a poll
+FR24_MAX_TILES = int(os.environ.get('FR24_MAX_TILES', 32))
+# A tile is split above TARGET_FILL, a learned split is forgotten below MERGE_FILL (of the limit)
+FR24_TARGET_FILL = 0.6
+FR24_MERGE_FILL = 0.2
+# Smallest tiles : 360 / 2**12 ~ 0.09 degree
+MAX_DEPTH = 12
+# Positions of the fields in a raw FR24 feed entry (see flightradar.models.flight.FIELDS)
+LAT, LON, LAST_CONTACT = 1, 2, 10
+
+
+def node_bounds(node):
+    """ Returns the (south, north, west, east) bounds of a quadtree node
+    """
+    z, x, y = node
+    width, height = 360 / 2 ** z, 180 / 2 ** z
+    return -90 + y * height, -90 + (y + 1) * height, -180 + x * width, -180 + (x + 1) * width
+
+
+def intersection(a, b):
+    """ Returns the intersection of two (south, north, west, east) boxes, None if empty
+    """
+    s, n, w, e = max(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3])
+    if s >= n or w >= e:
+        return None
+    return s, n, w, e
+
+
+def children(node):
+    z, x, y = node
+    return [(z + 1, 2 * x + i, 2 * y + j) for j in (0, 1) for i in (0, 1)]
+
+
+def count_in(box, latitude, longitude):
+    s, n, w, e = box
+    return int(np.count_nonzero((latitude >= s) & (latitude < n) & (longitude >= w) & (longitude < e)))
+
+
+
+class AreaPlanner:
+    """
+    Plans and fetches the tiled requests of an area, learning the nodes to split
+    """
+    def __init__(self, limit=FR24_FEED_LIMIT, workers=FR24_FETCH_WORKERS, max_tiles=FR24_MAX_TILES):
+        self.limit = limit
+        self.max_tiles = max_tiles
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fr24-area")
+        self.split = set() # learned nodes to split
+
+
+    def covering(self, box, latitude, longitude, root=(0, 0, 0)):
+        """ Returns the tiles [(node, box of the request)] covering a box
+
+        Parameters
+        ----------
+        box : tuple
+            (south, north, west, east)
+        latitude, longitude : numpy.ndarray
+            Positions of the aircraft of the previous poll (density estimate)
+        root : tuple, optional
+            Node to cover, by default the whole world
+        """
+        tiles = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            clip = intersection(node_bounds(node), box)
+            if clip is None:
+                continue
+            kids = [k for k in children(node) if intersection(node_bounds(k), box) is not None]
+            dense = count_in(clip, latitude, longitude) > FR24_TARGET_FILL * self.limit
+            # A node with a single child in the box gives the same request as the child
+            if node[0] < MAX_DEPTH and (len(kids) == 1 or node in self.split or dense):
+                stack.extend(kids)
+            else:
+                tiles.append((node, clip))
+        return tiles
+
+
+    def fetch_tile(self, api, box):
+        s, n, w, e = box
+        return api.get_area_raw(Area(Point(n, w), Point(s, e)))
+
+
+    def fetch(self, api, box, latitude, longitude):
+        """ Gets the raw feed of a box, with as many tiled requests as needed
+
+        Parameters
+        ----------
+        api : flightradar.api.API
+            FR24 API
+        box : tuple
+            (south, north, west, east)
+        latitude, longitude : numpy.ndarray
+            Positions of the aircraft of the previous poll
+
+        Returns
+        -------
+        dict
+            Flight id -> raw feed entry (as API.get_area_raw, without the stats entries)
+        """
+        merged = {}
+        tiles = self.covering(box, latitude, longitude)
+        n_requests = 0
+        while tiles:
+            tiles = tiles[:max(self.max_tiles - n_requests, 0)]
+            if not tiles:
+                print_error("Area request truncated (FR24_MAX_TILES)", category='traffic', sample=20)
+                break
+            n_requests += len(tiles)
+            responses = self.pool.map(lambda tile: self.fetch_tile(api, tile[1]), tiles)
+
+            refine = []
+            for (node, clip), data in zip(tiles, responses):
+                flights = {k : f for k, f in data.items() if isinstance(f, list)}
+                for k, f in flights.items():
+                    previous = merged.get(k)
+                    if previous is None or f[LAST_CONTACT] > previous[LAST_CONTACT]:
+                        merged[k] = f
+                if len(flights) >= self.limit and node[0] < MAX_DEPTH:
+                    # Saturated : some aircraft are missing, split the node and fetch its children
+                    self.split.add(node)
+                    refine.append(node)
+            tiles = [t for node in refine for t in self.covering(box, latitude, longitude, root=node)]
+
+        self.forget_sparse(box, merged)
+        AREA_TILES.set(n_requests)
+        return merged
+
+
+    def forget_sparse(self, box, merged):
+        """ Forgets the learned splits of the nodes of a box now sparse
+        """
+        if not self.split:
+            return
+        latitude = np.array([f[LAT] for f in merged.values()], dtype=float)
+        longitude = np.array([f[LON] for f in merged.values()], dtype=float)
+        for node in list(self.split):
+            clip = intersection(node_bounds(node), box)
+            if clip is not None and count_in(clip, latitude, longitude) < FR24_MERGE_FILL * self.limit:
+                self.split.discard(node)
@@ -0,0 +1,102 @@
+"""
+Local prefix index of the flights seen in the recent traffic polls
+
+The identifiers of a flight (callsign, flight number, registration) are normalized (upper case,
+alphanumeric only : "F-GKXA" -> "FGKXA") and kept in a sorted list : a prefix query is a binary
+search followed by a scan of the matching keys. The sorted list is only rebuilt when the set of
+identifiers changed, lazily at the next query, and published as a single tuple.
+"""
+import time
+from bisect import bisect_left
+
+from .text_utils import normalize
+
+
+# Flights not seen for this duration (s) are dropped from the index
+RECENT_TIME = 600
+
+
+
+class PrefixIndex:
+    """
+    Identifiers of the recently seen flights, searchable by prefix
+    """
+    def __init__(self, max_age=RECENT_TIME):
+        self.max_age = max_age
+        self.flights = {} # flight id -> (keys, label, last seen)
+        self.sorted = ([], []) # (sorted keys, flight id of each key)
+        self.dirty = False
+
+
+    def __len__(self):
+        return len(self.flights)
+
+
+    def add(self, flight_id, identifiers, label, now=None):
+        """ Adds (or refreshes) a flight
+
+        Parameters
+        ----------
+        flight_id : str
+            ID of the flight returned by the searches
+        identifiers : list
+            Callsign, flight number, registration, ... (empty values are ignored)
+        label : str
+            String displayed in the GUI
+        now : float, optional
+            Time of the poll, by default the current time
+        """
+        keys = frozenset(k for k in map(normalize, identifiers) if k)
+        entry = self.flights.get(flight_id)
+        if entry is None or entry[0] != keys:
+            self.dirty = True
+        self.flights[flight_id] = (keys, label, time.time() if now is None else now)
+
+
+    def expire(self, now=None):
+        """ Drops the flights not seen since max_age
+        """
+        limit = (time.time() if now is None else now) - self.max_age
+        old = [flight_id for flight_id, entry in self.flights.items() if entry[2] < limit]
+        for flight_id in old:
+            del self.flights[flight_id]
+        if old:
+            self.dirty = True
+
+
+    def _rebuild(self):
+        self.expire()
+        pairs = sorted((key, flight_id) for flight_id, entry in self.flights.items() for key in entry[0])
+        self.sorted = ([p[0] for p in pairs], [p[1] for p in pairs])
+        self.dirty = False
+
+
+    def search(self, query, limit=10):
+        """ Returns the flights with an identifier starting with a query
+
+        Returns
+        -------
+        list
+            [{'str' : label, 'id' : flight ID}], at most limit flights
+        """
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if self.dirty:
+            self._rebuild()
+
+        keys, flight_ids = self.sorted
+        found = {}
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+            flight_id = flight_ids[i]
+            entry = self.flights.get(flight_id)
+            if entry is not None and flight_id not in found:
+                found[flight_id] = {'str' : entry[1], 'id' : flight_id}
+            i += 1
+        return list(found.values())
+
+
+
+# Index fed by the airspace handlers, queried by the AutocompleteHandler
+flight_search_index = PrefixIndex()
@@ -0,0 +1,106 @@
+"""
+Zoom-aware clustering of map points (waypoints, navaids)
+
+For each zoom level, the points are grouped in a grid of CELL_SIZE x CELL_SIZE screen pixels
+(Web Mercator, 256 px tiles like Leaflet). A query returns, for a box and a zoom level, one
+object per non-empty cell : the point itself if it is alone in its cell, else a cluster.
+The number of objects sent for a map view is then bounded whatever the density of points.
+"""
+import numpy as np
+
+
+TILE_SIZE = 256
+CELL_SIZE = 64
+MIN_ZOOM = 0
+# Above MAX_ZOOM, points are never clustered
+MAX_ZOOM = 12
+
+
+def lonlat_to_pixels(latitude, longitude, zoom):
+    """ Returns the Web Mercator pixel coordinates (x, y) of points at a zoom level
+    """
+    world_size = TILE_SIZE * 2 ** zoom
+    lat = np.radians(np.clip(latitude, -85.0511, 85.0511))
+    x = (np.asarray(longitude) + 180) / 360 * world_size
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * world_size
+    return x, y
+
+
+
+class ClusterIndex:
+    """
+    Grid clustering of the rows of a dataframe (with latitude and longitude columns), precomputed
+    for every zoom level (no clustering at all if max_zoom < min_zoom)
+    """
+    def __init__(self, df, name, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, cell_size=CELL_SIZE,
+                 latitude='latitude', longitude='longitude'):
+        self.name = name
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.df = df
+        self.records = df.to_dict('records')
+        self.latitude = df[latitude].to_numpy(dtype=float)
+        self.longitude = df[longitude].to_numpy(dtype=float)
+
+        # zoom -> (cell x, cell y, count, latitude, longitude, index of the first point)
+        self.levels = {}
+        for zoom in range(min_zoom, max_zoom + 1):
+            x, y = lonlat_to_pixels(self.latitude, self.longitude, zoom)
+            cx, cy = (x // cell_size).astype(np.int64), (y // cell_size).astype(np.int64)
+            keys = cx * (2 ** 31) + cy
+            _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+            self.levels[zoom] = (
+                cx[first], cy[first], counts,
+                np.bincount(inverse, weights=self.latitude) / counts,
+                np.bincount(inverse, weights=self.longitude) / counts,
+                first,
+            )
+
+
+    def query(self, s, n, w, e, zoom=None):
+        """ Returns the points and clusters within a box
+
+        Parameters
+        ----------
+        s, n, w, e : float
+            South, north, west and east bounds of the box
+        zoom : int, optional
+            Zoom level of the map, by default None (no clustering)
+
+        Returns
+        -------
+        list
+            Records of the single points, and cluster dicts
+            {'cluster' : True, 'id', 'count', 'latitude', 'longitude'} (position of the barycenter)
+        """
+        return [self.record(key) for key in self.query_keys(s, n, w, e, zoom)]
+
+
+    def query_keys(self, s, n, w, e, zoom=None):
+        """ Returns the keys of the points and clusters within a box (see query()) : the row
+        position for a single point, (zoom, cell number) for a cluster
+        """
+        if zoom is None or zoom > self.max_zoom:
+            mask = (self.latitude >= s) & (self.latitude <= n) & (self.longitude >= w) & (self.longitude <= e)
+            return np.flatnonzero(mask).tolist()
+
+        zoom = max(int(zoom), self.min_zoom)
+        _, _, counts, latitude, longitude, first = self.levels[zoom]
+        mask = (latitude >= s) & (latitude <= n) & (longitude >= w) & (longitude <= e)
+        return [int(first[i]) if counts[i] == 1 else (zoom, int(i)) for i in np.flatnonzero(mask)]
+
+
+    def record(self, key):
+        """ Returns the record of a point or of a cluster from its key
+        """
+        if not isinstance(key, tuple):
+            return self.records[key]
+        zoom, i = key
+        cx, cy, counts, latitude, longitude, _ = self.levels[zoom]
+        return {
+            'cluster' : True,
+            'id' : f"{self.name}-{zoom}-{cx[i]}-{cy[i]}",
+            'count' : int(counts[i]),
+            'latitude' : float(latitude[i]),
+            'longitude' : float(longitude[i]),
+        }
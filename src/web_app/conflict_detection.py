@@ -0,0 +1,249 @@
+"""
+Detection of the conflicts between the aircraft of the traffic store
+
+At each poll, the airborne aircraft are projected on a local plane (nm), and the box of the path of
+each aircraft during the lookahead (x, y, altitude) is hashed in a grid : only the pairs sharing a
+cell are candidates.
+For these pairs, the closest point of approach (CPA) within the lookahead is computed at once
+(straight and constant motion), and a pair is in conflict if its lateral distance at CPA is below
+CONFLICT_LATERAL_NM while its vertical distance at the same time is below CONFLICT_VERTICAL_FT.
+The detection runs in a thread at each poll (see ConflictDetector.submit) : its cost (a few ms for
+a thousand aircraft, tens of ms for several thousands in a dense area) never delays the emit loop.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .dead_reckoning import extrapolate_states
+from .geo_utils import NM_PER_DEG
+from .log_utils import *
+from .metrics import CONFLICT_ALERTS, CONFLICT_DETECTION_TIME
+
+
+CONFLICT_LATERAL_NM = float(os.environ.get('CONFLICT_LATERAL_NM', 5))
+CONFLICT_VERTICAL_FT = float(os.environ.get('CONFLICT_VERTICAL_FT', 1000))
+CONFLICT_LOOKAHEAD_MIN = float(os.environ.get('CONFLICT_LOOKAHEAD_MIN', 2))
+# Aircraft below this altitude (ft) or speed (kt) are considered on ground
+CONFLICT_MIN_ALTITUDE = 500
+CONFLICT_MIN_SPEED = 60
+# Speeds above this value (kt) are considered as errors
+CONFLICT_MAX_SPEED = 700
+
+# Size of the grid cells (nm, nm, ft)
+CONFLICT_CELL = (10, 10, 2000)
+# Keys of the cells : 21 bits per axis
+CELL_KEY = 2 ** 21
+# Pairs detailed in the log of the new alerts of a poll
+CONFLICT_LOG_PAIRS = 5
+
+
+def expand(counts):
+    """ Returns, for groups of given sizes, the group and the rank within the group of each element
+    """
+    group = np.repeat(np.arange(len(counts)), counts)
+    rank = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return group, rank
+
+
+def candidate_pairs(lower, upper, cell_size):
+    """ Returns the pairs of boxes sharing at least a cell of a grid
+
+    Each pair is only generated in the first cell they share (the cell of the lower corner of the
+    intersection of the boxes), so that no deduplication is needed.
+
+    Parameters
+    ----------
+    lower, upper : list
+        Lower and upper bounds of the boxes along each axis (numpy.ndarray)
+    cell_size : list
+        Size of the cells along each axis
+
+    Returns
+    -------
+    (numpy.ndarray, numpy.ndarray)
+        Indices i < j of the pairs
+    """
+    first = [np.floor(l / c).astype(np.int64) for l, c in zip(lower, cell_size)]
+    sizes = [np.floor(u / c).astype(np.int64) - f + 1 for u, c, f in zip(upper, cell_size, first)]
+
+    # One entry per (box, cell covered by the box)
+    box, rank = expand(np.prod(sizes, axis=0))
+    coords = []
+    cells = np.zeros(len(box), dtype=np.int64)
+    for f, size in zip(first, sizes):
+        coords.append(f[box] + rank % size[box])
+        cells = cells * CELL_KEY + coords[-1] + CELL_KEY // 2
+        rank = rank // size[box]
+    order = np.argsort(cells, kind='stable')
+    box = box[order]
+    coords = [c[order] for c in coords]
+    _, starts, counts = np.unique(cells[order], return_index=True, return_counts=True)
+
+    # The pairs a < b of entries of each cell (triangular numbering within the cell)
+    cell, k = expand(counts * (counts - 1) // 2)
+    b = ((1 + np.sqrt(1 + 8 * k)) // 2).astype(np.int64)
+    a = k - b * (b - 1) // 2
+    a, b = starts[cell] + a, starts[cell] + b
+    i, j = box[a], box[b]
+
+    # Keep the pair in its first common cell only
+    keep = np.ones(len(i), dtype=bool)
+    for f, c in zip(first, coords):
+        keep &= c[a] == np.maximum(f[i], f[j])
+    i, j = i[keep], j[keep]
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def detect_conflicts(states, lateral=CONFLICT_LATERAL_NM, vertical=CONFLICT_VERTICAL_FT,
+                     lookahead=CONFLICT_LOOKAHEAD_MIN):
+    """ Finds the pairs of aircraft in conflict within the lookahead
+
+    Parameters
+    ----------
+    states : np.ndarray
+        Structured array with latitude, longitude, heading (°), altitude (ft),
+        speed (kt) and vertical_speed (ft/min) fields
+    lateral : float, optional
+        Lateral separation (nm), by default CONFLICT_LATERAL_NM
+    vertical : float, optional
+        Vertical separation (ft), by default CONFLICT_VERTICAL_FT
+    lookahead : float, optional
+        Lookahead (min), by default CONFLICT_LOOKAHEAD_MIN
+
+    Returns
+    -------
+    dict
+        Arrays of the conflicts : 'i', 'j' (rows of the aircraft in states), 'time' (time to CPA, s),
+        'distance' (current lateral distance, nm), 'distance_cpa' (nm), 'vertical_cpa' (ft)
+    """
+    airborne = np.flatnonzero((states['altitude'] >= CONFLICT_MIN_ALTITUDE) & (states['speed'] >= CONFLICT_MIN_SPEED))
+    if len(airborne) < 2:
+        empty = np.zeros(0)
+        return {'i' : empty.astype(int), 'j' : empty.astype(int), 'time' : empty,
+                'distance' : empty, 'distance_cpa' : empty, 'vertical_cpa' : empty}
+    s = states[airborne]
+
+    # Local plane (nm), velocities in nm/min and ft/min
+    lat0 = np.radians(s['latitude'].mean())
+    x = (s['longitude'] - s['longitude'].mean()) * NM_PER_DEG * np.cos(lat0)
+    y = (s['latitude'] - s['latitude'].mean()) * NM_PER_DEG
+    speed = np.minimum(s['speed'], CONFLICT_MAX_SPEED) / 60
+    track = np.radians(s['heading'])
+    vx, vy = speed * np.sin(track), speed * np.cos(track)
+    z, vz = s['altitude'].astype(float), s['vertical_speed'].astype(float)
+
+    # Two aircraft can only be in conflict if the boxes of their paths during the lookahead,
+    # enlarged by half the separations, intersect : they share a cell
+    start, end = [x, y, z], [x + vx * lookahead, y + vy * lookahead, z + vz * lookahead]
+    margin = [lateral / 2, lateral / 2, vertical / 2]
+    i, j = candidate_pairs([np.minimum(a, b) - m for a, b, m in zip(start, end, margin)],
+                           [np.maximum(a, b) + m for a, b, m in zip(start, end, margin)], CONFLICT_CELL)
+
+    px, py, pz = x[j] - x[i], y[j] - y[i], z[j] - z[i]
+    rvx, rvy, rvz = vx[j] - vx[i], vy[j] - vy[i], vz[j] - vz[i]
+    v2 = rvx ** 2 + rvy ** 2
+    t = np.clip(-(px * rvx + py * rvy) / np.where(v2 > 0, v2, 1), 0, lookahead)
+    distance_cpa = np.hypot(px + rvx * t, py + rvy * t)
+    vertical_cpa = np.abs(pz + rvz * t)
+
+    conflict = np.flatnonzero((distance_cpa < lateral) & (vertical_cpa < vertical))
+    return {
+        'i' : airborne[i[conflict]],
+        'j' : airborne[j[conflict]],
+        'time' : t[conflict] * 60,
+        'distance' : np.hypot(px[conflict], py[conflict]),
+        'distance_cpa' : distance_cpa[conflict],
+        'vertical_cpa' : vertical_cpa[conflict],
+    }
+
+
+
+class ConflictDetector:
+    """
+    Conflict alerts of the traffic store, computed at each poll
+    """
+    def __init__(self, lateral=CONFLICT_LATERAL_NM, vertical=CONFLICT_VERTICAL_FT, lookahead=CONFLICT_LOOKAHEAD_MIN):
+        self.lateral = lateral
+        self.vertical = vertical
+        self.lookahead = lookahead
+        self.active = set() # pairs of flight IDs in conflict at the last poll
+        self.alerts = [] # alerts of the last detection completed
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conflicts")
+        self.pending = None
+
+
+    def submit(self, store, now=None):
+        """ Starts the detection on a snapshot of the traffic store, in the background.
+        The alerts are published in self.alerts once computed. Skipped if the previous
+        detection is still running
+
+        Returns
+        -------
+        bool
+            True if the detection was started
+        """
+        if self.pending is not None and not self.pending.done():
+            return False
+        flight_ids, states = store.view()
+        self.pending = self.pool.submit(self.detect_states, flight_ids, states, now)
+        return True
+
+
+    def detect(self, store, now=None):
+        """ Returns the conflicts between the aircraft of a traffic store
+
+        Parameters
+        ----------
+        store : TrafficStore
+            Live traffic
+        now : float, optional
+            If given, positions are extrapolated to this time (s since epoch), by default None
+
+        Returns
+        -------
+        list
+            Alerts sent to the client, by time to CPA : {'flights' : [icao24, icao24], 'time', 'distance',
+            'distance_cpa', 'vertical_cpa', 'latitude', 'longitude' (current middle of the pair)}
+        """
+        return self.detect_states(*store.view(), now)
+
+
+    def detect_states(self, flight_ids, states, now=None):
+        """ Returns the conflicts between aircraft (see detect), and publishes them in self.alerts
+        """
+        try:
+            with CONFLICT_DETECTION_TIME.time():
+                if now is not None:
+                    states = extrapolate_states(states, now)
+                c = detect_conflicts(states, self.lateral, self.vertical, self.lookahead)
+
+            alerts, active, new = [], set(), []
+            for k in np.argsort(c['time']):
+                i, j = c['i'][k], c['j'][k]
+                pair = frozenset((flight_ids[i], flight_ids[j]))
+                active.add(pair)
+                alert = {
+                    'flights' : [states['icao24'][i], states['icao24'][j]],
+                    'time' : round(float(c['time'][k])),
+                    'distance' : round(float(c['distance'][k]), 1),
+                    'distance_cpa' : round(float(c['distance_cpa'][k]), 1),
+                    'vertical_cpa' : round(float(c['vertical_cpa'][k])),
+                    'latitude' : float(states['latitude'][i] + states['latitude'][j]) / 2,
+                    'longitude' : float(states['longitude'][i] + states['longitude'][j]) / 2,
+                }
+                if pair not in self.active:
+                    new.append(alert)
+                alerts.append(alert)
+        except Exception as e:
+            print_error(f"Error conflict detection : {type(e).__name__} {str(e)}", category='conflict', exc_info=True)
+            return self.alerts
+
+        # One log line per poll with new alerts, detailing the most urgent ones
+        if new:
+            CONFLICT_ALERTS.inc(len(new))
+            print_event("Conflict alerts", category='conflict', new=len(new), active=len(alerts),
+                        alerts=new[:CONFLICT_LOG_PAIRS])
+        self.active = active
+        self.alerts = alerts
+        return alerts
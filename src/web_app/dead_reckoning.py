@@ -0,0 +1,48 @@
+"""
+Dead reckoning of the aircraft positions between two polls of the traffic data API
+
+"""
+import numpy as np
+
+from .geo_utils import NM_PER_DEG
+
+
+MAX_EXTRAPOLATION = 20 # Maximum extrapolation horizon in seconds
+
+
+def extrapolate_states(states, now, max_horizon=MAX_EXTRAPOLATION):
+    """ Predicts the position of every aircraft at a given time, from its last known
+    state (speed, heading, vertical speed), assuming a straight and constant motion
+
+    Parameters
+    ----------
+    states : np.ndarray
+        Structured array with latitude, longitude, heading (°), altitude (ft),
+        speed (kt), vertical_speed (ft/min) and last_contact (s) fields
+    now : float
+        Time of the prediction (s since epoch)
+    max_horizon : float, optional
+        The states are never extrapolated further than max_horizon seconds, by default MAX_EXTRAPOLATION
+
+    Returns
+    -------
+    np.ndarray
+        Copy of states with the predicted latitude, longitude and altitude
+    """
+    predicted = states.copy()
+    if len(states) == 0:
+        return predicted
+
+    dt = np.clip(now - states['last_contact'], 0, max_horizon)
+
+    dist = states['speed'] * dt / 3600 # nm
+    track = np.radians(states['heading'])
+    cos_lat = np.maximum(np.cos(np.radians(states['latitude'])), 1e-6)
+
+    predicted['latitude'] = states['latitude'] + dist * np.cos(track) / NM_PER_DEG
+    predicted['longitude'] = states['longitude'] + dist * np.sin(track) / (NM_PER_DEG * cos_lat)
+    predicted['altitude'] = np.maximum(states['altitude'] + np.round(states['vertical_speed'] * dt / 60), 0)
+
+    # Keep the longitude within [-180, 180[
+    predicted['longitude'] = (predicted['longitude'] + 180) % 360 - 180
+    return predicted
@@ -1,5 +1,6 @@
 import json
 import logging
+import time
 from urllib.request import urlopen, Request
 
 from .coordinates import Area
@@ -27,9 +28,23 @@ SEARCH_TYPES = {'airport': Airport,
                 'operator': Operator}
 
 
+def print_message(message, **fields):
+    print(message, *fields.values(), flush=True)
+
+
 class API:
-    """Main API class for FlightRadar24 interaction."""
-    def __init__(self):
+    """Main API class for FlightRadar24 interaction.
+
+    The hooks let the application observe the client without this package
+    depending on it:
+    on_request(endpoint, duration) is called after each request (seconds),
+    log(message, **fields) receives the verbose messages (printed by default),
+    log_error(message, **fields) receives the errors (printed by default).
+    """
+    def __init__(self, on_request=None, log=None, log_error=None):
+        self.on_request = on_request
+        self.log = log or print_message
+        self.log_error = log_error or print_message
         self.logger = logging.getLogger('API')
         self.logger.setLevel(logging.ERROR)
         log_handler = logging.StreamHandler()
@@ -40,13 +55,26 @@ class API:
 
     def get_area(self, area: Area, VERBOSE=False):
         """Returns all available flights within the specified area."""
+        return flights_to_json(self.parse_flights(
+            self.get_area_raw(area, VERBOSE=VERBOSE)))
+
+    def fetch_json(self, url: str, endpoint: str):
+        """Fetches and decodes a JSON response, reporting its duration to on_request."""
+        tic = time.perf_counter()
+        try:
+            req = Request(url, headers=HEADERS)
+            return json.loads(urlopen(req).read().decode())
+        finally:
+            if self.on_request is not None:
+                self.on_request(endpoint, time.perf_counter() - tic)
+
+    def get_area_raw(self, area: Area, VERBOSE=False):
+        """Returns the raw feed within the specified area
+        (flight id -> list of FIELDS, plus some stats entries)."""
         self.logger.info('Getting flights in [{}]'.format(area))
-        req = Request(FLIGHTS_API_PATTERN.format(*area),
-                      headers=HEADERS)
         if VERBOSE:
-            print(FLIGHTS_API_PATTERN.format(*area), flush=True)
-        return flights_to_json(self.parse_flights(
-            json.loads(urlopen(req).read().decode())))
+            self.log("FR24 area request", url=FLIGHTS_API_PATTERN.format(*area))
+        return self.fetch_json(FLIGHTS_API_PATTERN.format(*area), 'fr24/feed')
 
     @staticmethod
     def parse_flights(data: dict):
@@ -60,28 +88,31 @@ class API:
     def get_flight(self, flight_id: str, RAW=False, LINK=False) -> DetailedFlight:
         """Gets more detailed info about the specified flight."""
         self.logger.info('Getting info for flight {}'.format(flight_id))
-        req = Request(FLIGHT_API_PATTERN.format(flight_id),
-                      headers=HEADERS)
-        if LINK:
-            print(FLIGHT_API_PATTERN.format(flight_id))
+        if LINK or RAW:
+            self.log("FR24 flight request", url=FLIGHT_API_PATTERN.format(flight_id))
         if RAW:
-            print(FLIGHT_API_PATTERN.format(flight_id))
-            return json.loads(urlopen(req).read().decode())
+            return self.get_flight_json(flight_id)
         else:
             try:
-                return DetailedFlight.create(json.loads(urlopen(req).read().decode()))
+                return DetailedFlight.create(self.get_flight_json(flight_id))
             except KeyError as e:
-                print(f'KeyError: {e}')
-                print(FLIGHT_API_PATTERN.format(flight_id))
+                self.log_error("Incomplete FR24 flight details",
+                               error=repr(e), url=FLIGHT_API_PATTERN.format(flight_id))
+
+
+    def get_flight_json(self, flight_id: str) -> dict:
+        """Gets the raw detailed info about the specified flight."""
+        self.logger.info('Getting raw info for flight {}'.format(flight_id))
+        return self.fetch_json(FLIGHT_API_PATTERN.format(flight_id),
+                               'fr24/clickhandler')
 
 
     def get_search_results(self, query: str, limit: int):
         """Retrieves search results for specified query."""
         self.logger.info('Processing search request: {}'.format(query))
-        req = Request(SEARCH_API_PATTERN.format(query, limit),
-                      headers=HEADERS)
         # print(SEARCH_API_PATTERN.format(query, limit))
-        return json.loads(urlopen(req).read().decode())['results']
+        return self.fetch_json(SEARCH_API_PATTERN.format(query, limit),
+                               'fr24/search')['results']
 
     def search(self, query: str, limit: int = 10):
         return ((SEARCH_TYPES[result['type']].create_from_search(
@@ -23,6 +23,11 @@ TRACKS = {0: '1', 15: '2', 30: '3', 45: '4', 60: '5', 75: '6', 90: '7',
 
 class BriefFlight:
     """Class for storing info for all flights on the map."""
+    __slots__ = ('id', 'mode_s', 'lat', 'lon', 'track', 'alt', 'speed', 'squawk',
+                 'radar', 'model', 'registration', 'last_contact', 'origin',
+                 'destination', 'iata', 'undefined2', 'vertical_speed', 'icao',
+                 'undefined3', 'airline')
+
     def __init__(self, flight_id, lat, lon, model, registration, origin,
                  destination, iata, icao, airline, mode_s=None, track=None,
                  alt=None, speed=None, squawk=None, radar=None,
@@ -6,6 +6,9 @@ from math import sin, cos, sqrt, atan2, radians, asin
 import math
 
 
+NM_PER_DEG = 60
+
+
 def coord_to_dist(cur_lat, cur_long, dest_lat, dest_long):
     """ Computes the distance between two coordinates in nm
     """
@@ -16,6 +19,14 @@ def coord_to_dist(cur_lat, cur_long, dest_lat, dest_long):
     return 60*180/np.pi*np.arccos(np.sin(cur_lat)*np.sin(dest_lat)+np.cos(cur_lat)*np.cos(dest_lat)*np.cos(dest_long-cur_long))
 
 
+def equirectangular_dist(latitude, longitude, point_latitude, point_longitude):
+    """ Computes the approximate distances (nm) between points and a position (vectorized, for short distances)
+    """
+    dlon = (np.asarray(point_longitude) - longitude + 180) % 360 - 180
+    dlon = dlon * np.cos(np.radians((np.asarray(point_latitude) + latitude) / 2))
+    return np.hypot(dlon, np.asarray(point_latitude) - latitude) * NM_PER_DEG
+
+
 def heading_to_point(lat, lng, point_lat, point_lng):
     # https://www.igismap.com/formula-to-find-bearing-or-heading-angle-between-two-points-latitude-longitude/
     X = cos(point_lat) * sin(point_lng - lng)
@@ -0,0 +1,137 @@
+"""
+Persistent on-disk cache for near-static HTTP JSON responses
+
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+from .metrics import CACHE_REQUESTS, UPSTREAM_LATENCY
+
+
+CACHE_DIR = "./cache"
+
+
+class ResponseCache:
+    """
+    Cache of JSON responses stored in a SQLite file.
+    An entry is served without any request during its TTL. Once stale, it is
+    revalidated with a conditional request (ETag / Last-Modified) when the server
+    gave validators, and served again if the server answers 304 Not Modified.
+    """
+    def __init__(self, filename, ttl=86400, name="http"):
+        self.name = name
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL
+                )""")
+        self.hits = 0
+        self.misses = 0
+
+
+    @staticmethod
+    def make_key(url, params=None):
+        if not params:
+            return url
+        params = {k: v for k, v in params.items() if v is not None}
+        return f"{url}?{urlencode(sorted(params.items()))}"
+
+
+    def get(self, key):
+        """ Returns the entry (body, etag, last_modified, fetched_at) of a key, None if not cached
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        body, etag, last_modified, fetched_at = row
+        return json.loads(body), etag, last_modified, fetched_at
+
+
+    def put(self, key, body, etag=None, last_modified=None):
+        """ Stores a response (body can be None to remember a missing resource)
+        """
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(body), etag, last_modified, time.time()))
+
+
+    def touch(self, key):
+        """ Marks an entry as fresh again
+        """
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+
+
+    def fetch_json(self, session, url, params=None, ttl=None, timeout=None, label=None):
+        """ Gets a JSON response, from the cache if possible
+
+        Parameters
+        ----------
+        session : requests.Session
+            Session used for the request
+        url : str
+            URL of the resource
+        params : dict, optional
+            Query parameters, by default None
+        ttl : float, optional
+            Time to live of the entry in seconds, by default the TTL of the cache
+        timeout : float or tuple, optional
+            Timeout of the request, by default None
+        label : str, optional
+            Endpoint label of the request latency metric, by default the URL
+
+        Returns
+        -------
+        object
+            Decoded JSON, None if the resource does not exist or could not be fetched
+        """
+        ttl = self.ttl if ttl is None else ttl
+        key = self.make_key(url, params)
+        entry = self.get(key)
+
+        if entry is not None and time.time() - entry[3] < ttl:
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache=self.name, result='hit')
+            return entry[0]
+        self.misses += 1
+        CACHE_REQUESTS.inc(cache=self.name, result='miss')
+
+        headers = {}
+        if entry is not None:
+            if entry[1]:
+                headers['If-None-Match'] = entry[1]
+            if entry[2]:
+                headers['If-Modified-Since'] = entry[2]
+
+        with UPSTREAM_LATENCY.time(endpoint=label or url):
+            r = session.get(url, params=params, headers=headers, timeout=timeout)
+
+        if r.status_code == 304 and entry is not None:
+            self.touch(key)
+            return entry[0]
+        if r.status_code == 200:
+            body = r.json()
+            self.put(key, body, r.headers.get('ETag'), r.headers.get('Last-Modified'))
+            return body
+        if r.status_code == 404:
+            self.put(key, None)
+            return None
+
+        # Server error: serve the stale entry if any
+        return entry[0] if entry is not None else None
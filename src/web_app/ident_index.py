@@ -0,0 +1,107 @@
+"""
+Hashed index of the identifiers of the static objects (airports, waypoints, navaids)
+
+Every identifier (ICAO and IATA codes of the airports, idents of the waypoints and navaids) is
+normalized (see text_utils.normalize) and mapped to the objects carrying it, so that a lookup
+is a single dict access instead of a scan of the dataframes.
+Idents are not unique worldwide (the same waypoint or navaid ident exists in several countries, a
+navaid may share the IATA code of an airport) : a lookup can be restricted to some types of objects,
+the first type given being preferred, and the duplicates of a type are sorted by distance to a position.
+"""
+from .geo_utils import equirectangular_dist
+from .text_utils import normalize
+
+
+# Types of objects, by default order of preference
+IDENT_TYPES = ('airport', 'waypoint', 'navaid')
+# Shorter keys are placeholders ("\N", "-", ...)
+MIN_IDENT_LENGTH = 2
+
+
+
+class IdentifierIndex:
+    """
+    Objects of the static dataframes, by identifier
+    """
+    def __init__(self):
+        self.frames = {} # type -> dataframe
+        self.entries = {} # key -> [(type, row, latitude, longitude)]
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def add(self, df, object_type, columns, latitude='latitude', longitude='longitude'):
+        """ Adds the rows of a dataframe
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Static objects
+        object_type : str
+            Type of the objects (see IDENT_TYPES)
+        columns : list
+            Columns with an identifier of the objects
+        latitude, longitude : str, optional
+            Columns of the position, by default 'latitude' and 'longitude'
+        """
+        self.frames[object_type] = df
+        if len(df) == 0:
+            return
+        positions = zip(df[latitude].astype(float), df[longitude].astype(float))
+        identifiers = zip(*(df[c] for c in columns))
+        for row, ((lat, lon), idents) in enumerate(zip(positions, identifiers)):
+            for key in {normalize(i) for i in idents}:
+                if len(key) >= MIN_IDENT_LENGTH:
+                    self.entries.setdefault(key, []).append((object_type, row, lat, lon))
+
+
+    def ranked(self, ident, types=IDENT_TYPES, latitude=None, longitude=None):
+        """ Returns the objects with an identifier, by order of preference
+
+        Parameters
+        ----------
+        ident : str
+            Identifier (case and separators ignored)
+        types : tuple, optional
+            Accepted types of objects, by order of preference, by default IDENT_TYPES
+        latitude, longitude : float, optional
+            Position used to sort the objects of a same type, nearest first, by default None
+
+        Returns
+        -------
+        list
+            [(type, row in the dataframe of the type, distance (nm) or None)]
+        """
+        rank = {t : n for n, t in enumerate(types)}
+        candidates = [c for c in self.entries.get(normalize(ident), []) if c[0] in rank]
+        if latitude is None or longitude is None:
+            return [(c[0], c[1], None) for c in sorted(candidates, key=lambda c: rank[c[0]])]
+
+        distances = equirectangular_dist(latitude, longitude, [c[2] for c in candidates], [c[3] for c in candidates])
+        order = sorted(range(len(candidates)), key=lambda n: (rank[candidates[n][0]], distances[n]))
+        return [(candidates[n][0], candidates[n][1], float(distances[n])) for n in order]
+
+
+    def record(self, object_type, row, distance=None):
+        """ Returns the row of an object (dict), with its 'type' and, if known, 'distance' (nm)
+        """
+        record = self.frames[object_type].iloc[row].to_dict()
+        record['type'] = object_type
+        if distance is not None:
+            record['distance'] = distance
+        return record
+
+
+    def lookup_all(self, ident, types=IDENT_TYPES, latitude=None, longitude=None):
+        """ Returns all the objects with an identifier, by order of preference (see ranked)
+        """
+        return [self.record(*c) for c in self.ranked(ident, types, latitude, longitude)]
+
+
+    def lookup(self, ident, types=IDENT_TYPES, latitude=None, longitude=None):
+        """ Returns the preferred object with an identifier (see ranked), None if not found
+        """
+        ranked = self.ranked(ident, types, latitude, longitude)
+        return self.record(*ranked[0]) if ranked else None
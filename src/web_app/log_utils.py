@@ -1,11 +1,35 @@
 """
 Utils for logs
+
+The print_* functions do not write anything themselves : they put a record in a queue,
+emptied by a writer thread. Records are JSON lines (or colored text lines), filtered by
+level and by category.
+
+Configuration (environment variables) :
+    LOG_LEVEL    : minimum level (DEBUG, INFO, EVENT, WARNING, ERROR), by default EVENT
+    LOG_FORMAT   : 'json' (default) or 'text'
+    LOG_DISABLED : comma separated categories that are not logged, e.g. "airspace,follow"
+    LOG_FILE     : file where the logs are written, by default stdout
 """
 
-import time
+import atexit
 import functools
+import json
+import os
+import sys
+import time
+import traceback
 from datetime import datetime
 
+try:
+    # The writer must be a real OS thread, not a green thread blocking the eventlet hub on writes
+    from eventlet.patcher import original
+    _threading = original('threading')
+    _queue = original('queue')
+except ImportError:
+    import threading as _threading
+    import queue as _queue
+
 # ================== LOGGING UTILS ===================
 
 class bcolors:
@@ -19,18 +43,131 @@ class bcolors:
     BOLD = '\033[1m'
     UNDERLINE = '\033[4m'
 
+
+LEVELS = {'DEBUG' : 10, 'INFO' : 20, 'EVENT' : 25, 'WARNING' : 30, 'ERROR' : 40}
+LEVEL_COLORS = {'DEBUG' : '', 'INFO' : '', 'EVENT' : bcolors.OKBLUE, 'WARNING' : bcolors.WARNING, 'ERROR' : bcolors.FAIL}
+
+LOG_LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'EVENT').upper(), LEVELS['EVENT'])
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_DISABLED = {c.strip() for c in os.environ.get('LOG_DISABLED', '').split(',') if c.strip()}
+LOG_FILE = os.environ.get('LOG_FILE')
+LOG_QUEUE_SIZE = 10000
+
+
+
+class AsyncLogWriter:
+    """
+    Writer thread of the log records. Records are dropped (and counted) when the queue is full,
+    so that logging never blocks the caller.
+    """
+    def __init__(self, stream=None, fmt='json', maxsize=LOG_QUEUE_SIZE):
+        self.stream = stream
+        self.fmt = fmt
+        self.queue = _queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.thread = _threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+
+    def put(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except _queue.Full:
+            self.dropped += 1
+
+
+    def format(self, record):
+        if self.fmt == 'json':
+            return json.dumps(record, default=str)
+        extra = {k : v for k, v in record.items() if k not in ('ts', 'level', 'category', 'msg', 'traceback')}
+        line = f"{LEVEL_COLORS[record['level']]}[{datetime.fromtimestamp(record['ts'])}] [{record['category']}] {record['msg']}"
+        if extra:
+            line += f" {extra}"
+        if 'traceback' in record:
+            line += "\n" + record['traceback']
+        return line + (bcolors.ENDC if LEVEL_COLORS[record['level']] else "")
+
+
+    def run(self):
+        stream = self.stream or sys.stdout
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            lines = [self.format(record)]
+            # Write everything already queued at once
+            while not self.queue.empty():
+                record = self.queue.get_nowait()
+                if record is None:
+                    self.queue.put_nowait(None)
+                    break
+                lines.append(self.format(record))
+            if self.dropped:
+                lines.append(self.format({'ts' : time.time(), 'level' : 'WARNING', 'category' : 'log',
+                    'msg' : "Log records dropped (queue full)", 'dropped' : self.dropped}))
+                self.dropped = 0
+            stream.write("\n".join(lines) + "\n")
+            stream.flush()
+
+
+    def close(self):
+        self.put(None)
+        self.thread.join(timeout=2)
+
+
+
+writer = AsyncLogWriter(open(LOG_FILE, 'a') if LOG_FILE else None, fmt=LOG_FORMAT)
+atexit.register(writer.close)
+
+_sample_counters = {}
+
+def log(level, *args, category='app', sample=1, exc_info=False, **fields):
+    """ Queues a log record
+
+    Parameters
+    ----------
+    level : str
+        Level of the record (DEBUG, INFO, EVENT, WARNING, ERROR)
+    *args
+        Parts of the message, joined with spaces
+    category : str, optional
+        Category of the record (can be disabled with LOG_DISABLED), by default 'app'
+    sample : int, optional
+        Only one record out of sample is logged for this category and level, by default 1
+    exc_info : bool, optional
+        Adds the traceback of the exception being handled, by default False
+    **fields
+        Additional fields of the record
+    """
+    if LEVELS[level] < LOG_LEVEL or category in LOG_DISABLED:
+        return
+    if sample > 1:
+        key = (category, level)
+        count = _sample_counters.get(key, 0)
+        _sample_counters[key] = count + 1
+        if count % sample:
+            return
+        fields['sampled'] = sample
+
+    record = {'ts' : time.time(), 'level' : level, 'category' : category,
+              'msg' : " ".join(str(a) for a in args)}
+    record.update(fields)
+    if exc_info:
+        record['traceback'] = traceback.format_exc()
+    writer.put(record)
+
+
 def print_info(*args, **kwargs):
-    # print(args, flush=True)
-    return
+    log('INFO', *args, **kwargs)
 
 def fprint(*args, **kwargs):
-    print(args, flush=True, **kwargs)
+    log('DEBUG', *args, **kwargs)
 
 def print_error(*args, **kwargs):
-    print(f"{bcolors.FAIL}[{datetime.now()}]: {args}{bcolors.ENDC}", flush=True)
+    log('ERROR', *args, **kwargs)
 
 def print_event(*args, **kwargs):
-    print(f"{bcolors.OKBLUE}[{datetime.now()}]:{args}{bcolors.ENDC}", flush=True)
+    log('EVENT', *args, **kwargs)
 
 
 def timeit(func):
@@ -40,6 +177,6 @@ def timeit(func):
         value = func(*args, **kwargs)
         toc = time.perf_counter()
         elapsed_time = toc - tic
-        print_event(f"Elapsed time: {elapsed_time:0.4f} seconds")
+        print_event(f"Elapsed time of {func.__name__}", category='timing', elapsed=round(elapsed_time, 4))
         return value
     return wrapper_timer
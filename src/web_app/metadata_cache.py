@@ -0,0 +1,119 @@
+"""
+Persistent cache of the static data of the followed flights
+
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .http_cache import CACHE_DIR
+from .metrics import CACHE_REQUESTS
+
+
+DAY = 86400
+
+# Time to live (s) of each static field
+FIELD_TTL = {
+    # Aircraft
+    'registration' : 30 * DAY,
+    'model' : 30 * DAY,
+    'model_text' : 30 * DAY,
+    # Route
+    'callsign' : 6 * 3600,
+    'origin' : 6 * 3600,
+    'origin_icao' : 6 * 3600,
+    'destination' : 6 * 3600,
+    'destination_icao' : 6 * 3600,
+    # Times
+    'time_scheduled' : 3600,
+    'time_estimated' : 60,
+}
+
+AIRCRAFT_FIELDS = ['registration', 'model', 'model_text']
+ROUTE_FIELDS = ['origin', 'origin_icao', 'destination', 'destination_icao']
+TIME_FIELDS = ['time_scheduled', 'time_estimated']
+
+
+class FlightMetadataCache:
+    """
+    Static data (aircraft, route, times) stored in a SQLite file, one value per (key, field).
+    The key is the icao24 address for aircraft data, the callsign for routes, or the flight ID
+    of the data source when it identifies a single flight (FR24).
+    """
+    def __init__(self, filename=os.path.join(CACHE_DIR, "flight_metadata.sqlite"), field_ttl=FIELD_TTL):
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        self.field_ttl = field_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT,
+                    field TEXT,
+                    value TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (key, field)
+                )""")
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key, fields, allow_stale=()):
+        """ Returns the fresh values of some fields
+
+        Parameters
+        ----------
+        key : str
+            icao24, callsign or flight ID
+        fields : list
+            Fields requested
+        allow_stale : list, optional
+            Fields whose value is returned even if stale, by default ()
+
+        Returns
+        -------
+        dict or None
+            Values of the fields, None if one of them is missing or stale
+        """
+        if not key:
+            return None
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT field, value, updated_at FROM metadata WHERE key = ? AND field IN ({','.join('?' * len(fields))})",
+                (key, *fields)
+            ).fetchall()
+
+        now = time.time()
+        values = {field : json.loads(value) for field, value, updated_at in rows
+                  if field in allow_stale or now - updated_at < self.field_ttl.get(field, 0)}
+
+        if len(values) < len(fields):
+            self.misses += 1
+            CACHE_REQUESTS.inc(cache='flight_metadata', result='miss')
+            return None
+        self.hits += 1
+        CACHE_REQUESTS.inc(cache='flight_metadata', result='hit')
+        return values
+
+
+    def put(self, key, values):
+        """ Stores the values of some fields
+
+        Parameters
+        ----------
+        key : str
+            icao24, callsign or flight ID
+        values : dict
+            Field -> value
+        """
+        if not key:
+            return
+
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?)",
+                [(key, field, json.dumps(value), now) for field, value in values.items()])
@@ -0,0 +1,162 @@
+"""
+Lightweight metrics (counters, gauges, histograms) exposed in the Prometheus text format
+
+"""
+import bisect
+import threading
+import time
+
+
+# Latency buckets (s)
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+# Size buckets (bytes)
+SIZE_BUCKETS = (1e3, 5e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6)
+# Buckets of the in-process computations (seconds)
+COMPUTE_BUCKETS = (1e-4, 2.5e-4, 5e-4, .001, .0025, .005, .01, .025, .05, .1)
+
+registry = []
+
+
+def escape_label(value):
+    """ Escapes a label value (backslash, double quote and line feed) for the text format
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+
+class Metric:
+    """
+    Base class of the metrics. Values are stored per tuple of label values
+    """
+    type_name = ""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self):
+        """ Returns the list of (name, labels string, value)
+        """
+        return [(self.name, format_labels(self.label_names, key), value) for key, value in list(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines += [f"{name}{labels} {value}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """ Context manager observing the duration of its block
+        """
+        return Timer(self, labels)
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in list(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                samples.append((f"{self.name}_bucket", format_labels(self.label_names, key, [('le', le)]), cumulative))
+            samples.append((f"{self.name}_sum", format_labels(self.label_names, key), total))
+            samples.append((f"{self.name}_count", format_labels(self.label_names, key), count))
+        return samples
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.tic = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.tic, **self.labels)
+        return False
+
+
+def render_metrics():
+    """ Returns all the metrics in the Prometheus text exposition format
+    """
+    return "\n".join(metric.render() for metric in registry) + "\n"
+
+
+
+# =======================================================================
+# ===================== APP METRICS =====================================
+# =======================================================================
+
+UPSTREAM_LATENCY = Histogram('flight_assistant_upstream_request_seconds',
+    "Latency of the requests to the traffic data APIs", labels=('endpoint',))
+POLL_LAG = Histogram('flight_assistant_poll_loop_lag_seconds',
+    "Delay of the worker loops compared to their nominal period", labels=('worker',))
+EMIT_PAYLOAD_SIZE = Histogram('flight_assistant_emit_payload_bytes',
+    "Size of the Socket.IO messages (sampled)", labels=('event',), buckets=SIZE_BUCKETS)
+NLU_PARSE_TIME = Histogram('flight_assistant_nlu_parse_seconds',
+    "Time to parse a transcript with the NLU engine")
+QUERY_TIME = Histogram('flight_assistant_query_seconds',
+    "Time to answer a user query", labels=('intent',))
+CACHE_REQUESTS = Counter('flight_assistant_cache_requests_total',
+    "Lookups in the caches", labels=('cache', 'result'))
+AREA_TILES = Gauge('flight_assistant_area_tiles',
+    "Number of FR24 requests of the last traffic poll")
+SOURCE_REQUESTS = Counter('flight_assistant_traffic_source_requests_total',
+    "Requests to the traffic sources (ok, error, timeout, hedged)", labels=('source', 'result'))
+SOURCE_LATENCY = Histogram('flight_assistant_traffic_source_seconds',
+    "Time to get the traffic of a poll from a source", labels=('source',))
+SOURCE_COVERAGE = Gauge('flight_assistant_traffic_source_aircraft',
+    "Aircraft of the last poll seen by a source, and selected from it", labels=('source', 'kind'))
+CONFLICT_DETECTION_TIME = Histogram('flight_assistant_conflict_detection_seconds',
+    "Time to detect the conflicts of a poll", buckets=COMPUTE_BUCKETS)
+CONFLICT_ALERTS = Counter('flight_assistant_conflict_alerts_total',
+    "New conflict alerts")
+FOCUS_CHANGES = Counter('flight_assistant_focus_changes_total',
+    "Focus changes, published or superseded by a newer one", labels=('result',))
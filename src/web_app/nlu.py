@@ -4,6 +4,7 @@ Functions for Natural Language Understanding with Snips NLU
 
 from .query_ontology import *
 from .log_utils import *
+from .metrics import NLU_PARSE_TIME
 
 from snips_nlu import SnipsNLUEngine
 
@@ -19,11 +20,11 @@ def load_nlu_engine():
     """ Loads a persisted NLU Engine (trained with train_nlu_engine.py)
     """
     global nlu_engine
-    fprint("Loading NLU engine...", end=" ")
+    print_event("Loading NLU engine...", category='startup')
     with open(nlu_engine_filename,'rb') as f:
         engine_bytes = f.read()
     nlu_engine = SnipsNLUEngine.from_byte_array(engine_bytes)
-    fprint("NLU engine loaded !")
+    print_event("NLU engine loaded !", category='startup')
 
 
 
@@ -43,10 +44,11 @@ def process_transcript(transcript):
     """
     global nlu_engine
     query = ""
-    print_event("SPEECH RECOGNITION", transcript)
+    print_event("Speech recognition", category='nlu', transcript=transcript)
 
     question = transcript.lower()
-    parsing = nlu_engine.parse(question)
+    with NLU_PARSE_TIME.time():
+        parsing = nlu_engine.parse(question)
     intent_name = parsing['intent']['intentName']
     proba = parsing['intent']['probability']
     slots = parsing['slots']
@@ -90,7 +92,7 @@ def process_transcript(transcript):
             for i, arg in enumerate(slots):
                 query += f"?{arg['value']['value']}"
     
-    print_event(parsing)
-    print_event("NLU", intent_name, proba, query)
+    print_info("NLU parsing", category='nlu', parsing=parsing)
+    print_event("NLU", category='nlu', intent=intent_name, probability=proba, query=query)
 
     return query
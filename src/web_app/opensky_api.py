@@ -22,14 +22,22 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import calendar
+import codecs
+import json
 import logging
+import os
 import pprint
 import requests
+import threading
+from requests.adapters import HTTPAdapter
 
 from datetime import datetime
 from collections import defaultdict
 import time
 
+from .http_cache import ResponseCache, CACHE_DIR
+from .metrics import UPSTREAM_LATENCY
+
 logger = logging.getLogger('opensky_api')
 logger.addHandler(logging.NullHandler())
 
@@ -60,17 +68,25 @@ class StateVector(object):
             "velocity", "heading", "vertical_rate", "sensors",
             "geo_altitude", "squawk", "spi", "position_source"]
 
+    __slots__ = keys
+
     # We are not using namedtuple here as state vectors from the server might be extended; zip() will ignore additional
-    #  entries in this case
+    #  entries in this case. Slots avoid one dict per vector for large responses
     def __init__(self, arr):
         """ arr is the array representation of a state vector as received by the API """
-        self.__dict__ = dict(zip(StateVector.keys, arr))
+        for key in StateVector.keys:
+            setattr(self, key, None)
+        for key, value in zip(StateVector.keys, arr):
+            setattr(self, key, value)
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in StateVector.keys}
 
     def __repr__(self):
-        return "StateVector(%s)" % repr(self.__dict__.values())
+        return "StateVector(%s)" % repr(self.as_dict().values())
 
     def __str__(self):
-        return pprint.pformat(self.__dict__, indent=4)
+        return pprint.pformat(self.as_dict(), indent=4)
 
 
 class OpenSkyStates(object):
@@ -93,45 +109,131 @@ class OpenSkyStates(object):
         return pprint.pformat(self.__dict__, indent=4)
 
 
+def iter_states(chunks):
+    """ Incrementally decodes the "states" array of a /states/all response.
+
+    :param chunks: iterable of bytes, as returned by requests' Response.iter_content()
+    :return: generator of the state vectors (as lists), yielded as soon as they are fully received
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    in_states = False
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+
+        if not in_states:
+            key = buffer.find('"states"')
+            if key < 0:
+                continue
+            start = key + len('"states"')
+            while start < len(buffer) and buffer[start] in ' \t\r\n:':
+                start += 1
+            if start == len(buffer):
+                continue
+            if buffer[start] != '[':
+                return  # "states": null
+            buffer = buffer[start + 1:]
+            in_states = True
+
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                state, pos_end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break  # State not fully received yet
+            yield state
+            pos = pos_end
+        buffer = buffer[pos:]
+
+
 class OpenSkyApi(object):
     """
     Main class of the OpenSky Network API. Instances retrieve data from OpenSky via HTTP
     """
-    def __init__(self, username=None, password=None):
+    # Client-side rate limits are shared by all the instances using the same account
+    _last_requests = defaultdict(lambda: 0)
+    _rate_lock = threading.Lock()
+
+    # Near-static endpoints cached on disk
+    _static_cache = None
+    STATIC_TTL = {"routes": 6 * 3600, "airports": 30 * 86400, "metadata": 7 * 86400}
+
+    def __init__(self, username=None, password=None, timeout=(3.05, 10), max_wait=10):
         """ Create an instance of the API client. If you do not provide username and password requests will be
         anonymous which imposes some limitations.
 
         :param username: an OpenSky username (optional)
         :param password: an OpenSky password for the given username (optional)
+        :param timeout: (connect, read) timeout of the requests in seconds
+        :param max_wait: maximum time in seconds a request is queued because of the rate limit
         """
         if username is not None:
             self._auth = (username, password)
         else:
             self._auth = ()
         self._api_url = "https://opensky-network.org/api"
-        self._last_requests = defaultdict(lambda: 0)
+        self._timeout = timeout
+        self._max_wait = max_wait
+        self._sleep = time.sleep
+
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=1))
+        if len(self._auth) == 2:
+            self._session.auth = self._auth
+
+        if OpenSkyApi._static_cache is None:
+            OpenSkyApi._static_cache = ResponseCache(os.path.join(CACHE_DIR, "opensky.sqlite"), name="opensky")
 
     def _get_json(self, url_post, callee, params=None):
-        r = requests.get("{0:s}{1:s}".format(self._api_url, url_post),
-                         auth=self._auth, params=params, timeout=None)
+        with UPSTREAM_LATENCY.time(endpoint="osn" + url_post):
+            r = self._session.get("{0:s}{1:s}".format(self._api_url, url_post),
+                                  params=params, timeout=self._timeout)
         if r.status_code == 200:
-            self._last_requests[callee] = time.time()
+            key = self._rate_key(callee)
+            with OpenSkyApi._rate_lock:
+                # Never move back a slot reserved by a queued request
+                self._last_requests[key] = max(self._last_requests[key], time.time())
             return r.json()
         else:
             logger.debug("Response not OK. Status {0:d} - {1:s}".format(r.status_code, r.reason))
         return None
 
-    def _check_rate_limit(self, time_diff_noauth, time_diff_auth, func):
-        """ impose client-side rate limit
+    def _get_static_json(self, url_post, kind, params=None):
+        return OpenSkyApi._static_cache.fetch_json(
+            self._session, "{0:s}{1:s}".format(self._api_url, url_post),
+            params=params, ttl=self.STATIC_TTL[kind], timeout=self._timeout, label="osn/" + kind)
+
+    def _rate_key(self, func):
+        return (self._auth[0] if self._auth else None, getattr(func, "__name__", func))
+
+    def _wait_rate_limit(self, time_diff_noauth, time_diff_auth, func):
+        """ queue the request until the client-side rate limit allows it. Requests are served in order.
 
         :param time_diff_noauth: the minimum time between two requests in seconds if not using authentication
         :param time_diff_auth: the minimum time between two requests in seconds if using authentication
         :param func: the API function to evaluate
+        :return: True when the request can be sent, False if it would have to wait more than max_wait
         """
-        if len(self._auth) < 2:
-            return abs(time.time() - self._last_requests[func]) >= time_diff_noauth
-        else:
-            return abs(time.time() - self._last_requests[func]) >= time_diff_auth
+        time_diff = time_diff_noauth if len(self._auth) < 2 else time_diff_auth
+        key = self._rate_key(func)
+        with OpenSkyApi._rate_lock:
+            now = time.time()
+            slot = max(now, self._last_requests[key] + time_diff)
+            if slot - now > self._max_wait:
+                return False
+            # Reserve the slot, then wait for it without holding the lock
+            self._last_requests[key] = slot
+        if slot > now:
+            self._sleep(slot - now)
+        return True
 
     @staticmethod
     def _check_lat(lat):
@@ -152,7 +254,7 @@ class OpenSkyApi(object):
         :param bbox: optionally retrieve state vectors within a bounding box. The bbox must be a tuple of exactly four values [min_latitude, max_latitude, min_longitude, max_latitude] each in WGS84 decimal degrees.
         :return: OpenSkyStates if request was successful, None otherwise
         """
-        if not self._check_rate_limit(10, 5, self.get_states):
+        if not self._wait_rate_limit(10, 5, self.get_states):
             logger.debug("Blocking request due to rate limit")
             return None
 
@@ -181,6 +283,55 @@ class OpenSkyApi(object):
             return OpenSkyStates(states_json)
         return None
 
+    def find_state(self, callsign, chunk_size=65536):
+        """ Scan the most recent state vectors of the whole world and return the first one with the given callsign.
+        The response is decoded while it is downloaded, and the download stops at the first match.
+
+        :param callsign: callsign of the vehicle (without trailing spaces)
+        :param chunk_size: size in bytes of the chunks read from the response
+        :return: StateVector if found, None otherwise
+        """
+        # Same endpoint (and rate limit) as get_states
+        if not self._wait_rate_limit(10, 5, self.get_states):
+            logger.debug("Blocking request due to rate limit")
+            return None
+
+        with UPSTREAM_LATENCY.time(endpoint="osn/states/all (stream)"), \
+                self._session.get("{0:s}/states/all".format(self._api_url),
+                                  params={"extended": "true"}, stream=True, timeout=self._timeout) as r:
+            if r.status_code != 200:
+                logger.debug("Response not OK. Status {0:d} - {1:s}".format(r.status_code, r.reason))
+                return None
+
+            for state in iter_states(r.iter_content(chunk_size)):
+                if state[1] is not None and state[1].strip() == callsign:
+                    return StateVector(state)
+        return None
+
+    def get_route(self, callsign):
+        """ Retrieve the route (origin and destination ICAO codes) flown under a callsign. Cached on disk.
+
+        :param callsign: callsign of the vehicle
+        :return: dict with a "route" list if found, None otherwise
+        """
+        return self._get_static_json("/routes", "routes", params={"callsign": callsign})
+
+    def get_airport(self, icao):
+        """ Retrieve the description of an airport. Cached on disk.
+
+        :param icao: ICAO code of the airport
+        :return: dict if found, None otherwise
+        """
+        return self._get_static_json("/airports/", "airports", params={"icao": icao})
+
+    def get_aircraft_metadata(self, icao24):
+        """ Retrieve the metadata (registration, model, ...) of an aircraft. Cached on disk.
+
+        :param icao24: ICAO24 address of the transmitter in hex string representation
+        :return: dict if found, None otherwise
+        """
+        return self._get_static_json("/metadata/aircraft/icao/{0:s}".format(icao24), "metadata")
+
     def get_my_states(self, time_secs=0, icao24=None, serials=None):
         """ Retrieve state vectors for your own sensors. Authentication is required for this operation.
         If time = 0 the most recent ones are taken. Optional filters may be applied for ICAO24 addresses and sensor
@@ -193,7 +344,7 @@ class OpenSkyApi(object):
         """
         if len(self._auth) < 2:
             raise Exception("No username and password provided for get_my_states!")
-        if not self._check_rate_limit(0, 1, self.get_my_states):
+        if not self._wait_rate_limit(0, 1, self.get_my_states):
             logger.debug("Blocking request due to rate limit")
             return None
         t = time_secs
@@ -0,0 +1,104 @@
+"""
+Sampling profiler, started and stopped at runtime (see the /admin/profiler view)
+
+A real OS thread periodically samples the stacks of the other threads. With eventlet, all the
+green threads run in the main thread : the sampled stack is the one of the green thread running
+at this time (e.g. AirspaceBackgroundWorker.do_work), or the hub when the server is idle.
+The result is given in the collapsed stack format of flamegraph.pl / speedscope.
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+try:
+    # The sampler must not be a green thread : it would only run when the hub is idle
+    from eventlet.patcher import original
+    _threading = original('threading')
+    _sleep = original('time').sleep
+except ImportError:
+    import threading as _threading
+    _sleep = time.sleep
+
+
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.005))
+# Stop automatically after this duration (s), if the profiler is forgotten
+PROFILER_MAX_DURATION = float(os.environ.get('PROFILER_MAX_DURATION', 300))
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Stack sampling profiler of all the threads of the process
+    """
+    def __init__(self, interval=PROFILER_INTERVAL, max_duration=PROFILER_MAX_DURATION):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks = Counter()
+        self.n_samples = 0
+        self.started_at = None
+        self.thread = None
+        self.running = False
+
+
+    def start(self):
+        """ Starts sampling (samples of a previous run are discarded)
+        """
+        if self.running:
+            return
+        self.stacks = Counter()
+        self.n_samples = 0
+        self.started_at = time.time()
+        self.running = True
+        self.thread = _threading.Thread(target=self.run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+
+    def run(self):
+        own_id = _threading.get_ident()
+        while self.running:
+            if time.time() - self.started_at > self.max_duration:
+                self.running = False
+                break
+            names = {t.ident : t.name for t in _threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.n_samples += 1
+            _sleep(self.interval)
+
+
+    def status(self):
+        return {
+            'running' : self.running,
+            'interval' : self.interval,
+            'samples' : self.n_samples,
+            'duration' : (time.time() - self.started_at) if self.started_at else 0,
+        }
+
+
+    def collapsed(self):
+        """ Returns the samples in the collapsed stack format ("frame1;frame2;frame3 count" lines)
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+
+profiler = SamplingProfiler()
@@ -5,9 +5,13 @@ import numpy as np
 import pandas as pd
 from csv import reader
 from .geo_utils import *
+from .log_utils import *
+from .cluster_index import ClusterIndex
+from .ident_index import IdentifierIndex
+from .traffic_index import k_nearest_traffic, DIRECTIONS
 from geopy.geocoders import Nominatim
-import operator
 import requests
+import time
 from datetime import datetime
 
 
@@ -19,16 +23,12 @@ mgr = owm.weather_manager()
 
 location_manager = Nominatim(user_agent="GetLoc")
 
-def fprint(*args, **kwargs):
-    print(args, flush=True, **kwargs)
-
-
 def init_ontology_individuals():
     """ Initializes the ontology instance from the file
     """
-    fprint("Loading ontology...", end=" ")
+    print_event("Loading ontology...", category='startup')
     onto_individuals = owl.get_ontology(filename_onto_individuals).load()
-    fprint("Ontology loaded !")
+    print_event("Ontology loaded !", category='startup')
     return onto_individuals
 
 
@@ -39,6 +39,23 @@ df_all_navaids = None
 df_all_waypoints = None
 df_all_checklists = None
 
+# Zoom-aware clustering of the map points (airports and runways are never clustered)
+airports_index = None
+runways_index = None
+navaids_index = None
+waypoints_index = None
+# Airports, waypoints and navaids by identifier, runways and frequencies by airport ICAO code
+ident_index = None
+runways_by_airport = {}
+frequencies_by_airport = {}
+
+# Checklist content kept in memory, keyed by (model, type)
+checklists_content = {}
+checklists_files = {}
+checklists_mtime = {}
+CHECKLIST_RELOAD_PERIOD = 5 # Time (s) between two checks of the checklist files (see watch_checklists)
+TRAFFIC_AROUND_DISTANCE = 20 # Maximum distance (nm) of the traffic given by the trafficAround queries
+
 
 
 def init_dataframes_individuals():
@@ -46,17 +63,47 @@ def init_dataframes_individuals():
     from ontology
     """
     global df_all_airports, df_all_runways, df_all_frequencies, df_all_navaids, df_all_waypoints, df_all_checklists
-    fprint("Loading individuals", end=" ")
+    global airports_index, runways_index, navaids_index, waypoints_index
+    global ident_index, runways_by_airport, frequencies_by_airport
+    print_event("Loading individuals", category='startup')
     df_all_airports = init_df_all_airports()
     df_all_runways = init_df_all_runways()
     df_all_frequencies = init_df_all_frequencies()
     df_all_navaids = init_df_all_navaids()
     df_all_waypoints = init_df_all_waypoints()
     df_all_checklists = init_df_all_checklists()
-    fprint("Individuals loaded !")
+    init_checklists_content()
+    airports_index = ClusterIndex(df_all_airports, 'airports', max_zoom=-1)
+    runways_index = ClusterIndex(df_all_runways, 'runways', max_zoom=-1, latitude='beg_latitude', longitude='beg_longitude')
+    navaids_index = ClusterIndex(df_all_navaids, 'navaids')
+    waypoints_index = ClusterIndex(df_all_waypoints, 'waypoints')
+    ident_index = IdentifierIndex()
+    ident_index.add(df_all_airports, 'airport', ['icao', 'iata'])
+    ident_index.add(df_all_waypoints, 'waypoint', ['ident'])
+    ident_index.add(df_all_navaids, 'navaid', ['ident'])
+    runways_by_airport = group_records(df_all_runways, 'airport')
+    frequencies_by_airport = group_records(df_all_frequencies, 'icao')
+    print_event("Individuals loaded !", category='startup')
     return
 
 
+def group_records(df, column):
+    """ Returns the records of a dataframe grouped by the value of a column
+    """
+    groups = {}
+    for record in df.to_dict('records'):
+        groups.setdefault(record[column], []).append(record)
+    return groups
+
+
+def find_airport(ident):
+    """ Returns the airport (dict) with an ICAO or IATA code, None if not found
+    """
+    if not ident or ident_index is None:
+        return None
+    return ident_index.lookup(ident, types=('airport',))
+
+
 
 def init_df_all_airports():
     """ Initializes the airport dataframe from the Airport ontology's object
@@ -216,7 +263,7 @@ def get_near_airports(surrounding_data, center, RADIUS=100):
         s, n, w, e = get_box_from_center(center, RADIUS)
         surrounding_data['list_airports'] = query_map_near_airports(s, n, w, e)
     except Exception as e:
-        print_error("Error querying airports", e)
+        print_error("Error querying airports", e, category='ontology')
         surrounding_data['list_airports'] = []
 
 
@@ -236,7 +283,7 @@ def get_near_runways(surrounding_data, center, RADIUS=100):
         s, n, w, e = get_box_from_center(center, RADIUS)
         surrounding_data['list_runways'] = query_map_near_runways(s, n, w, e)
     except Exception as e:
-        print_error("Error querying runways", e)
+        print_error("Error querying runways", e, category='ontology')
         surrounding_data['list_runways'] = []
 
 
@@ -258,10 +305,10 @@ def get_near_frequencies(surrounding_data):
             event_bug = e
     
     if event_bug != "":
-        print_error("Error querying frequencies", event_bug)
+        print_error("Error querying frequencies", event_bug, category='ontology')
 
 
-def get_near_navaids(surrounding_data, center, RADIUS=100):
+def get_near_navaids(surrounding_data, center, RADIUS=100, zoom=None):
     """ Updates the dictionary message sent to the client with navaid data
 
     Parameters
@@ -272,16 +319,18 @@ def get_near_navaids(surrounding_data, center, RADIUS=100):
         Center of the radar
     RADIUS : float, optional
         Radius of the radar
+    zoom : int, optional
+        Zoom level of the map, to cluster the navaids (no clustering if None)
     """    
     try:
         s, n, w, e = get_box_from_center(center, RADIUS)
-        surrounding_data['list_navaids'] = query_map_near_navaids(s, n, w, e) 
+        surrounding_data['list_navaids'] = query_map_near_navaids(s, n, w, e, zoom)
     except Exception as e:
-        print_error("Error querying navaids", e)
+        print_error("Error querying navaids", e, category='ontology')
         surrounding_data['list_navaids'] = []
 
 
-def get_near_waypoints(surrounding_data, center, RADIUS=100):
+def get_near_waypoints(surrounding_data, center, RADIUS=100, zoom=None):
     """ Updates the dictionary message sent to the client with waypoint data
 
     Parameters
@@ -292,12 +341,14 @@ def get_near_waypoints(surrounding_data, center, RADIUS=100):
         Center of the radar
     RADIUS : float, optional
         Radius of the radar
+    zoom : int, optional
+        Zoom level of the map, to cluster the waypoints (no clustering if None)
     """    
     try:
         s, n, w, e = get_box_from_center(center, RADIUS)
-        surrounding_data['list_waypoints'] = query_map_near_waypoints(s, n, w, e)
+        surrounding_data['list_waypoints'] = query_map_near_waypoints(s, n, w, e, zoom)
     except Exception as e:
-        print_error("Error querying navaids", e)
+        print_error("Error querying waypoints", e, category='ontology')
         surrounding_data['list_waypoints'] = []
 
 
@@ -322,29 +373,18 @@ def query_map_near_runways(s, n, w, e):
 
 
 def query_map_near_frequencies(current_icao):
-    # Returns the frequencies within a box
-    df_associated_frequencies = df_all_frequencies.loc[
-        df_all_frequencies['icao'] == current_icao
-    ]
-    return df_associated_frequencies.to_dict('records')
+    # Returns the frequencies of an airport
+    return list(frequencies_by_airport.get(current_icao, []))
 
 
-def query_map_near_navaids(s, n, w, e):
-    # Returns the navaids within a box
-    df_near_navaids = df_all_navaids.loc[
-        df_all_navaids['longitude'].between(w, e) & \
-        df_all_navaids['latitude'].between(s, n)
-    ]
-    return df_near_navaids.to_dict('records')
+def query_map_near_navaids(s, n, w, e, zoom=None):
+    # Returns the navaids within a box (clustered if a zoom level is given)
+    return navaids_index.query(s, n, w, e, zoom)
 
 
-def query_map_near_waypoints(s, n, w, e):
-    # Returns the waypoints within a box
-    df_near_waypoints = df_all_waypoints.loc[
-        df_all_waypoints['longitude'].between(w, e) & \
-        df_all_waypoints['latitude'].between(s, n)
-    ]
-    return df_near_waypoints.to_dict('records')
+def query_map_near_waypoints(s, n, w, e, zoom=None):
+    # Returns the waypoints within a box (clustered if a zoom level is given)
+    return waypoints_index.query(s, n, w, e, zoom)
 
 
 
@@ -353,6 +393,14 @@ def query_map_near_waypoints(s, n, w, e):
 # ================ USER QUERIES ========================================================
 # ======================================================================================
 
+# Query types handled by process_query
+QUERY_TYPES = (
+    "departureAirport", "arrivalAirport", "runwaysAtArrival", "runwaysAtAirport", "frequencyAtArrival",
+    "frequencyAtAirport", "nearestAirport", "currentParam", "runwaysAtNearestAirport", "nearestTrafic",
+    "trafficAround", "lengthNearestRunway", "eta", "weatherAtAirport", "metarAtAirport", "weatherAtLocation",
+    "weatherAtWaypoint", "checklist", "clear",
+)
+
 def process_query(query_type, arg1, arg2, flight_data):
     """
     flight_data : {
@@ -455,7 +503,7 @@ def process_query(query_type, arg1, arg2, flight_data):
 
     
     elif query_type == "nearestTrafic":
-        response_dict = query_nearest_flight(arg1, flight_data.get('latitude'), flight_data.get('longitude'), flight_data.get('callsign'))
+        response_dict = query_nearest_flight(arg1, flight_data)
         if response_dict.get('status'):
             response_str = f"The nearest trafic is {response_dict.get('nearest_callsign')} at {response_dict.get('distance_nearest'):.2f} nm, \
                 at heading {response_dict.get('heading_nearest'):.0f}°."
@@ -463,6 +511,21 @@ def process_query(query_type, arg1, arg2, flight_data):
             response_str = f"There is no trafic around you."
 
 
+    elif query_type == "trafficAround":
+        response_dict = query_traffic_around(arg1, flight_data, arg2)
+        where = response_dict['direction']
+        if response_dict.get('status'):
+            list_str = []
+            for t in response_dict['list_traffic']:
+                level = "same level" if abs(t['relative_altitude']) < 100 else \
+                    f"{abs(t['relative_altitude'])} ft {'above' if t['relative_altitude'] > 0 else 'below'}"
+                trend = "closing" if t['closure_rate'] > 0 else "moving away"
+                list_str.append(f"{t['callsign']} at {t['clock']} o'clock, {t['distance']:.1f} nm, {level}, {trend} at {abs(t['closure_rate']):.0f} kt")
+            response_str = f"Traffic {where} you : " + " ; ".join(list_str) + "."
+        else:
+            response_str = f"There is no trafic {where} you."
+
+
     elif query_type == "lengthNearestRunway":
         nearest_airport_dict = query_nearest_airport(flight_data.get('latitude'), flight_data.get('longitude'))
         icao_nearest_airport = nearest_airport_dict.get('ICAO')
@@ -525,7 +588,7 @@ def process_query(query_type, arg1, arg2, flight_data):
 
 
     elif query_type == "weatherAtWaypoint":
-        response_dict = query_specific_weather_at_waypoint(arg1, arg2)
+        response_dict = query_specific_weather_at_waypoint(arg1, arg2, flight_data.get('latitude'), flight_data.get('longitude'))
         if response_dict.get('status'):
             response_str = f"The {response_dict.get('weather_name')} at {response_dict.get('waypoint_name')} is {response_dict.get('weather_value_format')}."
         else:
@@ -565,59 +628,38 @@ def process_query(query_type, arg1, arg2, flight_data):
 # ============================== TRAFIC STATIC ========================================
 
 def query_runways_at_airport(icao):
-    response = list(owl.default_world.sparql(
-        f"""
-            PREFIX pie:<http://www.semanticweb.org/clement/ontologies/2020/1/final-archi#>
-            SELECT ?name ?rw_id ?length
-            WHERE {{
-                ?Airport pie:AirportICAOCode ?airport_icao .
-                ?Airport pie:AirportName ?name .
-                ?Airport pie:HasRunway ?Runway .
-                ?Runway pie:RunwayIdentifier ?rw_id .
-                ?Runway pie:RunwayLength ?length .
-                FILTER regex(?airport_icao, "{icao}", "i")
-            }}
-        """))
+    airport = find_airport(icao)
+    if airport is None:
+        return {"status": False}
 
-    if len(response) == 0:
+    runways = runways_by_airport.get(airport['icao'], [])
+    if len(runways) == 0:
         return {"status": False}
 
-    list_runways = [(i[1], i[2]) for i in response]
-    name = response[0][0]
+    list_runways = [(runway['ident'], runway['length']) for runway in runways]
     return {
         "status": True, 
-        "icao": icao, 
-        "name": name, 
+        "icao": airport['icao'], 
+        "name": airport['name'], 
         "list_runways": list_runways
     }
 
 
 def query_frequency_at_airport(frq_sigle, icao):
-    response = list(owl.default_world.sparql(
-    f"""
-        PREFIX pie:<http://www.semanticweb.org/clement/ontologies/2020/1/final-archi#>
-        SELECT ?name ?mhz 
-        WHERE {{
-            ?Airport pie:AirportICAOCode ?ICAO .
-            ?Airport pie:AirportName ?name .
-            ?Airport pie:HasFrequency ?Frequency .
-            ?Frequency pie:FrequencyDescription ?desc .
-            ?Frequency pie:FrequencyMHz ?mhz .
-            ?Frequency pie:FrequencyType ?type .
-            FILTER regex(?ICAO, "{icao}", "i")
-            FILTER regex(?type, "{frq_sigle}", "i")
-            
-        }}
-    """))
-    if len(response) == 0:
+    airport = find_airport(icao)
+    if airport is None:
+        return {"status": False}
+
+    frequencies = [frq for frq in frequencies_by_airport.get(airport['icao'], [])
+                   if frq_sigle.upper() in str(frq['frq_type']).upper()]
+    if len(frequencies) == 0:
         return {"status": False}
     
-    name_airport, value_mhz = response[0][0], response[0][1]
     return {
         "status": True,
         "frq_name": frq_sigle,
-        "airport_name": name_airport,
-        "frq_value": value_mhz
+        "airport_name": airport['name'],
+        "frq_value": frequencies[0]['frq_mhz']
     }
 
 # ============================== TRAFIC DYNAMIC ========================================
@@ -660,38 +702,39 @@ def query_current_param(flight_data, param):
     }
 
 
-def compute_dist(dict_flight, latitude, longitude):
-    """ Returns the distance between to flights """
-
-    return dict_flight['icao24'], {
-        "distance": coord_to_dist(latitude, longitude, dict_flight['latitude'], dict_flight['longitude']),
-        "latitude": dict_flight['latitude'],
-        "longitude": dict_flight['longitude'],
-        "callsign" : dict_flight['icao24']
-    }
-
-def query_nearest_flight(list_flights, latitude, longitude, callsign):
+def query_nearest_flight(store, flight_data):
     """ Example : what is the nearest traffic """
 
-    if len(list_flights) == 1:
+    if flight_data.get('latitude') is None:
+        return {"status": False}
+    nearest = k_nearest_traffic(store, flight_data, k=1)
+    if not nearest:
         return {"status": False}
 
-    # Compute distance for each flight
-    flight_to_dist = dict(map(lambda x: compute_dist(x, latitude, longitude), list_flights))
-    flight_to_dist.pop(callsign, None)
+    return {
+        "status" : True,
+        "nearest_callsign" : nearest[0]['callsign'],
+        "distance_nearest" : nearest[0]['distance'],
+        "heading_nearest" : nearest[0]['bearing'],
+    }
 
 
-    # Get the key of the minimum distance
-    nearest_data = min(flight_to_dist.values(), key=operator.itemgetter('distance'))
-    nearest_callsign = nearest_data['callsign']
-    distance_nearest = nearest_data['distance']
-    heading_nearest = heading_to_point(latitude, longitude, nearest_data['latitude'], nearest_data['longitude'])
-    
+def query_traffic_around(store, flight_data, direction='around', k=3):
+    """ Example : is there traffic above me
+
+    Returns
+    -------
+    dict
+        {'status', 'direction', 'list_traffic' : nearest aircraft in this direction (see k_nearest_traffic)}
+    """
+    direction = direction if direction in DIRECTIONS else 'around'
+    if flight_data.get('latitude') is None:
+        return {"status": False, "direction": direction}
+    list_traffic = k_nearest_traffic(store, flight_data, k=k, direction=direction, max_distance=TRAFFIC_AROUND_DISTANCE)
     return {
-        "status" : True,
-        "nearest_callsign" : nearest_callsign,
-        "distance_nearest" : distance_nearest,
-        "heading_nearest" : heading_nearest
+        "status" : len(list_traffic) > 0,
+        "direction" : direction,
+        "list_traffic" : list_traffic,
     }
 
 
@@ -762,12 +805,12 @@ def get_weather_at_place(weather_sigle, current_weather):
 def query_specific_weather_at_airport(weather_sigle, icao):
     """ Example : what is the weather at Toulouse Blagnac """
 
-    row = df_all_airports.loc[df_all_airports['icao'] == icao]
-    if len(row) == 0:
+    airport = find_airport(icao)
+    if airport is None:
         return {"status": False}
     
-    airport_name = row['name'].values[0]
-    coord = (float(row['latitude']), float(row['longitude']))
+    airport_name = airport['name']
+    coord = (float(airport['latitude']), float(airport['longitude']))
     current_weather = mgr.weather_at_coords(*coord).weather
 
     weather_value_format = get_weather_at_place(weather_sigle, current_weather)
@@ -805,15 +848,15 @@ def query_specific_weather_at_location(weather_sigle, location):
     }
 
 
-def query_specific_weather_at_waypoint(weather_sigle, waypoint_ident):
-    """ Example : what is the weather at MAKOX """
+def query_specific_weather_at_waypoint(weather_sigle, waypoint_ident, latitude=None, longitude=None):
+    """ Example : what is the weather at MAKOX (waypoints and navaids, the nearest of the position if duplicated) """
 
-    row = df_all_waypoints.loc[df_all_waypoints['ident'] == waypoint_ident.upper()]
-    if len(row) == 0:
+    waypoint = ident_index.lookup(waypoint_ident, ('waypoint', 'navaid'), latitude, longitude)
+    if waypoint is None:
         return {"status": False}
     
-    waypoint_name = row['ident'].values[0]
-    coord = (float(row['latitude']), float(row['longitude']))
+    waypoint_name = waypoint['ident']
+    coord = (float(waypoint['latitude']), float(waypoint['longitude']))
     current_weather = mgr.weather_at_coords(*coord).weather
 
     weather_value_format = get_weather_at_place(weather_sigle, current_weather)
@@ -829,6 +872,9 @@ def query_specific_weather_at_waypoint(weather_sigle, waypoint_ident):
 def query_metar_at_airport(icao):
     """ Example : what is the metar at Toulouse Blagnac """
 
+    airport = find_airport(icao)
+    if airport is not None:
+        icao = airport['icao'] # also accepts IATA codes
     r = requests.get(f'https://api.aviationapi.com/v1/weather/metar?apt={icao}')
     response = r.json()
 
@@ -865,20 +911,82 @@ def query_metar_at_airport(icao):
 
 # ============================== CHECKLIST ========================================
 
+def read_checklist_file(checklist_file):
+    """ Parses a checklist .csv file
+
+    Parameters
+    ----------
+    checklist_file : str
+        Path of the .csv file
+
+    Returns
+    -------
+    list
+        List of (Item, Response, ID)
+    """
+    with open(checklist_file, 'r') as read_obj:
+        csv_reader = reader(read_obj)
+        list_of_rows = list(csv_reader)
+
+    return [(item, response, i+1) for i, (item, response) in enumerate(list_of_rows)]
+
+
+def init_checklists_content():
+    """ Loads the content of every checklist in memory, keyed by (model, type).
+    A checklist whose file cannot be read is skipped (until it appears, see refresh_checklists_content)
+    """
+    checklists_content.clear()
+    checklists_files.clear()
+    checklists_mtime.clear()
+    for _, row in df_all_checklists.iterrows():
+        key = (row['model'], row['type'])
+        checklists_files[key] = row['content']
+        try:
+            checklists_mtime[key] = os.path.getmtime(row['content'])
+            checklists_content[key] = read_checklist_file(row['content'])
+        except OSError as e:
+            checklists_mtime.pop(key, None)
+            print_error("Checklist not loaded", category='startup', checklist=row['content'], error=str(e))
+
+
+def refresh_checklists_content():
+    """ Reloads the checklists whose file changed since they were loaded
+    """
+    for key, checklist_file in checklists_files.items():
+        try:
+            mtime = os.path.getmtime(checklist_file)
+            if mtime != checklists_mtime.get(key):
+                checklists_content[key] = read_checklist_file(checklist_file)
+                checklists_mtime[key] = mtime
+        except OSError:
+            # Keep the last version loaded
+            continue
+
+
+def watch_checklists(sleep=time.sleep):
+    """ Background task checking the checklist files every CHECKLIST_RELOAD_PERIOD seconds,
+    so that the queries never access the filesystem
+
+    Parameters
+    ----------
+    sleep : callable, optional
+        Sleep function (sio.sleep in the server), by default time.sleep
+    """
+    while True:
+        sleep(CHECKLIST_RELOAD_PERIOD)
+        refresh_checklists_content()
+
+
 # (Item, Response, ID) -- ID used for DOM, for example if there are many "ON" responses
 def get_checklist(type_checklist, model):
     """ Example : landing checklist """
     
     model = 'a320' #### TO DELETE in the future
 
-    row = df_all_checklists.loc[(df_all_checklists['type'] == type_checklist) & (df_all_checklists['model'] == model)]
-    checklist_file = row['content'].iloc[0]
-
-    with open(checklist_file, 'r') as read_obj:
-        csv_reader = reader(read_obj)
-        list_of_rows = list(csv_reader)
+    checklist = checklists_content.get((model, type_checklist))
+    if checklist is None:
+        return {"status": False, "checklist": []}
 
-    checklist = [(item, response, i+1) for i, (item, response) in enumerate(list_of_rows)]
     return {"status": True, "checklist": checklist}
 
 
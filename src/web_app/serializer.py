@@ -0,0 +1,106 @@
+"""
+JSON serializer of the Socket.IO server
+
+The server encodes the packets with `sio_json.dumps` : orjson if available (NumPy scalars and
+arrays encoded natively), else the standard json module with a NumPy-aware default.
+Parts of a message that rarely change (static layers) can be encoded once with `Fragment`,
+and sent in a `FragmentDict` : they are then inserted as is in the packets.
+
+SIO_SERIALIZER : 'orjson' (default if installed) or 'json'
+"""
+import json
+import os
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+SIO_SERIALIZER = os.environ.get('SIO_SERIALIZER', 'orjson' if orjson is not None else 'json')
+
+
+def numpy_default(obj):
+    """ Encodes the NumPy values the json module does not know, and the Fragments
+    nested in a plain container (decoded value, not pre-encoded)
+    """
+    if isinstance(obj, Fragment):
+        return obj.value
+    if isinstance(obj, FragmentDict):
+        return obj.to_dict()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if SIO_SERIALIZER == 'orjson' and orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def encode(obj):
+        return orjson.dumps(obj, default=numpy_default, option=ORJSON_OPTIONS).decode()
+
+    decode = orjson.loads
+else:
+    def encode(obj):
+        return json.dumps(obj, default=numpy_default, separators=(',', ':'))
+
+    decode = json.loads
+
+
+
+class Fragment:
+    """
+    Value encoded once, inserted as is when the message containing it is encoded
+    """
+    __slots__ = ('value', 'raw')
+
+    def __init__(self, value):
+        self.value = value
+        self.raw = encode(value)
+
+
+
+class FragmentDict(dict):
+    """
+    Message whose values can be Fragments
+    """
+    def to_dict(self):
+        """ Returns the message as a plain dict (decoded values)
+        """
+        return {k : v.value if isinstance(v, Fragment) else v for k, v in self.items()}
+
+
+
+def dumps(obj, *args, **kwargs):
+    """ Encodes obj, inserting the pre-encoded Fragments of the FragmentDicts.
+    The other arguments (separators, ...) are ignored, the output is always compact
+    """
+    if isinstance(obj, Fragment):
+        return obj.raw
+    if isinstance(obj, FragmentDict):
+        return "{" + ",".join(f"{encode(str(k))}:{dumps(v)}" for k, v in obj.items()) + "}"
+    if isinstance(obj, (list, tuple)) and any(isinstance(v, FragmentDict) for v in obj):
+        return "[" + ",".join(dumps(v) for v in obj) + "]"
+    return encode(obj)
+
+
+def loads(s, *args, **kwargs):
+    return decode(s)
+
+
+
+class SocketIOJSON:
+    """ json-like module given to the Socket.IO server """
+    dumps = staticmethod(dumps)
+    loads = staticmethod(loads)
+
+
+sio_json = SocketIOJSON()
@@ -28,4 +28,18 @@ function select_flight(flight) {
   console.log("Following " + flight.label);
   socket.emit('new_follow', flight);
   $('input').blur();
-}
\ No newline at end of file
+}
+
+/* Trail of the followed flight, sent by the server with the follow info */
+var trail_polyline = null;
+
+function update_trail(trail) {
+  if (trail_polyline != null) {
+    mymap.removeLayer(trail_polyline);
+    trail_polyline = null;
+  }
+  if (trail && trail.length > 1) {
+    trail_polyline = L.polyline(trail, {color: "#ff7800", weight: 2, dashArray: "4 4"});
+    trail_polyline.addTo(mymap);
+  }
+}
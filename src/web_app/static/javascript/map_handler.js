@@ -50,6 +50,23 @@ class Location {
 }
 
 
+class Cluster extends Location {
+    // Group of navaids or waypoints, sent by the server instead of the points at low zoom levels
+    constructor(cluster, className) {
+        super(cluster);
+        this.count = cluster.count;
+
+        var size = 20 + 4 * Math.min(Math.log2(this.count), 5);
+        var cluster_icon = L.divIcon({
+            html:         `<div><span>${this.count}</span></div>`,
+            className:    `markerCluster ${className}`,
+            iconSize:     [size, size],
+        });
+        this.marker = new L.marker([this.latitude, this.longitude], {icon : cluster_icon});
+    }
+}
+
+
 function calcCrow(lat1, lon1, lat2, lon2) {
     var R = 6371; // km
     var dLat = toRad(lat2-lat1);
@@ -98,6 +115,13 @@ function init_map() {
         clean_query_response();
     });
 
+    // Navaids and waypoints are clustered by the server according to the zoom level
+    mymap.on('zoomend', function() {
+        if (center != null) {
+            change_focus(center[0], center[1], isFollowing);
+        }
+    });
+
 }
 
 
@@ -106,6 +130,7 @@ function change_focus(new_lat, new_lng, follow) {
         latitude : new_lat,
         longitude : new_lng,
         follow : follow,
+        zoom : mymap.getZoom(),
     });
 
     maxLong = new_lng + 2;
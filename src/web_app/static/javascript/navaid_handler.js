@@ -42,14 +42,18 @@ function check_visible_navaids(key_list) {
     }
 }
 
+function navaid_key(n) {
+    return n.cluster ? n.id : n.ident + "-" + n.nav_type;
+}
+
 function update_navaids(list_navaids) {
-    var key_list = list_navaids.map(({ident, nav_type}) => ident + "-" + nav_type);
+    var key_list = list_navaids.map(navaid_key);
     check_visible_navaids(key_list);
     
     list_navaids.forEach(n => {
-        var key = n.ident + "-" + n.nav_type;
+        var key = navaid_key(n);
         if (!(key in dict_navaids)) {
-            let navaid = new Navaid(n);
+            let navaid = n.cluster ? new Cluster(n, "navaidCluster") : new Navaid(n);
             if (navaid.is_outside_map(minLong, maxLong, minLat, maxLat, center)) {
                 delete dict_navaids[key];
             }
@@ -64,6 +68,7 @@ function update_navaids(list_navaids) {
 
 function setZoomNavIcons(size) {
     for (const [key, navaid] of Object.entries(dict_navaids)) {
+        if (navaid instanceof Cluster) { continue; }
         var LeafIcon = L.icon({
             iconUrl: navaid.nav_url,
             iconSize:     [size, size],
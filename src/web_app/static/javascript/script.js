@@ -17,6 +17,7 @@ $(document).ready(function(){
     // var namespace = '/test'
     // socket = io.connect('http://' + document.domain + ':' + location.port + namespace);
     socket = io();
+    init_static_diff_handlers();
 
     socket.emit('init_worker');
     
@@ -37,41 +38,21 @@ $(document).ready(function(){
             list_flights_string = list_flights_string + `${f.icao24} - ${f.callsign}<br>`;
         });
 
-        var list_airport_string = '';
-        msg.list_airports.forEach(a => {
-            list_airport_string = list_airport_string + `${a.icao} (${a.iata}) - ${a.name}<br>`;
-        });
-
-        var list_runway_string = '';
-        msg.list_runways.forEach(r => {
-            list_runway_string = list_runway_string + `${r.couple} (${r.airport})<br>`;
-        });
-
-        var list_navaid_string = '';
-        msg.list_navaids.forEach(r => {
-            list_navaid_string = list_navaid_string + `(${r.nav_type}) ${r.ident} ${r.name}<br>`;
-        });
-
-        var list_waypoint_string = '';
-        msg.list_waypoints.forEach(w => {
-            list_waypoint_string = list_waypoint_string + `${w.ident} (${w.country})<br>`;
-        });
-
-
         $('#DOM-lastUpdate').html(msg.time_update_str);
         $('#DOM-numberFlights').html(msg.number_flights);
         $('#DOM-listFlights').html(list_flights_string);
-        $('#DOM-listAirports').html(list_airport_string);
-        $('#DOM-listRunways').html(list_runway_string);
-        $('#DOM-listNavaids').html(list_navaid_string);
-        $('#DOM-listWaypoints').html(list_waypoint_string);
 
 
         update_traffic(msg.list_flights);
-        update_airports(msg.list_airports);
-        update_runways(msg.list_runways);
-        update_navaids(msg.list_navaids);
-        update_waypoints(msg.list_waypoints);
+        update_alerts(msg.list_alerts);
+        if (msg.tiles_url) {
+            // Static layers are loaded as tiles
+            if (static_tiles_layer == null) { init_static_tiles(msg.tiles_url); }
+        }
+        else {
+            // Static layers are sent as diffs when focus changes
+            check_static_version(msg.static_version);
+        }
     });
 
 
@@ -108,6 +89,8 @@ $(document).ready(function(){
                 <b>Vz : </b> ${data.vertical_speed} ft/min ; 
                 <b>Heading : </b> ${data.heading}`;
 
+            update_trail(data.trail);
+
             if (center[0] != data.latitude || center[1] != data.longitude){
                 change_focus(data.latitude, data.longitude, true);
             }
@@ -116,6 +99,7 @@ $(document).ready(function(){
 
         }
         else {
+            update_trail(null);
             // Disable query buttons
             $('.DOM-queryButton').attr('disabled', true);
             $('.DOM-queryArg').attr('disabled', true);
@@ -143,4 +127,34 @@ function dev_mode_checked() {
         DOM_devdata.style.display = "none";
         DOW_devhelp.style.display = "none";
     }
-  }
\ No newline at end of file
+  }
+
+
+
+function display_static_lists(list_airports, list_runways, list_navaids, list_waypoints) {
+    // Lists of the static objects (Developer Mode)
+    var list_airport_string = '';
+    list_airports.forEach(a => {
+        list_airport_string = list_airport_string + `${a.icao} (${a.iata}) - ${a.name}<br>`;
+    });
+
+    var list_runway_string = '';
+    list_runways.forEach(r => {
+        list_runway_string = list_runway_string + `${r.couple} (${r.airport})<br>`;
+    });
+
+    var list_navaid_string = '';
+    list_navaids.filter(r => !r.cluster).forEach(r => {
+        list_navaid_string = list_navaid_string + `(${r.nav_type}) ${r.ident} ${r.name}<br>`;
+    });
+
+    var list_waypoint_string = '';
+    list_waypoints.filter(w => !w.cluster).forEach(w => {
+        list_waypoint_string = list_waypoint_string + `${w.ident} (${w.country})<br>`;
+    });
+
+    $('#DOM-listAirports').html(list_airport_string);
+    $('#DOM-listRunways').html(list_runway_string);
+    $('#DOM-listNavaids').html(list_navaid_string);
+    $('#DOM-listWaypoints').html(list_waypoint_string);
+}
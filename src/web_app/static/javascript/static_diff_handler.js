@@ -0,0 +1,56 @@
+/*
+Applies the incremental updates of the static layers (airports, runways, navaids, waypoints)
+sent by the server when the focus changes ('static_diff'), when the layers are not loaded as tiles.
+*/
+
+var static_version = null;
+var static_layers = {list_airports : {}, list_runways : {}, list_navaids : {}, list_waypoints : {}};
+
+function draw_static_layers() {
+    var airports = Object.values(static_layers.list_airports);
+    var runways = Object.values(static_layers.list_runways);
+    var navaids = Object.values(static_layers.list_navaids);
+    var waypoints = Object.values(static_layers.list_waypoints);
+    update_airports(airports);
+    update_runways(runways);
+    update_navaids(navaids);
+    update_waypoints(waypoints);
+    display_static_lists(airports, runways, navaids, waypoints);
+}
+
+function request_static_layers() {
+    socket.emit('get_static');
+}
+
+function check_static_version(version) {
+    // Called with the version of each 'airspace' message : ask everything again if an update was missed
+    if (version !== undefined && version != static_version) {
+        static_version = version;
+        request_static_layers();
+    }
+}
+
+function init_static_diff_handlers() {
+    socket.on('static_full', function(msg) {
+        for (const name in static_layers) {
+            static_layers[name] = {};
+            msg[name].forEach(r => { static_layers[name][r.key] = r; });
+        }
+        static_version = msg.version;
+        draw_static_layers();
+    });
+
+    socket.on('static_diff', function(msg) {
+        if (static_version != msg.from_version) {
+            static_version = msg.version;
+            request_static_layers();
+            return;
+        }
+        for (const name in static_layers) {
+            msg[name].remove.forEach(key => { delete static_layers[name][key]; });
+            msg[name].add.forEach(r => { static_layers[name][r.key] = r; });
+        }
+        static_version = msg.version;
+        draw_static_layers();
+    });
+}
@@ -0,0 +1,58 @@
+/*
+Loads the static layers (airports, runways, navaids, waypoints) as tiles served by the app (/tiles),
+instead of receiving them in the 'airspace' messages. Tiles are cached by the browser.
+*/
+
+var static_tiles = {};
+var static_tiles_layer = null;
+var static_tiles_refresh = null;
+
+function refresh_static_layers() {
+    // Several tiles are usually loaded at once : refresh the markers only once
+    if (static_tiles_refresh != null) { return; }
+    static_tiles_refresh = setTimeout(function() {
+        static_tiles_refresh = null;
+        var layers = {list_airports : [], list_runways : [], list_navaids : [], list_waypoints : []};
+        for (const tile of Object.values(static_tiles)) {
+            for (const name in layers) {
+                layers[name] = layers[name].concat(tile[name]);
+            }
+        }
+        update_airports(layers.list_airports);
+        update_runways(layers.list_runways);
+        update_navaids(layers.list_navaids);
+        update_waypoints(layers.list_waypoints);
+        display_static_lists(layers.list_airports, layers.list_runways, layers.list_navaids, layers.list_waypoints);
+    }, 50);
+}
+
+function tile_key(coords) {
+    return `${coords.z}/${coords.x}/${coords.y}`;
+}
+
+var StaticTileLayer = L.GridLayer.extend({
+    createTile: function(coords, done) {
+        var tile = document.createElement('div');
+        fetch(L.Util.template(this.options.url, coords))
+            .then(response => response.json())
+            .then(data => {
+                // The tile may have been unloaded in the meantime
+                if (tile.isConnected) {
+                    static_tiles[tile_key(coords)] = data;
+                    refresh_static_layers();
+                }
+                done(null, tile);
+            })
+            .catch(error => done(error, tile));
+        return tile;
+    }
+});
+
+function init_static_tiles(url) {
+    static_tiles_layer = new StaticTileLayer({url : url, minZoom : 4, maxNativeZoom : 14});
+    static_tiles_layer.on('tileunload', function(e) {
+        delete static_tiles[tile_key(e.coords)];
+        refresh_static_layers();
+    });
+    static_tiles_layer.addTo(mymap);
+}
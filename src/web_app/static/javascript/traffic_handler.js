@@ -151,3 +151,24 @@ function update_traffic(list_flights) {
     });
 }
 
+
+
+/* Conflict alerts sent by the server : a line between the two aircraft of each alert */
+var alert_lines = [];
+
+function update_alerts(list_alerts) {
+    alert_lines.forEach(line => mymap.removeLayer(line));
+    alert_lines = [];
+    (list_alerts || []).forEach(a => {
+        var first = dict_airplanes[a.flights[0]];
+        var second = dict_airplanes[a.flights[1]];
+        if (first === undefined || second === undefined) {
+            return;
+        }
+        var line = L.polyline([[first.latitude, first.longitude], [second.latitude, second.longitude]],
+                              {color: 'red', weight: 3, dashArray: '6 4'});
+        line.bindTooltip(`${a.flights[0]} / ${a.flights[1]} : ${a.distance_cpa} nm, ${a.vertical_cpa} ft in ${a.time} s`);
+        line.addTo(mymap);
+        alert_lines.push(line);
+    });
+}
@@ -36,14 +36,18 @@ function check_visible_waypoints(key_list) {
     }
 }
 
+function waypoint_key(w) {
+    return w.cluster ? w.id : w.ident + "-" + w.country;
+}
+
 function update_waypoints(list_waypoints) {
-    var key_list = list_waypoints.map(({ident, country}) => ident + "-" + country);
+    var key_list = list_waypoints.map(waypoint_key);
     check_visible_waypoints(key_list);
     
     list_waypoints.forEach(n => {
-        var key = n.ident + "-" + n.country;
+        var key = waypoint_key(n);
         if (!(key in dict_waypoints)) {
-            let waypoint = new Waypoint(n);
+            let waypoint = n.cluster ? new Cluster(n, "waypointCluster") : new Waypoint(n);
             if (waypoint.is_outside_map(minLong, maxLong, minLat, maxLat, center)) {
                 delete dict_waypoints[key];
             }
@@ -58,6 +62,7 @@ function update_waypoints(list_waypoints) {
 
 function setZoomWaypointIcons(size) {
     for (const [key, waypoint] of Object.entries(dict_waypoints)) {
+        if (waypoint instanceof Cluster) { continue; }
         var LeafIcon = L.icon({
             iconUrl:      waypoint_url,
             iconSize:     [size, size],
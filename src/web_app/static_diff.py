@@ -0,0 +1,118 @@
+"""
+Incremental updates of the static layers (airports, runways, navaids, waypoints)
+
+When the focus moves, only the objects that entered or left the box are computed (difference
+of the sets of keys of the previous and of the new box), and sent as add / remove lists.
+Every update increments a version number, so that a client can check it did not miss one.
+"""
+
+
+class IncrementalLayer:
+    """
+    Objects of a ClusterIndex currently within the box
+    """
+    def __init__(self, name, index, key_fields, decorate=None):
+        self.name = name
+        self.index = index
+        self.key_fields = key_fields
+        self.decorate = decorate
+        self.records = {} # index key -> record sent to the client
+
+
+    def make_record(self, key):
+        record = dict(self.index.record(key))
+        if record.get('cluster'):
+            record['key'] = record['id']
+        else:
+            record['key'] = "-".join(str(record[f]) for f in self.key_fields)
+            if self.decorate is not None:
+                self.decorate(record)
+        return record
+
+
+    def diff(self, s, n, w, e, zoom=None):
+        """ Computes the content of the layer in a new box, without modifying the layer
+
+        Returns
+        -------
+        (dict, list, list)
+            New records, records of the objects that entered the box, keys of the objects that left it
+        """
+        keys = set(self.index.query_keys(s, n, w, e, zoom))
+        removed = [self.records[k]['key'] for k in self.records.keys() - keys]
+        added = {k : self.make_record(k) for k in keys - self.records.keys()}
+        records = {k : self.records.get(k) or added[k] for k in keys}
+        return records, list(added.values()), removed
+
+
+    def full(self):
+        return list(self.records.values())
+
+
+
+class StaticLayers:
+    """
+    All the static layers, and the version of their content
+    """
+    def __init__(self, layers):
+        self.layers = {layer.name : layer for layer in layers}
+        self.version = 0
+
+
+    def update(self, s, n, w, e, zoom=None, cancelled=None):
+        """ Moves all the layers to a new box. The layers are only modified once all the
+        diffs are computed, and not at all if the update is cancelled
+
+        Parameters
+        ----------
+        s, n, w, e : float
+            South, north, west and east bounds of the box
+        zoom : int, optional
+            Zoom level of the map, by default None
+        cancelled : callable, optional
+            Called between two layers, the update is abandoned if it returns True
+
+        Returns
+        -------
+        dict
+            Diff message : {'from_version', 'version', 'list_<layer>' : {'add' : records, 'remove' : keys}},
+            None if cancelled
+        """
+        diff = {'from_version' : self.version, 'version' : self.version + 1}
+        new_records = {}
+        for name, layer in self.layers.items():
+            if cancelled is not None and cancelled():
+                return None
+            new_records[name], added, removed = layer.diff(s, n, w, e, zoom)
+            diff[name] = {'add' : added, 'remove' : removed}
+
+        for name, layer in self.layers.items():
+            layer.records = new_records[name]
+        self.version += 1
+        return diff
+
+
+    def full(self):
+        """ Returns the full content of the layers : {'version', 'list_<layer>' : records}
+        """
+        message = {'version' : self.version}
+        for name, layer in self.layers.items():
+            message[name] = layer.full()
+        return message
+
+
+
+def make_static_layers():
+    """ Creates the static layers from the data loaded by query_ontology.init_dataframes_individuals()
+    """
+    from . import query_ontology as qo
+
+    def add_frequencies(airport):
+        airport['list_frequencies'] = qo.query_map_near_frequencies(airport['icao'])
+
+    return StaticLayers([
+        IncrementalLayer('list_airports', qo.airports_index, ['icao'], decorate=add_frequencies),
+        IncrementalLayer('list_runways', qo.runways_index, ['airport', 'couple']),
+        IncrementalLayer('list_navaids', qo.navaids_index, ['ident', 'nav_type']),
+        IncrementalLayer('list_waypoints', qo.waypoints_index, ['ident', 'country']),
+    ])
@@ -0,0 +1,168 @@
+"""
+Static map layers (airports, runways, navaids, waypoints) as a pyramid of z/x/y tiles
+
+A tile is a compact JSON document with the static objects within the tile, navaids and waypoints
+being clustered at its zoom level. Tiles only depend on the static data : they are identified by
+the hash of this data (build), rendered once, kept in memory and on disk (TILES_DIR/<build>/z/x/y.json),
+and served with a strong ETag and a long cache lifetime (see the /tiles view).
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .cluster_index import lonlat_to_pixels, TILE_SIZE
+from .http_cache import CACHE_DIR
+from .serializer import encode
+from .log_utils import *
+
+
+TILES_DIR = os.path.join(CACHE_DIR, "tiles")
+MIN_TILE_ZOOM = 4
+MAX_TILE_ZOOM = 14
+# Number of tiles kept in memory
+TILES_MEMORY_SIZE = 4096
+# Version of the tile format (changes the build hash)
+TILES_FORMAT = 1
+# Body shared by all the empty tiles (never stored)
+EMPTY_TILE = encode({'list_airports' : [], 'list_runways' : [], 'list_navaids' : [], 'list_waypoints' : []}).encode()
+
+
+def tile_bounds(z, x, y):
+    """ Returns the (south, north, west, east) bounds of a tile
+    """
+    n_tiles = 2 ** z
+    west = x / n_tiles * 360 - 180
+    east = (x + 1) / n_tiles * 360 - 180
+    north = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n_tiles))))
+    south = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + 1) / n_tiles))))
+    return float(south), float(north), float(west), float(east)
+
+
+def data_build_hash(*dfs):
+    """ Returns a short hash of the content of dataframes
+    """
+    h = hashlib.sha1(str(TILES_FORMAT).encode())
+    for df in dfs:
+        h.update(",".join(map(str, df.columns)).encode())
+        h.update(pd.util.hash_pandas_object(df.astype(str), index=False).values.tobytes())
+    return h.hexdigest()[:12]
+
+
+
+class StaticTileSet:
+    """
+    Tiles of the static layers
+    """
+    def __init__(self, df_airports, df_runways, df_frequencies, navaids_index, waypoints_index, folder=TILES_DIR):
+        self.build = data_build_hash(df_airports, df_runways, df_frequencies, navaids_index.df, waypoints_index.df)
+        self.folder = os.path.join(folder, self.build)
+        self.navaids_index = navaids_index
+        self.waypoints_index = waypoints_index
+        self.memory = OrderedDict()
+
+        frequencies = {}
+        for frequency in df_frequencies.to_dict('records'):
+            frequencies.setdefault(frequency['icao'], []).append(frequency)
+        self.airports = df_airports.to_dict('records')
+        for airport in self.airports:
+            airport['list_frequencies'] = frequencies.get(airport['icao'], [])
+        self.airports_latitude = df_airports['latitude'].to_numpy(dtype=float)
+        self.airports_longitude = df_airports['longitude'].to_numpy(dtype=float)
+
+        self.runways = df_runways.to_dict('records')
+        self.runways_latitude = df_runways['beg_latitude'].to_numpy(dtype=float)
+        self.runways_longitude = df_runways['beg_longitude'].to_numpy(dtype=float)
+
+
+    def url_template(self):
+        return f"/tiles/{self.build}/{{z}}/{{x}}/{{y}}.json"
+
+
+    def etag(self, z, x, y):
+        return f"{self.build}-{z}-{x}-{y}"
+
+
+    def render(self, z, x, y):
+        """ Returns the content of a tile
+        """
+        s, n, w, e = tile_bounds(z, x, y)
+
+        def in_tile(latitude, longitude):
+            return np.flatnonzero((latitude >= s) & (latitude < n) & (longitude >= w) & (longitude < e))
+
+        return {
+            'list_airports' : [self.airports[i] for i in in_tile(self.airports_latitude, self.airports_longitude)],
+            'list_runways' : [self.runways[i] for i in in_tile(self.runways_latitude, self.runways_longitude)],
+            'list_navaids' : self.navaids_index.query(s, n, w, e, z),
+            'list_waypoints' : self.waypoints_index.query(s, n, w, e, z),
+        }
+
+
+    def get(self, z, x, y):
+        """ Returns the encoded tile (memory, then disk, else rendered and stored).
+        Empty tiles are rendered again at each request, so that only the tiles with data are stored
+        """
+        key = (z, x, y)
+        body = self.memory.get(key)
+        if body is not None:
+            self.memory.move_to_end(key)
+            return body
+
+        path = os.path.join(self.folder, str(z), str(x), f"{y}.json")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                body = f.read()
+        else:
+            tile = self.render(z, x, y)
+            if not any(tile.values()):
+                return EMPTY_TILE
+            body = encode(tile).encode()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", 'wb') as f:
+                f.write(body)
+            os.replace(path + ".tmp", path)
+
+        self.memory[key] = body
+        if len(self.memory) > TILES_MEMORY_SIZE:
+            self.memory.popitem(last=False)
+        return body
+
+
+    def prerender(self, min_zoom=MIN_TILE_ZOOM, max_zoom=8):
+        """ Renders ahead of time all the non-empty tiles of a range of zoom levels
+
+        Returns
+        -------
+        int
+            Number of tiles
+        """
+        latitude = np.concatenate([self.airports_latitude, self.runways_latitude,
+                                   self.navaids_index.latitude, self.waypoints_index.latitude])
+        longitude = np.concatenate([self.airports_longitude, self.runways_longitude,
+                                    self.navaids_index.longitude, self.waypoints_index.longitude])
+        n_tiles = 0
+        for z in range(min_zoom, max_zoom + 1):
+            px, py = lonlat_to_pixels(latitude, longitude, z)
+            tiles = np.unique(np.stack([px // TILE_SIZE, py // TILE_SIZE], axis=1).astype(np.int64), axis=0)
+            for x, y in tiles:
+                self.get(z, int(x), int(y))
+            n_tiles += len(tiles)
+            print_event("Static tiles rendered", category='startup', zoom=z, tiles=len(tiles))
+        return n_tiles
+
+
+
+tile_set = None
+
+def init_static_tiles():
+    """ Creates the tile set from the static data loaded by query_ontology.init_dataframes_individuals()
+    """
+    global tile_set
+    from . import query_ontology as qo
+    tile_set = StaticTileSet(qo.df_all_airports, qo.df_all_runways, qo.df_all_frequencies,
+                             qo.navaids_index, qo.waypoints_index)
+    print_event("Static tiles", category='startup', build=tile_set.build)
+    return tile_set
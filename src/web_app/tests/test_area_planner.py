@@ -0,0 +1,116 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.area_planner import AreaPlanner, node_bounds, intersection, children, MAX_DEPTH
+
+
+class FakeFeed:
+    """ FR24 feed returning at most `limit` aircraft per request """
+    def __init__(self, latitude, longitude, limit):
+        self.latitude, self.longitude, self.limit = latitude, longitude, limit
+        self.requests = 0
+
+    def get_area_raw(self, area):
+        lat1, lat2, lon1, lon2 = area
+        s, n, w, e = min(lat1, lat2), max(lat1, lat2), min(lon1, lon2), max(lon1, lon2)
+        self.requests += 1
+        rows = np.flatnonzero((self.latitude >= s) & (self.latitude < n)
+                              & (self.longitude >= w) & (self.longitude < e))[:self.limit]
+        data = {f"f{i}": ["icao", self.latitude[i], self.longitude[i], 0, 0, 0, "", "", "", "", 100 + i]
+                for i in rows}
+        data['full_count'] = len(self.latitude)
+        return data
+
+
+def box_area(box):
+    s, n, w, e = box
+    return (n - s) * (e - w)
+
+
+class TestAreaPlanner(unittest.TestCase):
+    BOX = (42.3, 46.1, -0.7, 3.9)
+
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        # Dense cluster around Paris, a few aircraft elsewhere
+        self.latitude = np.concatenate([rng.normal(45.0, 0.3, 400), rng.uniform(42.3, 46.1, 10)])
+        self.longitude = np.concatenate([rng.normal(2.4, 0.3, 400), rng.uniform(-0.7, 3.9, 10)])
+        self.planner = AreaPlanner(limit=100, workers=2)
+        self.addCleanup(self.planner.pool.shutdown)
+
+    def in_box(self):
+        s, n, w, e = self.BOX
+        return {f"f{i}" for i in np.flatnonzero((self.latitude >= s) & (self.latitude < n)
+                                                 & (self.longitude >= w) & (self.longitude < e))}
+
+    def test_quadtree_helpers(self):
+        self.assertEqual(node_bounds((0, 0, 0)), (-90, 90, -180, 180))
+        self.assertEqual(node_bounds((1, 1, 0)), (-90, 0, 0, 180))
+        self.assertIsNone(intersection((0, 1, 0, 1), (1, 2, 0, 1)))
+        self.assertEqual(intersection((0, 2, 0, 2), (1, 3, -1, 1)), (1, 2, 0, 1))
+        self.assertEqual(sum(box_area(node_bounds(k)) for k in children((3, 2, 5))), box_area(node_bounds((3, 2, 5))))
+
+    def test_tiles_cover_the_box_exactly(self):
+        for latitude, longitude in ((np.array([]), np.array([])), (self.latitude, self.longitude)):
+            tiles = self.planner.covering(self.BOX, latitude, longitude)
+            self.assertAlmostEqual(sum(box_area(clip) for _, clip in tiles), box_area(self.BOX))
+            for i, (_, a) in enumerate(tiles):
+                for _, b in tiles[i + 1:]:
+                    self.assertIsNone(intersection(a, b))
+
+    def test_dense_tiles_split(self):
+        sparse = self.planner.covering(self.BOX, np.array([]), np.array([]))
+        dense = self.planner.covering(self.BOX, self.latitude, self.longitude)
+        self.assertGreater(len(dense), len(sparse))
+        self.assertTrue(all(node[0] <= MAX_DEPTH for node, _ in dense))
+
+    def test_density_estimate(self):
+        feed = FakeFeed(self.latitude, self.longitude, limit=100)
+        merged = self.planner.fetch(feed, self.BOX, self.latitude, self.longitude)
+        self.assertEqual(set(merged), self.in_box())
+        self.assertEqual(self.planner.split, set())
+
+    def test_saturated_tiles_learned(self):
+        feed = FakeFeed(self.latitude, self.longitude, limit=100)
+        # No density estimate : the saturated tiles are only found from the responses,
+        # and refined in the same poll up to FR24_MAX_TILES requests
+        merged = self.planner.fetch(feed, self.BOX, np.array([]), np.array([]))
+        self.assertLessEqual(set(merged), self.in_box())
+        self.assertGreater(len(merged), 100)
+        self.assertTrue(self.planner.split)
+
+        # Learned splits are reused at the next poll
+        merged = self.planner.fetch(feed, self.BOX, np.array([]), np.array([]))
+        self.assertEqual(set(merged), self.in_box())
+
+    def test_duplicates_keep_most_recent_contact(self):
+        feed = FakeFeed(self.latitude, self.longitude, limit=100)
+        fetch_tile = self.planner.fetch_tile
+        self.planner.fetch_tile = lambda api, box: {'dup': ["icao", 0, 0, 0, 0, 0, "", "", "", "", box[0]],
+                                                    **fetch_tile(api, box)}
+        merged = self.planner.fetch(feed, self.BOX, self.latitude, self.longitude)
+        tiles = self.planner.covering(self.BOX, self.latitude, self.longitude)
+        self.assertEqual(merged['dup'][10], max(clip[0] for _, clip in tiles))
+
+    def test_splits_forgotten_when_sparse(self):
+        self.planner.fetch(FakeFeed(self.latitude, self.longitude, 100), self.BOX, np.array([]), np.array([]))
+        self.planner.fetch(FakeFeed(self.latitude[400:], self.longitude[400:], 100), self.BOX,
+                           np.array([]), np.array([]))
+        self.assertEqual(self.planner.split, set())
+
+    def test_max_tiles(self):
+        planner = AreaPlanner(limit=100, workers=2, max_tiles=3)
+        self.addCleanup(planner.pool.shutdown)
+        feed = FakeFeed(self.latitude, self.longitude, limit=100)
+        planner.fetch(feed, self.BOX, self.latitude, self.longitude)
+        self.assertLessEqual(feed.requests, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
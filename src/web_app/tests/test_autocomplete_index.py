@@ -0,0 +1,75 @@
+import os
+import random
+import sys
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.autocomplete_index import PrefixIndex
+from web_app.text_utils import normalize
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex(max_age=600)
+        self.index.add("f1", ["AFR1234", "AF1234", "F-GKXA"], "AFR1234 Toulouse - Paris")
+        self.index.add("f2", ["AFR12", "AF12", ""], "AFR12")
+        self.index.add("f3", ["EZY4321", "U24321", "G-EZAB"], "EZY4321")
+
+    def ids(self, query, limit=10):
+        return [r['id'] for r in self.index.search(query, limit)]
+
+    def test_prefix_search(self):
+        self.assertEqual(sorted(self.ids("AFR12")), ["f1", "f2"])
+        self.assertEqual(self.ids("afr123"), ["f1"])
+        self.assertEqual(self.ids("EZ"), ["f3"])
+        self.assertEqual(self.ids("KLM"), [])
+        self.assertEqual(self.ids(""), [])
+        self.assertEqual(self.index.search("EZY")[0], {'str': "EZY4321", 'id': "f3"})
+
+    def test_separators_ignored(self):
+        self.assertEqual(self.ids("f-gk"), ["f1"])
+        self.assertEqual(self.ids("FGKXA"), ["f1"])
+        self.assertEqual(self.ids("G EZ"), ["f3"])
+
+    def test_flight_listed_once_in_key_order(self):
+        # "AF12" < "AF1234" < "AFR12" < "AFR1234"
+        self.assertEqual(self.ids("AF"), ["f2", "f1"])
+
+    def test_limit(self):
+        self.assertEqual(len(self.ids("A", limit=1)), 1)
+
+    def test_refreshed_identifiers(self):
+        self.index.add("f2", ["KLM12"], "KLM12")
+        self.assertEqual(self.ids("AFR12"), ["f1"])
+        self.assertEqual(self.ids("KLM"), ["f2"])
+
+    def test_expire(self):
+        self.index.add("old", ["OLD123"], "OLD123", now=time.time() - 601)
+        self.assertEqual(self.ids("OLD"), [])
+        self.assertNotIn("old", self.index.flights)
+        self.assertEqual(len(self.index), 3)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        flights = {}
+        for n in range(500):
+            identifiers = ["".join(rng.choice("ABCDEF0123-") for _ in range(rng.randint(0, 7)))
+                           for _ in range(3)]
+            flights[f"id{n}"] = identifiers
+            self.index.add(f"id{n}", identifiers, f"label{n}")
+        flights.update(f1=["AFR1234", "AF1234", "F-GKXA"], f2=["AFR12", "AF12", ""],
+                       f3=["EZY4321", "U24321", "G-EZAB"])
+
+        for query in ["A", "AB", "B-C", "f0", "123", "DEAD", "0"]:
+            with self.subTest(query=query):
+                prefix = normalize(query)
+                expected = {flight_id for flight_id, identifiers in flights.items()
+                            if any(normalize(i) and normalize(i).startswith(prefix) for i in identifiers)}
+                self.assertEqual(set(self.ids(query, limit=1000)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.cluster_index import ClusterIndex, lonlat_to_pixels, CELL_SIZE
+
+
+class TestClusterIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({
+            'ident': [f"WP{n:03d}" for n in range(300)],
+            'latitude': rng.uniform(42, 46, 300),
+            'longitude': rng.uniform(-1, 4, 300),
+        })
+        self.index = ClusterIndex(self.df, "waypoints", max_zoom=10)
+
+    def brute_force_cells(self, zoom):
+        """ cell -> rows of the points in the cell """
+        cells = {}
+        x, y = lonlat_to_pixels(self.df['latitude'].to_numpy(), self.df['longitude'].to_numpy(), zoom)
+        for row, (px, py) in enumerate(zip(x, y)):
+            cells.setdefault((int(px // CELL_SIZE), int(py // CELL_SIZE)), []).append(row)
+        return cells
+
+    def test_lonlat_to_pixels(self):
+        x, y = lonlat_to_pixels(0.0, 0.0, 0)
+        self.assertAlmostEqual(float(x), 128)
+        self.assertAlmostEqual(float(y), 128)
+        x, y = lonlat_to_pixels(85.0511, 180.0, 1)
+        self.assertAlmostEqual(float(x), 512)
+        self.assertAlmostEqual(float(y), 0, places=3)
+
+    def test_clusters_match_brute_force(self):
+        for zoom in (3, 6, 9):
+            with self.subTest(zoom=zoom):
+                cells = self.brute_force_cells(zoom)
+                results = self.index.query(-90, 90, -180, 180, zoom)
+                self.assertEqual(len(results), len(cells))
+
+                singles = sorted(r['ident'] for r in results if not r.get('cluster'))
+                expected_singles = sorted(self.df['ident'][rows[0]] for rows in cells.values() if len(rows) == 1)
+                self.assertEqual(singles, expected_singles)
+
+                clusters = {r['id']: r for r in results if r.get('cluster')}
+                for (cx, cy), rows in cells.items():
+                    if len(rows) > 1:
+                        cluster = clusters[f"waypoints-{zoom}-{cx}-{cy}"]
+                        self.assertEqual(cluster['count'], len(rows))
+                        self.assertAlmostEqual(cluster['latitude'], self.df['latitude'][rows].mean())
+                        self.assertAlmostEqual(cluster['longitude'], self.df['longitude'][rows].mean())
+
+    def test_box_filter(self):
+        results = self.index.query(43, 44, 0, 1, zoom=6)
+        self.assertTrue(all(43 <= r['latitude'] <= 44 and 0 <= r['longitude'] <= 1 for r in results))
+
+    def test_no_clustering_above_max_zoom(self):
+        mask = self.df['latitude'].between(43, 44) & self.df['longitude'].between(0, 1)
+        for zoom in (None, 11):
+            results = self.index.query(43, 44, 0, 1, zoom)
+            self.assertEqual(sorted(r['ident'] for r in results), sorted(self.df['ident'][mask]))
+
+    def test_zoom_below_min_zoom(self):
+        index = ClusterIndex(self.df, "waypoints", min_zoom=4, max_zoom=6)
+        self.assertEqual(index.query_keys(-90, 90, -180, 180, 2), index.query_keys(-90, 90, -180, 180, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
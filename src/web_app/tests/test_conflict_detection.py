@@ -0,0 +1,130 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app import conflict_detection
+from web_app.conflict_detection import candidate_pairs, detect_conflicts, ConflictDetector
+from web_app.traffic_store import TrafficStore, TRAFFIC_DTYPE
+
+
+def random_states(n, seed=0):
+    rng = np.random.default_rng(seed)
+    states = np.zeros(n, dtype=TRAFFIC_DTYPE)
+    states['icao24'] = [f"{k:06x}" for k in range(n)]
+    states['latitude'] = rng.uniform(43, 44, n)
+    states['longitude'] = rng.uniform(1, 2.4, n)
+    states['heading'] = rng.uniform(0, 360, n)
+    states['altitude'] = rng.choice([0, 3000, 5000, 5500, 6000], n)
+    states['speed'] = rng.uniform(0, 500, n)
+    states['vertical_speed'] = rng.choice([-1000, 0, 0, 1000], n)
+    return states
+
+
+def all_pairs(lower, upper, cell_size):
+    return np.triu_indices(len(lower[0]), k=1)
+
+
+def conflict_set(conflicts):
+    return set(zip(conflicts['i'].tolist(), conflicts['j'].tolist()))
+
+
+class TestCandidatePairs(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        lower = [rng.uniform(0, 50, 300), rng.uniform(-20, 30, 300)]
+        upper = [l + rng.uniform(0, 12, 300) for l in lower]
+        cell_size = (5, 7)
+        i, j = candidate_pairs(lower, upper, cell_size)
+        pairs = list(zip(i.tolist(), j.tolist()))
+        self.assertEqual(len(pairs), len(set(pairs)))
+        self.assertTrue(all(a < b for a, b in pairs))
+
+        # Pairs whose ranges of cells overlap on every axis
+        cells = [(np.floor(l / c), np.floor(u / c)) for l, u, c in zip(lower, upper, cell_size)]
+        expected = {(a, b) for a in range(300) for b in range(a + 1, 300)
+                    if all(max(f[a], f[b]) <= min(t[a], t[b]) for f, t in cells)}
+        self.assertEqual(set(pairs), expected)
+
+    def test_no_pairs(self):
+        i, j = candidate_pairs([np.array([0.0]), np.array([0.0])], [np.array([1.0]), np.array([1.0])], (5, 5))
+        self.assertEqual(len(i), 0)
+
+
+class TestDetectConflicts(unittest.TestCase):
+    def test_matches_all_pairs(self):
+        for n in (2, 50, 1000):
+            with self.subTest(n=n):
+                states = random_states(n, seed=n)
+                conflicts = detect_conflicts(states)
+                with mock.patch.object(conflict_detection, 'candidate_pairs', all_pairs):
+                    expected = detect_conflicts(states)
+                self.assertEqual(conflict_set(conflicts), conflict_set(expected))
+
+    def test_head_on(self):
+        states = np.zeros(3, dtype=TRAFFIC_DTYPE)
+        # 10 nm apart, closing at 600 kt : CPA in 1 min
+        states['latitude'] = [43.0, 43.0 + 10 / 60, 43.0]
+        states['longitude'] = [1.0, 1.0, 1.5]
+        states['heading'] = [0, 180, 0]
+        states['altitude'] = [10000, 10500, 10000]
+        states['speed'] = 300
+        conflicts = detect_conflicts(states)
+        self.assertEqual(conflict_set(conflicts), {(0, 1)})
+        self.assertAlmostEqual(conflicts['time'][0], 60, delta=1)
+        self.assertAlmostEqual(conflicts['distance'][0], 10, delta=0.1)
+        self.assertAlmostEqual(conflicts['distance_cpa'][0], 0, delta=0.1)
+        self.assertEqual(conflicts['vertical_cpa'][0], 500)
+
+        # Vertically separated, or on ground
+        states['altitude'][1] = 11000
+        self.assertEqual(len(detect_conflicts(states)['i']), 0)
+        states['altitude'] = [10000, 10000, 0]
+        states['latitude'][2] = 43.0
+        self.assertEqual(conflict_set(detect_conflicts(states)), {(0, 1)})
+
+    def test_less_than_two_airborne(self):
+        states = random_states(5)
+        states['altitude'] = 0
+        self.assertEqual(len(detect_conflicts(states)['i']), 0)
+
+
+class TestConflictDetector(unittest.TestCase):
+    def setUp(self):
+        self.store = TrafficStore()
+        self.store.begin_update()
+        for k, state in enumerate(random_states(300)):
+            self.store.update(f"id{k}", *state.tolist())
+        self.store.end_update()
+        self.detector = ConflictDetector()
+        self.addCleanup(self.detector.pool.shutdown)
+
+    def test_alerts(self):
+        alerts = self.detector.detect(self.store)
+        self.assertGreater(len(alerts), 0)
+        self.assertEqual(alerts, self.detector.alerts)
+        self.assertEqual(len(self.detector.active), len(alerts))
+        times = [a['time'] for a in alerts]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(len(alerts[0]['flights']), 2)
+
+    def test_new_alerts_counted_once(self):
+        with mock.patch.object(conflict_detection.CONFLICT_ALERTS, 'inc') as inc:
+            alerts = self.detector.detect(self.store)
+            self.detector.detect(self.store)
+        inc.assert_called_once_with(len(alerts))
+
+    def test_submit_in_background(self):
+        self.assertTrue(self.detector.submit(self.store))
+        alerts = self.detector.pending.result()
+        self.assertIs(self.detector.alerts, alerts)
+        self.assertEqual(alerts, ConflictDetector().detect(self.store))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.dead_reckoning import extrapolate_states
+from web_app.geo_utils import NM_PER_DEG
+from web_app.traffic_store import TRAFFIC_DTYPE
+
+
+def make_states(*rows):
+    states = np.zeros(len(rows), dtype=TRAFFIC_DTYPE)
+    for state, (latitude, longitude, heading, altitude, speed, vertical_speed) in zip(states, rows):
+        state['latitude'], state['longitude'], state['heading'] = latitude, longitude, heading
+        state['altitude'], state['speed'], state['vertical_speed'] = altitude, speed, vertical_speed
+        state['last_contact'] = 1000
+    return states
+
+
+class TestDeadReckoning(unittest.TestCase):
+    def test_northbound(self):
+        states = make_states((43.0, 1.0, 0, 10000, 360, 600))
+        predicted = extrapolate_states(states, now=1010)
+        self.assertAlmostEqual(predicted['latitude'][0], 43.0 + 1 / NM_PER_DEG)
+        self.assertAlmostEqual(predicted['longitude'][0], 1.0)
+        self.assertEqual(predicted['altitude'][0], 10100)
+
+    def test_eastbound_at_latitude(self):
+        states = make_states((60.0, 1.0, 90, 10000, 360, 0))
+        predicted = extrapolate_states(states, now=1010)
+        self.assertAlmostEqual(predicted['latitude'][0], 60.0)
+        self.assertAlmostEqual(predicted['longitude'][0], 1.0 + 2 / NM_PER_DEG)
+
+    def test_horizon_clipped(self):
+        states = make_states((43.0, 1.0, 0, 10000, 360, 0))
+        predicted = extrapolate_states(states, now=1100, max_horizon=10)
+        self.assertAlmostEqual(predicted['latitude'][0], 43.0 + 1 / NM_PER_DEG)
+        # No extrapolation backwards in time
+        self.assertEqual(extrapolate_states(states, now=900)['latitude'][0], 43.0)
+
+    def test_altitude_not_negative(self):
+        states = make_states((43.0, 1.0, 0, 100, 0, -3000))
+        self.assertEqual(extrapolate_states(states, now=1010)['altitude'][0], 0)
+
+    def test_antimeridian(self):
+        states = make_states((0.0, 179.99, 90, 10000, 600, 0))
+        self.assertLess(extrapolate_states(states, now=1010)['longitude'][0], -179.9)
+
+    def test_input_not_modified(self):
+        states = make_states((43.0, 1.0, 0, 10000, 360, 0), (44.0, 2.0, 180, 0, 0, 0))
+        predicted = extrapolate_states(states, now=1010)
+        self.assertEqual(states['latitude'][0], 43.0)
+        self.assertEqual(predicted['latitude'][1], 44.0)
+        self.assertEqual(len(extrapolate_states(states[:0], now=1010)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
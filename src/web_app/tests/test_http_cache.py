@@ -0,0 +1,106 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.http_cache import ResponseCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """ Answers the queued responses, and records the requests """
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.requests.append((url, params, headers))
+        return self.responses.pop(0)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.folder.name, "cache.sqlite"), ttl=60)
+        self.now = 1000.0
+        patcher = mock.patch('web_app.http_cache.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.cache.conn.close()
+        self.folder.cleanup()
+
+    def test_make_key(self):
+        self.assertEqual(ResponseCache.make_key("u"), "u")
+        self.assertEqual(ResponseCache.make_key("u", {'b': 2, 'a': 1, 'c': None}), "u?a=1&b=2")
+
+    def test_served_from_cache_during_ttl(self):
+        session = FakeSession(FakeResponse(200, {'v': 1}))
+        self.assertEqual(self.cache.fetch_json(session, "u"), {'v': 1})
+        self.now += 59
+        self.assertEqual(self.cache.fetch_json(session, "u"), {'v': 1})
+        self.assertEqual(len(session.requests), 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_stale_entry_revalidated_with_etag(self):
+        session = FakeSession(FakeResponse(200, {'v': 1}, {'ETag': '"abc"', 'Last-Modified': 'Mon'}),
+                              FakeResponse(304))
+        self.cache.fetch_json(session, "u")
+        self.now += 61
+        self.assertEqual(self.cache.fetch_json(session, "u"), {'v': 1})
+        self.assertEqual(session.requests[1][2], {'If-None-Match': '"abc"', 'If-Modified-Since': 'Mon'})
+
+        # 304 makes the entry fresh again
+        self.now += 30
+        self.assertEqual(self.cache.fetch_json(session, "u"), {'v': 1})
+        self.assertEqual(len(session.requests), 2)
+
+    def test_stale_entry_replaced(self):
+        session = FakeSession(FakeResponse(200, {'v': 1}, {'ETag': '"abc"'}),
+                              FakeResponse(200, {'v': 2}, {'ETag': '"def"'}))
+        self.cache.fetch_json(session, "u")
+        self.now += 61
+        self.assertEqual(self.cache.fetch_json(session, "u"), {'v': 2})
+        self.assertEqual(self.cache.get("u")[:2], ({'v': 2}, '"def"'))
+
+    def test_no_validators_without_entry(self):
+        session = FakeSession(FakeResponse(200, {'v': 1}))
+        self.cache.fetch_json(session, "u", params={'a': 1})
+        self.assertEqual(session.requests[0], ("u", {'a': 1}, {}))
+
+    def test_missing_resource_cached(self):
+        session = FakeSession(FakeResponse(404))
+        self.assertIsNone(self.cache.fetch_json(session, "u"))
+        self.assertIsNone(self.cache.fetch_json(session, "u"))
+        self.assertEqual(len(session.requests), 1)
+
+    def test_stale_entry_served_on_server_error(self):
+        session = FakeSession(FakeResponse(200, {'v': 1}), FakeResponse(503))
+        self.cache.fetch_json(session, "u")
+        self.now += 61
+        self.assertEqual(self.cache.fetch_json(session, "u"), {'v': 1})
+        self.assertIsNone(self.cache.fetch_json(FakeSession(FakeResponse(503)), "other"))
+
+    def test_ttl_per_request(self):
+        session = FakeSession(FakeResponse(200, {'v': 1}), FakeResponse(200, {'v': 2}))
+        self.cache.fetch_json(session, "u")
+        self.now += 10
+        self.assertEqual(self.cache.fetch_json(session, "u", ttl=5), {'v': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
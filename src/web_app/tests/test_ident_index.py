@@ -0,0 +1,65 @@
+import os
+import sys
+import unittest
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.ident_index import IdentifierIndex
+
+
+class TestIdentifierIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = IdentifierIndex()
+        self.index.add(pd.DataFrame({'icao': ["LFBO", "LFPG"], 'iata': ["TLS", "CDG"],
+                                     'latitude': [43.63, 49.01], 'longitude': [1.37, 2.55]}),
+                       'airport', ['icao', 'iata'])
+        # Same ident in several countries, and sharing the IATA code of an airport
+        self.index.add(pd.DataFrame({'ident': ["TLS", "TLS", "AGN"], 'country': ["FR", "CA", "FR"],
+                                     'latitude': [43.68, 46.0, 44.17], 'longitude': [1.31, -73.0, 0.59]}),
+                       'navaid', ['ident'])
+        self.index.add(pd.DataFrame({'ident': ["FISTO", "-"], 'latitude': [43.9, 0], 'longitude': [1.1, 0]}),
+                       'waypoint', ['ident'])
+
+    def test_lookup_by_any_identifier(self):
+        self.assertEqual(self.index.lookup("LFBO")['iata'], "TLS")
+        self.assertEqual(self.index.lookup("cdg")['icao'], "LFPG")
+        self.assertEqual(self.index.lookup("fis-to")['type'], "waypoint")
+        self.assertIsNone(self.index.lookup("XXXX"))
+
+    def test_placeholders_not_indexed(self):
+        self.assertIsNone(self.index.lookup("-"))
+        self.assertNotIn("", self.index.entries)
+
+    def test_type_preference(self):
+        self.assertEqual(self.index.lookup("TLS")['type'], "airport")
+        self.assertEqual(self.index.lookup("TLS", types=('navaid', 'airport'))['type'], "navaid")
+        self.assertIsNone(self.index.lookup("FISTO", types=('navaid',)))
+
+    def test_duplicates_sorted_by_distance(self):
+        canada = self.index.lookup("TLS", types=('navaid',), latitude=45.5, longitude=-73.5)
+        self.assertEqual(canada['country'], "CA")
+        self.assertLess(canada['distance'], 50)
+        france = self.index.lookup("TLS", types=('navaid',), latitude=43.6, longitude=1.4)
+        self.assertEqual(france['country'], "FR")
+
+        records = self.index.lookup_all("TLS", latitude=45.5, longitude=-73.5)
+        self.assertEqual([(r['type'], r.get('country')) for r in records],
+                         [('airport', None), ('navaid', "CA"), ('navaid', "FR")])
+
+    def test_ranked(self):
+        self.assertEqual(self.index.ranked("TLS"), [('airport', 0, None), ('navaid', 0, None), ('navaid', 1, None)])
+        # LFBO, TLS, LFPG, CDG, AGN, FISTO
+        self.assertEqual(len(self.index), 6)
+
+    def test_empty_dataframe(self):
+        index = IdentifierIndex()
+        index.add(pd.DataFrame({'ident': [], 'latitude': [], 'longitude': []}), 'waypoint', ['ident'])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.lookup_all("AGN"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
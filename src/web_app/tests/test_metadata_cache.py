@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.metadata_cache import FlightMetadataCache, FIELD_TTL, ROUTE_FIELDS
+
+
+class TestFlightMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = FlightMetadataCache(os.path.join(self.folder.name, "metadata.sqlite"))
+        self.now = 1000.0
+        patcher = mock.patch('web_app.metadata_cache.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.cache.conn.close()
+        self.folder.cleanup()
+
+    def test_round_trip(self):
+        route = {'origin': "Toulouse", 'origin_icao': "LFBO", 'destination': "Paris", 'destination_icao': "LFPG"}
+        self.cache.put("AFR123", route)
+        self.assertEqual(self.cache.get("AFR123", ROUTE_FIELDS), route)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 0))
+
+    def test_missing_field(self):
+        self.cache.put("AFR123", {'origin': "Toulouse"})
+        self.assertIsNone(self.cache.get("AFR123", ['origin', 'destination']))
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_fields_expire_with_their_own_ttl(self):
+        self.cache.put("id", {'time_scheduled': 1, 'time_estimated': 2})
+        self.now += FIELD_TTL['time_estimated'] + 1
+        self.assertEqual(self.cache.get("id", ['time_scheduled']), {'time_scheduled': 1})
+        self.assertIsNone(self.cache.get("id", ['time_scheduled', 'time_estimated']))
+
+    def test_allow_stale(self):
+        self.cache.put("id", {'time_scheduled': 1, 'time_estimated': 2})
+        self.now += FIELD_TTL['time_scheduled'] + 1
+        self.assertIsNone(self.cache.get("id", ['time_scheduled', 'time_estimated'],
+                                         allow_stale=['time_estimated']))
+        self.assertEqual(self.cache.get("id", ['time_estimated'], allow_stale=['time_estimated']),
+                         {'time_estimated': 2})
+
+    def test_put_refreshes(self):
+        self.cache.put("id", {'time_estimated': 2})
+        self.now += FIELD_TTL['time_estimated'] + 1
+        self.cache.put("id", {'time_estimated': 3})
+        self.assertEqual(self.cache.get("id", ['time_estimated']), {'time_estimated': 3})
+
+    def test_unknown_field_never_fresh(self):
+        self.cache.put("id", {'unknown': 1})
+        self.assertIsNone(self.cache.get("id", ['unknown']))
+
+    def test_empty_key(self):
+        self.cache.put("", {'origin': "Toulouse"})
+        self.assertIsNone(self.cache.get("", ['origin']))
+        self.assertIsNone(self.cache.get(None, ['origin']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app import metrics
+from web_app.metrics import Counter, Gauge, Histogram, escape_label, format_labels, render_metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registered = len(metrics.registry)
+
+    def tearDown(self):
+        del metrics.registry[self.registered:]
+
+    def test_escape_label(self):
+        self.assertEqual(escape_label('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
+        self.assertEqual(format_labels(('a', 'b'), ('1', 'x"y')), '{a="1",b="x\\"y"}')
+        self.assertEqual(format_labels((), ()), "")
+
+    def test_counter(self):
+        counter = Counter('test_requests_total', "Requests", labels=('result',))
+        counter.inc(result='ok')
+        counter.inc(2, result='ok')
+        counter.inc(result='error')
+        self.assertEqual(counter.render().splitlines(), [
+            "# HELP test_requests_total Requests",
+            "# TYPE test_requests_total counter",
+            'test_requests_total{result="ok"} 3',
+            'test_requests_total{result="error"} 1'])
+
+    def test_gauge(self):
+        gauge = Gauge('test_tiles', "Tiles")
+        gauge.set(3)
+        gauge.set(5)
+        self.assertEqual(gauge.render().splitlines()[-1], "test_tiles 5")
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('test_seconds', "Durations", labels=('endpoint',), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, endpoint='feed')
+        self.assertEqual(histogram.render().splitlines()[2:], [
+            'test_seconds_bucket{endpoint="feed",le="0.1"} 2',
+            'test_seconds_bucket{endpoint="feed",le="1"} 3',
+            'test_seconds_bucket{endpoint="feed",le="+Inf"} 4',
+            'test_seconds_sum{endpoint="feed"} 2.65',
+            'test_seconds_count{endpoint="feed"} 4'])
+
+    def test_histogram_timer(self):
+        histogram = Histogram('test_timer_seconds', "Durations")
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.values[()][2], 1)
+
+    def test_render_metrics(self):
+        Counter('test_rendered_total', "Rendered").inc()
+        text = render_metrics()
+        self.assertTrue(text.endswith("test_rendered_total 1\n"))
+        self.assertIn("# TYPE flight_assistant_upstream_request_seconds histogram", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.opensky_api import iter_states
+
+
+STATES = [
+    ["3c6444", "DLH9LF  ", "Germany", 1700000000, 1700000001, 6.1, 50.2, 10668.0,
+     False, 230.5, 91.2, -0.33, None, 10972.8, "1000", False, 0],
+    ["4b1815", "SWR1ß   ", "Switzerland", 1700000000, 1700000002, 8.5, 47.4, None,
+     True, 0.0, 270.0, None, [1, 2], None, None, False, 0],
+    ["a0b1c2", "[]{},:\"", "United States", 1700000000, 1700000003, -73.8, 40.6, 304.8,
+     False, 80.1, 45.0, 5.2, None, 320.0, "7700", True, 0],
+]
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterStates(unittest.TestCase):
+    def setUp(self):
+        self.response = json.dumps({"time": 1700000005, "states": STATES},
+                                   ensure_ascii=False).encode('utf-8')
+
+    def test_single_chunk(self):
+        self.assertEqual(list(iter_states([self.response])), STATES)
+
+    def test_every_chunk_size(self):
+        for size in range(1, 64):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_states(chunked(self.response, size))), STATES)
+
+    def test_every_split_position(self):
+        # Includes the splits inside the multi-byte character and the "states" key
+        for split in range(1, len(self.response)):
+            with self.subTest(split=split):
+                chunks = [self.response[:split], self.response[split:]]
+                self.assertEqual(list(iter_states(chunks)), STATES)
+
+    def test_states_yielded_before_end_of_response(self):
+        first_state_end = self.response.index(b'0],') + 2
+        states = iter_states([self.response[:first_state_end]])
+        self.assertEqual(list(states), STATES[:1])
+
+    def test_null_or_empty_states(self):
+        self.assertEqual(list(iter_states([b'{"time": 1, "states": null}'])), [])
+        self.assertEqual(list(iter_states(chunked(b'{"time": 1, "states": [ ]}', 3))), [])
+        self.assertEqual(list(iter_states([b'{"time": 1}'])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
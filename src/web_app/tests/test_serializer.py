@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.serializer import dumps, loads, numpy_default, Fragment, FragmentDict
+
+
+class TestSerializer(unittest.TestCase):
+    def test_numpy_values(self):
+        message = {'n': np.int64(3), 'x': np.float32(0.5), 'b': np.bool_(True),
+                   'a': np.array([1, 2])}
+        self.assertEqual(json.loads(dumps(message)),
+                         {'n': 3, 'x': 0.5, 'b': True, 'a': [1, 2]})
+
+    def test_unknown_type(self):
+        with self.assertRaises(TypeError):
+            numpy_default(object())
+
+    def test_fragment_inserted_as_is(self):
+        fragment = Fragment({'layer': [1, 2, 3]})
+        message = FragmentDict(static=fragment, count=np.int64(2))
+        encoded = dumps(message)
+        self.assertIn(fragment.raw, encoded)
+        self.assertEqual(loads(encoded), {'static': {'layer': [1, 2, 3]}, 'count': 2})
+        self.assertEqual(message.to_dict(), {'static': {'layer': [1, 2, 3]}, 'count': 2})
+
+    def test_list_of_fragment_dicts(self):
+        messages = [FragmentDict(a=Fragment([1])), {'b': 2}]
+        self.assertEqual(loads(dumps(messages)), [{'a': [1]}, {'b': 2}])
+
+    def test_fragment_dict_nested_in_plain_dict(self):
+        message = {'event': 'update',
+                   'data': FragmentDict(static=Fragment({'y': np.int64(1)}), z=2)}
+        self.assertEqual(loads(dumps(message)),
+                         {'event': 'update', 'data': {'static': {'y': 1}, 'z': 2}})
+
+
+if __name__ == '__main__':
+    unittest.main()
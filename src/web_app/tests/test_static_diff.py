@@ -0,0 +1,92 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.cluster_index import ClusterIndex
+from web_app.static_diff import IncrementalLayer, StaticLayers
+
+
+BOXES = [(43, 44, 0, 1, 8), (43.5, 44.5, 0.5, 1.5, 8), (43.5, 44.5, 0.5, 1.5, 6), (40, 41, 5, 6, 8),
+         (42, 46, -1, 4, None), (43, 44, 0, 1, 8)]
+
+
+def make_layers():
+    rng = np.random.default_rng(1)
+    waypoints = pd.DataFrame({
+        'ident': [f"WP{n:03d}" for n in range(200)],
+        'country': "FR",
+        'latitude': rng.uniform(42, 46, 200),
+        'longitude': rng.uniform(-1, 4, 200),
+    })
+    navaids = waypoints.iloc[:20].assign(nav_type="VOR")
+    return StaticLayers([
+        IncrementalLayer('list_waypoints', ClusterIndex(waypoints, "waypoints"), ['ident', 'country']),
+        IncrementalLayer('list_navaids', ClusterIndex(navaids, "navaids"), ['ident', 'nav_type'],
+                         decorate=lambda record: record.update(decorated=True)),
+    ])
+
+
+class TestStaticDiff(unittest.TestCase):
+    def setUp(self):
+        self.layers = make_layers()
+
+    def test_diffs_rebuild_the_full_content(self):
+        client = {'list_waypoints': {}, 'list_navaids': {}}
+        for box in BOXES:
+            with self.subTest(box=box):
+                diff = self.layers.update(*box)
+                for name, records in client.items():
+                    for key in diff[name]['remove']:
+                        del records[key]
+                    for record in diff[name]['add']:
+                        self.assertNotIn(record['key'], records)
+                        records[record['key']] = record
+
+                # Same content as layers moved directly to the box
+                expected = make_layers()
+                expected.update(*box)
+                for name, records in client.items():
+                    expected_records = {r['key']: r for r in expected.full()[name]}
+                    self.assertEqual(records, expected_records)
+
+    def test_versions(self):
+        first = self.layers.update(*BOXES[0])
+        second = self.layers.update(*BOXES[1])
+        self.assertEqual((first['from_version'], first['version']), (0, 1))
+        self.assertEqual((second['from_version'], second['version']), (1, 2))
+        self.assertEqual(self.layers.full()['version'], 2)
+
+    def test_same_box_empty_diff(self):
+        self.layers.update(*BOXES[0])
+        diff = self.layers.update(*BOXES[0])
+        for name in ('list_waypoints', 'list_navaids'):
+            self.assertEqual(diff[name], {'add': [], 'remove': []})
+
+    def test_keys_and_decoration(self):
+        self.layers.update(42, 46, -1, 4)
+        navaid = self.layers.full()['list_navaids'][0]
+        self.assertEqual(navaid['key'], f"{navaid['ident']}-VOR")
+        self.assertTrue(navaid['decorated'])
+
+        self.layers.update(42, 46, -1, 4, zoom=4)
+        cluster = self.layers.full()['list_waypoints'][0]
+        self.assertTrue(cluster['cluster'])
+        self.assertEqual(cluster['key'], cluster['id'])
+
+    def test_cancelled_update(self):
+        self.layers.update(*BOXES[0])
+        before = self.layers.full()
+        calls = []
+        cancelled = lambda: calls.append(1) or len(calls) > 1
+        self.assertIsNone(self.layers.update(*BOXES[3], cancelled=cancelled))
+        self.assertEqual(self.layers.full(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
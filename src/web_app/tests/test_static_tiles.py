@@ -0,0 +1,99 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.cluster_index import ClusterIndex, lonlat_to_pixels, TILE_SIZE
+from web_app.static_tiles import StaticTileSet, tile_bounds, data_build_hash, EMPTY_TILE
+
+
+def make_tile_set(folder, airport_latitude=43.63):
+    airports = pd.DataFrame({'icao': ["LFBO", "LFPG"], 'latitude': [airport_latitude, 49.01],
+                             'longitude': [1.37, 2.55]})
+    runways = pd.DataFrame({'icao': ["LFBO"], 'beg_latitude': [43.62], 'beg_longitude': [1.35]})
+    frequencies = pd.DataFrame({'icao': ["LFBO", "LFBO"], 'frequency': [118.1, 121.9]})
+    navaids = pd.DataFrame({'ident': ["TOU"], 'latitude': [43.68], 'longitude': [1.31]})
+    waypoints = pd.DataFrame({'ident': ["AGN", "FISTO"], 'latitude': [44.17, 43.9], 'longitude': [0.59, 1.1]})
+    return StaticTileSet(airports, runways, frequencies, ClusterIndex(navaids, "navaids"),
+                         ClusterIndex(waypoints, "waypoints"), folder=folder)
+
+
+def tile_of(latitude, longitude, z):
+    x, y = lonlat_to_pixels(latitude, longitude, z)
+    return int(x // TILE_SIZE), int(y // TILE_SIZE)
+
+
+class TestStaticTiles(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.tile_set = make_tile_set(self.folder.name)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_tile_bounds(self):
+        self.assertEqual(tile_bounds(0, 0, 0)[2:], (-180, 180))
+        self.assertAlmostEqual(tile_bounds(0, 0, 0)[1], 85.0511, places=4)
+        s, n, w, e = tile_bounds(10, 512, 511)
+        self.assertAlmostEqual(s, 0)
+        self.assertEqual(w, 0)
+
+    def test_bounds_contain_points_of_tile(self):
+        for z in (4, 8, 12):
+            x, y = tile_of(43.63, 1.37, z)
+            s, n, w, e = tile_bounds(z, x, y)
+            self.assertTrue(s <= 43.63 < n and w <= 1.37 < e)
+
+    def test_build_and_etag_change_with_data(self):
+        df = pd.DataFrame({'a': [1, 2]})
+        self.assertEqual(data_build_hash(df), data_build_hash(df.copy()))
+        self.assertNotEqual(data_build_hash(df), data_build_hash(df.rename(columns={'a': 'b'})))
+
+        other = make_tile_set(self.folder.name, airport_latitude=43.64)
+        self.assertEqual(make_tile_set(self.folder.name).build, self.tile_set.build)
+        self.assertNotEqual(other.build, self.tile_set.build)
+        self.assertNotEqual(other.etag(8, 1, 2), self.tile_set.etag(8, 1, 2))
+        self.assertNotEqual(self.tile_set.etag(8, 1, 2), self.tile_set.etag(8, 2, 1))
+        self.assertIn(self.tile_set.build, self.tile_set.url_template())
+
+    def test_tile_content(self):
+        x, y = tile_of(43.63, 1.37, 8)
+        tile = json.loads(self.tile_set.get(8, x, y))
+        self.assertEqual([a['icao'] for a in tile['list_airports']], ["LFBO"])
+        self.assertEqual(len(tile['list_airports'][0]['list_frequencies']), 2)
+        self.assertEqual(len(tile['list_runways']), 1)
+        self.assertEqual(tile['list_navaids'][0]['ident'], "TOU")
+
+    def test_tiles_stored_on_disk_and_in_memory(self):
+        x, y = tile_of(43.63, 1.37, 8)
+        body = self.tile_set.get(8, x, y)
+        path = os.path.join(self.tile_set.folder, "8", str(x), f"{y}.json")
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), body)
+        self.assertIs(self.tile_set.get(8, x, y), body)
+
+        # Served from disk by a new tile set of the same build
+        self.assertEqual(make_tile_set(self.folder.name).get(8, x, y), body)
+
+    def test_empty_tiles_not_stored(self):
+        self.assertEqual(self.tile_set.get(8, 0, 0), EMPTY_TILE)
+        self.assertFalse(os.path.exists(os.path.join(self.tile_set.folder, "8", "0", "0.json")))
+        self.assertEqual(len(self.tile_set.memory), 0)
+
+    def test_prerender(self):
+        n_tiles = self.tile_set.prerender(min_zoom=4, max_zoom=6)
+        points = [(43.63, 1.37), (49.01, 2.55), (43.62, 1.35), (43.68, 1.31), (44.17, 0.59), (43.9, 1.1)]
+        expected = sum(len({tile_of(lat, lon, z) for lat, lon in points}) for z in range(4, 7))
+        self.assertEqual(n_tiles, expected)
+        self.assertEqual(len(self.tile_set.memory), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.track_store import TrackStore
+from web_app.traffic_store import TrafficStore
+
+
+class TestTrackStore(unittest.TestCase):
+    def setUp(self):
+        self.tracks = TrackStore(capacity=2, length=4, max_age=300)
+
+    def append(self, flight_id, t, altitude=10000):
+        self.tracks.append(flight_id, t, 43.0 + t / 1000, 1.0, altitude, 300, 90)
+
+    def test_ring_buffer_keeps_last_positions(self):
+        for t in range(1, 7):
+            self.append("a", t)
+        self.assertEqual(self.tracks.last("a")['time'].tolist(), [3, 4, 5, 6])
+        self.assertEqual(self.tracks.last("a", n=2)['time'].tolist(), [5, 6])
+        self.assertEqual(len(self.tracks.trail("a")), 4)
+
+    def test_older_positions_ignored(self):
+        self.append("a", 10)
+        self.append("a", 10)
+        self.append("a", 5)
+        self.assertEqual(self.tracks.last("a")['time'].tolist(), [10])
+
+    def test_unknown_aircraft(self):
+        self.assertEqual(len(self.tracks.last("unknown")['time']), 0)
+        self.assertIsNone(self.tracks.vertical_speed("unknown"))
+        self.assertIsNone(self.tracks.ground_speed("unknown"))
+
+    def test_grows_beyond_capacity(self):
+        for n in range(5):
+            self.append(f"f{n}", 1)
+        self.assertEqual(len(self.tracks), 5)
+        self.assertEqual(self.tracks.last("f4")['time'].tolist(), [1])
+
+    def test_vertical_speed(self):
+        for t in range(0, 240, 60):
+            self.append("a", t, altitude=10000 + 20 * t)
+        self.assertEqual(self.tracks.vertical_speed("a"), 1200)
+
+    def test_ground_speed(self):
+        self.tracks.append("a", 0, 43.0, 1.0, 10000, 0, 0)
+        self.tracks.append("a", 360, 44.0, 1.0, 10000, 0, 0)
+        self.assertAlmostEqual(self.tracks.ground_speed("a"), 600, delta=2)
+
+    def test_append_from_store_matches_append(self):
+        store = TrafficStore(capacity=4)
+        reference = TrackStore(capacity=2, length=4)
+        for t in range(1, 7):
+            store.begin_update()
+            for n in range(3):
+                # Aircraft 2 reports a new position every other poll only
+                last_contact = t - t % 2 if n == 2 else t
+                latitude, altitude = 43.0 + n + t / 100, 1000 * t
+                store.update(f"f{n}", "icao", "CS", latitude, 1.0, 90.0, altitude, 300, 0, "", "", last_contact)
+                reference.append(f"f{n}", last_contact, latitude, 1.0, altitude, 300, 90.0)
+            store.end_update()
+            self.tracks.append_from_store(store)
+
+        for n in range(3):
+            expected, actual = reference.last(f"f{n}"), self.tracks.last(f"f{n}")
+            for field in expected:
+                np.testing.assert_array_equal(actual[field], expected[field])
+
+    def test_prune(self):
+        with mock.patch('web_app.track_store.time.time', return_value=1000):
+            self.append("old", 1)
+        with mock.patch('web_app.track_store.time.time', return_value=1200):
+            self.append("recent", 1)
+        with mock.patch('web_app.track_store.time.time', return_value=1400):
+            self.tracks.prune()
+        self.assertNotIn("old", self.tracks)
+        self.assertIn("recent", self.tracks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.traffic_index import TrafficIndex, k_nearest_traffic, DIRECTIONS
+from web_app.traffic_store import TrafficStore, TRAFFIC_DTYPE
+
+
+def random_traffic(n, seed=0):
+    rng = np.random.default_rng(seed)
+    states = np.zeros(n, dtype=TRAFFIC_DTYPE)
+    states['icao24'] = [f"CS{k}" for k in range(n)]
+    states['latitude'] = np.concatenate([rng.normal(43.6, 0.1, n // 2), rng.uniform(41, 47, n - n // 2)])
+    states['longitude'] = np.concatenate([rng.normal(1.4, 0.1, n // 2), rng.uniform(-2, 5, n - n // 2)])
+    states['heading'] = rng.uniform(0, 360, n)
+    states['altitude'] = rng.uniform(0, 40000, n)
+    states['speed'] = rng.uniform(0, 500, n)
+    return np.array([f"id{k}" for k in range(n)], dtype=object), states
+
+
+class TestTrafficIndex(unittest.TestCase):
+    def setUp(self):
+        self.flight_ids, self.states = random_traffic(2000)
+        self.index = TrafficIndex(self.flight_ids, self.states)
+
+    def brute_force(self, latitude, longitude, k, predicate=None, max_distance=None):
+        x, y = self.index.project(latitude, longitude)
+        distances = np.hypot(self.index.x - x, self.index.y - y)
+        rows = np.arange(len(self.states))
+        if predicate is not None:
+            rows = rows[predicate(rows)]
+        if max_distance is not None:
+            rows = rows[distances[rows] <= max_distance]
+        return distances[rows[np.argsort(distances[rows], kind='stable')[:k]]]
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(1)
+        high = lambda rows: self.states['altitude'][rows] > 30000
+        for latitude, longitude in zip(rng.uniform(40, 48, 30), rng.uniform(-3, 6, 30)):
+            for k, predicate, max_distance in ((1, None, None), (5, None, None), (10, high, None),
+                                               (5, None, 20), (3000, None, None)):
+                rows, distances = self.index.nearest(latitude, longitude, k, predicate, max_distance)
+                np.testing.assert_allclose(distances, self.brute_force(latitude, longitude, k, predicate, max_distance))
+                x, y = self.index.project(latitude, longitude)
+                np.testing.assert_allclose(np.hypot(self.index.x[rows] - x, self.index.y[rows] - y), distances)
+
+    def test_empty_index(self):
+        index = TrafficIndex(self.flight_ids[:0], self.states[:0])
+        rows, distances = index.nearest(43.6, 1.4, 3)
+        self.assertEqual((len(rows), len(distances), len(index)), (0, 0, 0))
+
+
+class TestKNearestTraffic(unittest.TestCase):
+    def setUp(self):
+        self.store = TrafficStore()
+        self.store.begin_update()
+        # Own aircraft at (43, 1) heading north at 10000 ft, 300 kt
+        for flight_id, latitude, longitude, heading, altitude in [
+                ("own", 43.0, 1.0, 0, 10000),
+                ("ahead", 43.1, 1.0, 180, 11000), # 6 nm at 12 o'clock, head-on, above
+                ("right", 43.0, 1.2, 0, 9000),    # ~8.8 nm at 3 o'clock, below
+                ("behind", 42.8, 1.0, 0, 10000),  # 12 nm at 6 o'clock
+                ("far", 45.0, 1.0, 0, 10000)]:
+            # The store keeps the displayed callsign in its icao24 field
+            self.store.update(flight_id, flight_id.upper(), "", latitude, longitude, heading,
+                              altitude, 300, 0, "", "", 0)
+        self.store.end_update()
+        self.own = {'id': "own", 'latitude': 43.0, 'longitude': 1.0, 'heading': 0, 'speed': 300, 'altitude': 10000}
+
+    def ids(self, **kwargs):
+        return [t['id'] for t in k_nearest_traffic(self.store, self.own, **kwargs)]
+
+    def test_nearest_excluding_own(self):
+        self.assertEqual(self.ids(k=3), ["ahead", "right", "behind"])
+        self.assertEqual(self.ids(k=10, max_distance=10), ["ahead", "right"])
+
+    def test_directions(self):
+        self.assertEqual(set(DIRECTIONS), {'around', 'above', 'below', 'ahead', 'behind', 'left', 'right'})
+        self.assertEqual(self.ids(direction='above'), ["ahead"])
+        self.assertEqual(self.ids(direction='below'), ["right"])
+        self.assertEqual(self.ids(direction='right'), ["right"])
+        self.assertEqual(self.ids(direction='behind'), ["behind"])
+        self.assertEqual(self.ids(direction='left'), [])
+
+    def test_relative_geometry(self):
+        ahead, right, behind = k_nearest_traffic(self.store, self.own, k=3)
+        self.assertEqual((ahead['clock'], right['clock'], behind['clock']), (12, 3, 6))
+        self.assertAlmostEqual(ahead['distance'], 6, delta=0.1)
+        self.assertAlmostEqual(ahead['closure_rate'], 600, delta=1)
+        self.assertAlmostEqual(behind['closure_rate'], 0, delta=1)
+        self.assertEqual(ahead['relative_altitude'], 1000)
+        self.assertAlmostEqual(right['relative_bearing'], 90, delta=0.5)
+        self.assertEqual(right['callsign'], "RIGHT")
+
+    def test_excluded_by_callsign(self):
+        self.own = dict(self.own, id=None)
+        self.assertEqual(self.ids(k=1), ["own"])
+        self.own['callsign'] = "OWN"
+        self.assertEqual(self.ids(k=1), ["ahead"])
+
+    def test_index_follows_polls(self):
+        self.assertEqual(self.ids(k=1), ["ahead"])
+        self.store.begin_update()
+        self.store.update("new", "NEW", "", 43.01, 1.0, 0, 10000, 300, 0, "", "", 0)
+        self.store.end_update()
+        self.assertEqual(self.ids(k=3), ["new"])
+
+
+if __name__ == '__main__':
+    unittest.main()
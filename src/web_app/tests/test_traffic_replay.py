@@ -0,0 +1,117 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.flightradar.coordinates import Area, Point
+from web_app.opensky_api import OpenSkyApi
+from web_app.traffic_replay import (TrafficRecorder, TrafficRecording, ReplayAPI, ReplayOpenSkyApi,
+                                    params_key, area_bounds, covers)
+
+
+def fr24_flight(latitude, longitude, last_contact):
+    return ["icao", latitude, longitude, 90, 30000, 450, "", "", "A320", "F-ABCD", last_contact]
+
+
+def osn_state(icao24, latitude, longitude, last_contact):
+    return [icao24, "CS", "France", last_contact, last_contact, longitude, latitude, 9000.0]
+
+
+class TestTrafficReplay(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.now = 100.0
+        patcher = mock.patch('web_app.traffic_replay.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # No on-disk cache for the OpenSky clients
+        patcher = mock.patch.object(OpenSkyApi, '_static_cache', object())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def record(self, entries):
+        """ Records (time, call, key, response) entries and loads them back at 10x speed """
+        recorder = TrafficRecorder(self.folder.name)
+        for t, call, key, response in entries:
+            self.now = t
+            recorder.record(call, key, response)
+        recorder.close()
+        self.now = 1000.0
+        return TrafficRecording(recorder.filename, speed=10)
+
+    def test_helpers(self):
+        self.assertEqual(params_key(None), "")
+        self.assertEqual(params_key({'b': 1, 'a': None, 'c': 2}), '{"b": 1, "c": 2}')
+        area = Area(Point(44, 0), Point(42, 3))
+        self.assertEqual(area_bounds(area), (42, 44, 0, 3))
+        self.assertEqual(area_bounds(str(area)), (42, 44, 0, 3))
+        self.assertTrue(covers((42, 44, 0, 3), (43, 44, 1, 2)))
+        self.assertFalse(covers((42, 44, 0, 3), (43, 45, 1, 2)))
+
+    def test_responses_played_back_on_clock(self):
+        recording = self.record([(100, 'get_flight_json', "f1", {'v': 1}),
+                                 (110, 'get_flight_json', "f1", {'v': 2}),
+                                 (120, 'get_flight_json', "f2", {'v': 3})])
+        self.assertEqual(recording.get('get_flight_json', "f1"), {'v': 1})
+        self.now += 1.5 # 15 s in the recording
+        self.assertEqual(recording.get('get_flight_json', "f1"), {'v': 2})
+        self.assertEqual(recording.offset(), 1001.5 - 115)
+        # Recorded after the current time only
+        self.assertEqual(recording.get('get_flight_json', "f2"), {'v': 3})
+        self.assertIsNone(recording.get('get_flight_json', "f3"))
+        self.assertIsNone(recording.get('unknown'))
+
+    def test_recording_loops(self):
+        recording = self.record([(100, 'call', "k", 1), (110, 'call', "k", 2)])
+        recording.now()
+        self.now += 1.5
+        self.assertEqual(recording.get('call'), 1)
+
+    def test_fr24_area_from_covering_recorded_area(self):
+        recorded = {'f1': fr24_flight(43.5, 1.5, 100), 'f2': fr24_flight(43.5, 2.5, 100),
+                    'full_count': 2, 'version': 4}
+        recording = self.record([(100, 'get_area_raw', str(Area(Point(44, 0), Point(42, 3))), recorded)])
+        api = ReplayAPI(recording)
+
+        flights = api.get_area_raw(Area(Point(44, 1), Point(43, 2)))
+        self.assertEqual(set(flights), {'f1', 'full_count', 'version'})
+        self.assertEqual(flights['f1'][10], 1000)
+        # Not covered by the recorded area
+        self.assertEqual(api.get_area_raw(Area(Point(45, 1), Point(43, 2))), {})
+
+    def test_fr24_flight(self):
+        recording = self.record([(100, 'get_flight_json', "f1", {'v': 1}),
+                                 (100, 'get_search_results', "AFR", [1, 2, 3])])
+        api = ReplayAPI(recording)
+        self.assertEqual(api.get_flight_json("f1"), {'v': 1})
+        with self.assertRaises(KeyError):
+            api.get_flight_json("f2")
+        self.assertEqual(api.get_search_results("AFR", 2), [1, 2])
+        self.assertEqual(api.get_search_results("KLM", 2), [])
+
+    def test_osn_states_filtered_by_bounds_and_icao24(self):
+        params = {'time': 0, 'lamin': 42, 'lamax': 44, 'lomin': 0, 'lomax': 3}
+        recorded = {'time': 100, 'states': [osn_state("a", 43.5, 1.5, 100), osn_state("b", 43.5, 2.5, 100)]}
+        recording = self.record([(100, 'osn/states/all', params_key(params), recorded)])
+        api = ReplayOpenSkyApi(recording)
+
+        states = api.get_states(bbox=(43, 44, 1, 2))
+        self.assertEqual([s.icao24 for s in states.states], ["a"])
+        self.assertEqual(states.states[0].last_contact, 1000)
+        self.assertEqual(states.time, 1000)
+
+        # Single aircraft found in the recorded box
+        self.assertEqual([s.icao24 for s in api.get_states(icao24="b").states], ["b"])
+        # Box not covered
+        self.assertIsNone(api.get_states(bbox=(40, 44, 1, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             os.path.pardir, os.path.pardir))
+
+from web_app.traffic_store import TrafficStore, EMIT_FIELDS
+
+
+def state(n, last_contact=1000.0):
+    return (f"icao{n}", f"CS{n}", 43.0 + n / 100, 1.0 + n / 100, 90.0,
+            30000, 450, 0, "LFBO", "LFPG", last_contact)
+
+
+class TestTrafficStore(unittest.TestCase):
+    def setUp(self):
+        self.store = TrafficStore(capacity=2)
+
+    def poll(self, numbers):
+        self.store.begin_update()
+        for n in numbers:
+            self.store.update(f"id{n}", *state(n))
+        self.store.end_update()
+
+    def test_update_and_get(self):
+        self.poll([1])
+        self.assertIn("id1", self.store)
+        flight = self.store.get("id1")
+        self.assertEqual(flight['callsign'], "CS1")
+        self.assertEqual(flight['altitude'], 30000)
+        self.assertIsNone(self.store.get("unknown"))
+
+    def test_grows_beyond_capacity(self):
+        self.poll(range(5))
+        self.assertEqual(len(self.store), 5)
+        self.assertEqual(len(self.store.data), 8)
+        self.assertEqual(sorted(self.store.view()[0]), [f"id{n}" for n in range(5)])
+
+    def test_not_seen_aircraft_removed(self):
+        self.poll([1, 2, 3])
+        self.poll([2])
+        self.assertEqual(list(self.store.view()[0]), ["id2"])
+        self.assertEqual(self.store.version, 2)
+
+    def test_released_rows_reused(self):
+        self.poll([1, 2])
+        row = self.store.index["id1"]
+        self.poll([2])
+        self.poll([2, 3])
+        self.assertEqual(self.store.index["id3"], row)
+        self.assertEqual(len(self.store.data), 2)
+
+    def test_view_is_a_copy(self):
+        self.poll([1])
+        ids, states = self.store.view()
+        states['altitude'][:] = 0
+        self.assertEqual(self.store.get("id1")['altitude'], 30000)
+
+    def test_to_records(self):
+        self.poll([1, 2])
+        records = self.store.to_records()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(list(records[0]), EMIT_FIELDS)
+
+    def test_spatial_index_rebuilt_after_poll(self):
+        self.poll([1])
+        index = self.store.spatial_index()
+        self.assertIs(self.store.spatial_index(), index)
+        self.poll([1, 2])
+        self.assertIsNot(self.store.spatial_index(), index)
+
+    def test_time_update_str(self):
+        self.assertEqual(self.store.time_update_str(), "No flight")
+        self.poll([1])
+        self.assertEqual(self.store.time_update_str(), "1970-01-01 [00:16:40 >> 00:16:40]")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,13 @@
+"""
+Utils for the identifiers typed or spoken by the users (callsigns, registrations, ICAO codes, idents)
+"""
+import re
+
+
+NON_ALPHANUMERIC = re.compile(r'[^0-9A-Z]')
+
+
+def normalize(identifier):
+    """ Returns the key of an identifier : upper case, alphanumeric only ("F-GKXA" -> "FGKXA", "" if None)
+    """
+    return NON_ALPHANUMERIC.sub('', str(identifier or '').upper())
@@ -0,0 +1,194 @@
+"""
+Trajectory history of the aircraft in the airspace
+
+"""
+import time
+import numpy as np
+from .geo_utils import coord_to_dist
+
+
+TRACK_FIELDS = ['time', 'latitude', 'longitude', 'altitude', 'speed', 'heading']
+
+
+class TrackStore:
+    """
+    Bounded history of the positions of each aircraft, kept in fixed-size ring buffers
+    (one row of NumPy arrays per aircraft), fed by the live traffic store at each poll.
+    """
+    def __init__(self, capacity=1024, length=64, max_age=300):
+        self.length = length
+        self.max_age = max_age # Aircraft not seen for max_age seconds are forgotten
+        self.buffers = {field : np.zeros((capacity, length)) for field in TRACK_FIELDS}
+        self.head = np.zeros(capacity, dtype=int) # Next position to write
+        self.count = np.zeros(capacity, dtype=int)
+        self.last_seen = np.zeros(capacity)
+        self.index = {} # flight id -> row
+        self.ids = np.empty(capacity, dtype=object)
+        self.free_rows = list(range(capacity - 1, -1, -1))
+
+
+    def __len__(self):
+        return len(self.index)
+
+
+    def __contains__(self, flight_id):
+        return flight_id in self.index
+
+
+    def _grow(self):
+        """ Doubles the number of aircraft the store can hold
+        """
+        old_capacity = len(self.head)
+        for field in TRACK_FIELDS:
+            self.buffers[field] = np.concatenate([self.buffers[field], np.zeros((old_capacity, self.length))])
+        self.head = np.concatenate([self.head, np.zeros(old_capacity, dtype=int)])
+        self.count = np.concatenate([self.count, np.zeros(old_capacity, dtype=int)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros(old_capacity)])
+        self.ids = np.concatenate([self.ids, np.empty(old_capacity, dtype=object)])
+        self.free_rows.extend(range(2 * old_capacity - 1, old_capacity - 1, -1))
+
+
+    def _row(self, flight_id):
+        row = self.index.get(flight_id)
+        if row is None:
+            if not self.free_rows:
+                self._grow()
+            row = self.free_rows.pop()
+            self.index[flight_id] = row
+            self.ids[row] = flight_id
+            self.head[row] = 0
+            self.count[row] = 0
+        return row
+
+
+    def remove(self, flight_id):
+        row = self.index.pop(flight_id, None)
+        if row is not None:
+            self.ids[row] = None
+            self.count[row] = 0
+            self.free_rows.append(row)
+
+
+    def append(self, flight_id, timestamp, latitude, longitude, altitude, speed, heading):
+        """ Adds a position to the track of an aircraft, if it is newer than the last one
+        """
+        row = self._row(flight_id)
+        self.last_seen[row] = time.time()
+        if self.count[row] > 0 and timestamp <= self.buffers['time'][row, self.head[row] - 1]:
+            return
+
+        values = (timestamp, latitude, longitude, altitude, speed, heading)
+        for field, value in zip(TRACK_FIELDS, values):
+            self.buffers[field][row, self.head[row]] = value
+        self.head[row] = (self.head[row] + 1) % self.length
+        self.count[row] = min(self.count[row] + 1, self.length)
+
+
+    def append_from_store(self, store):
+        """ Adds the current position of every aircraft of a TrafficStore
+
+        Parameters
+        ----------
+        store : TrafficStore
+            Live traffic
+        """
+        ids, states = store.view()
+        if len(ids) > 0:
+            rows = np.array([self._row(flight_id) for flight_id in ids])
+            self.last_seen[rows] = time.time()
+
+            # Only keep the states newer than the last stored position
+            last_time = self.buffers['time'][rows, self.head[rows] - 1]
+            is_new = (self.count[rows] == 0) | (states['last_contact'] > last_time)
+            rows, states = rows[is_new], states[is_new]
+
+            heads = self.head[rows]
+            self.buffers['time'][rows, heads] = states['last_contact']
+            for field in TRACK_FIELDS[1:]:
+                self.buffers[field][rows, heads] = states[field]
+            self.head[rows] = (heads + 1) % self.length
+            self.count[rows] = np.minimum(self.count[rows] + 1, self.length)
+
+        self.prune()
+
+
+    def prune(self):
+        """ Forgets the aircraft not seen for more than max_age seconds
+        """
+        if len(self.index) == 0:
+            return
+        too_old = np.flatnonzero((self.ids != None) & (self.last_seen < time.time() - self.max_age))
+        for row in too_old:
+            self.remove(self.ids[row])
+
+
+    def last(self, flight_id, n=None):
+        """ Returns the last n positions of an aircraft, oldest first
+
+        Parameters
+        ----------
+        flight_id : str
+            Unique ID of the flight
+        n : int, optional
+            Number of positions, by default all the stored ones
+
+        Returns
+        -------
+        dict
+            Field -> np.array, empty arrays if the aircraft is unknown
+        """
+        row = self.index.get(flight_id)
+        if row is None:
+            return {field : np.array([]) for field in TRACK_FIELDS}
+
+        count = self.count[row] if n is None else min(n, self.count[row])
+        positions = (self.head[row] - count + np.arange(count)) % self.length
+        return {field : self.buffers[field][row, positions] for field in TRACK_FIELDS}
+
+
+    def trail(self, flight_id, n=None):
+        """ Returns the last n positions of an aircraft as a list of [latitude, longitude], oldest first
+        """
+        points = self.last(flight_id, n)
+        return np.column_stack([points['latitude'], points['longitude']]).tolist()
+
+
+    def vertical_speed(self, flight_id, n=8):
+        """ Smoothed vertical speed (least squares slope of the altitude over the last n positions)
+
+        Returns
+        -------
+        int or None
+            Vertical speed in ft/min, None if there are less than two positions
+        """
+        points = self.last(flight_id, n)
+        if len(points['time']) < 2 or np.ptp(points['time']) == 0:
+            return None
+        slope = np.polyfit(points['time'], points['altitude'], 1)[0] # ft/s
+        return int(round(60 * slope))
+
+
+    def ground_speed(self, flight_id, n=2):
+        """ Ground speed derived from the distance flown between the first and the last of the last n positions
+
+        Returns
+        -------
+        int or None
+            Ground speed in kt, None if there are less than two positions
+        """
+        points = self.last(flight_id, n)
+        if len(points['time']) < 2:
+            return None
+        dt = points['time'][-1] - points['time'][0]
+        if dt <= 0:
+            return None
+        dist = coord_to_dist(points['latitude'][0], points['longitude'][0],
+                             points['latitude'][-1], points['longitude'][-1]) # nm
+        if np.isnan(dist):
+            dist = 0
+        return int(round(3600 * dist / dt))
+
+
+
+# Tracks shared by the airspace handlers and the followed flight
+track_store = TrackStore()
@@ -0,0 +1,193 @@
+"""
+Spatial index of the live traffic, and k-nearest traffic queries with relative geometry
+
+The aircraft of the last poll are projected on a local plane (nm) and sorted by cell of a grid.
+A k-nearest query visits the non-empty cells by ring around the position, until the k-th aircraft
+found is closer than the next ring : only the aircraft of the neighbourhood are evaluated.
+The index is a snapshot of the store, rebuilt at the first query after each poll
+(see TrafficStore.spatial_index).
+"""
+import numpy as np
+
+from .geo_utils import NM_PER_DEG
+
+
+# Size of the grid cells (nm)
+TRAFFIC_CELL_NM = 10
+# Margin (ft) for an aircraft to be above / below
+ABOVE_BELOW_MARGIN = 300
+
+# Directions of the traffic queries : filter on the relative bearing (°, [-180, 180[) and altitude (ft)
+DIRECTIONS = {
+    'around' : lambda bearing, altitude : np.ones(len(bearing), dtype=bool),
+    'above' : lambda bearing, altitude : altitude > ABOVE_BELOW_MARGIN,
+    'below' : lambda bearing, altitude : altitude < -ABOVE_BELOW_MARGIN,
+    'ahead' : lambda bearing, altitude : np.abs(bearing) <= 60,
+    'behind' : lambda bearing, altitude : np.abs(bearing) >= 120,
+    'left' : lambda bearing, altitude : (bearing <= -30) & (bearing >= -150),
+    'right' : lambda bearing, altitude : (bearing >= 30) & (bearing <= 150),
+}
+
+
+def velocity(speed, heading):
+    """ Returns the (east, north) components (kt) of a ground speed (kt) along a track (°)
+    """
+    track = np.radians(heading)
+    return speed * np.sin(track), speed * np.cos(track)
+
+
+
+class TrafficIndex:
+    """
+    Grid index of a snapshot of the traffic
+    """
+    def __init__(self, flight_ids, states, version=None, cell_size=TRAFFIC_CELL_NM):
+        self.version = version
+        self.cell_size = cell_size
+        self.flight_ids = flight_ids
+        self.states = states
+        self.latitude0 = float(states['latitude'].mean()) if len(states) else 0.
+        self.longitude0 = float(states['longitude'].mean()) if len(states) else 0.
+        self.x, self.y = self.project(states['latitude'], states['longitude'])
+
+        cx, cy = self.cell(self.x, self.y)
+        order = np.lexsort((cy, cx))
+        keys = np.stack([cx[order], cy[order]], axis=1)
+        self.cell_keys, starts = np.unique(keys, axis=0, return_index=True)
+        self.cell_rows = np.split(order, starts[1:]) # rows (positions in states) of each cell
+
+
+    def __len__(self):
+        return len(self.states)
+
+
+    def project(self, latitude, longitude):
+        """ Returns the coordinates (nm) of positions on the local plane of the index
+        """
+        x = (np.asarray(longitude) - self.longitude0 + 180) % 360 - 180
+        x = x * NM_PER_DEG * np.cos(np.radians(self.latitude0))
+        y = (np.asarray(latitude) - self.latitude0) * NM_PER_DEG
+        return x, y
+
+
+    def cell(self, x, y):
+        return np.floor(x / self.cell_size).astype(np.int64), np.floor(y / self.cell_size).astype(np.int64)
+
+
+    def nearest(self, latitude, longitude, k=1, predicate=None, max_distance=None):
+        """ Returns the k nearest aircraft of a position
+
+        Parameters
+        ----------
+        latitude, longitude : float
+            Position
+        k : int, optional
+            Number of aircraft, by default 1
+        predicate : callable, optional
+            Called with the rows of candidates, returns a boolean mask of the accepted ones, by default None
+        max_distance : float, optional
+            Maximum distance (nm), by default None
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+            Rows of the aircraft in states, and their distances (nm), by increasing distance
+        """
+        x, y = self.project(latitude, longitude)
+        rows, distances = np.zeros(0, dtype=np.int64), np.zeros(0)
+        if len(self.cell_keys) == 0:
+            return rows, distances
+
+        # Non-empty cells by ring around the cell of the position
+        rings = np.abs(self.cell_keys - np.array(self.cell(x, y))).max(axis=1)
+        cells = np.argsort(rings, kind='stable')
+        bounds = np.flatnonzero(np.diff(rings[cells])) + 1
+        for group, next_start in zip(np.split(cells, bounds), np.append(bounds, len(cells))):
+            candidates = np.concatenate([self.cell_rows[c] for c in group])
+            if predicate is not None:
+                candidates = candidates[predicate(candidates)]
+            rows = np.concatenate([rows, candidates])
+            distances = np.concatenate([distances, np.hypot(self.x[candidates] - x, self.y[candidates] - y)])
+
+            # The aircraft of the next rings are farther than (ring - 1) * cell_size
+            if next_start == len(cells):
+                break
+            reach = (rings[cells[next_start]] - 1) * self.cell_size
+            if max_distance is not None and reach >= max_distance:
+                break
+            if len(rows) >= k and np.partition(distances, k - 1)[k - 1] <= reach:
+                break
+
+        if max_distance is not None:
+            keep = distances <= max_distance
+            rows, distances = rows[keep], distances[keep]
+        best = np.argsort(distances, kind='stable')[:k]
+        return rows[best], distances[best]
+
+
+
+def k_nearest_traffic(store, own, k=3, direction='around', max_distance=None):
+    """ Returns the k nearest aircraft of the traffic store, and their geometry relative to an aircraft
+
+    Parameters
+    ----------
+    store : TrafficStore
+        Live traffic
+    own : dict
+        State of the aircraft : 'latitude', 'longitude', 'heading' (°), 'speed' (kt), 'altitude' (ft),
+        and optionally 'id' (flight ID in the store) and 'callsign', excluded from the results
+    k : int, optional
+        Number of aircraft, by default 3
+    direction : str, optional
+        Key of DIRECTIONS, by default 'around'
+    max_distance : float, optional
+        Maximum distance (nm), by default None
+
+    Returns
+    -------
+    list
+        By increasing distance : {'id', 'callsign', 'distance' (nm), 'bearing' (°), 'relative_bearing' (°,
+        [-180, 180[, positive to the right), 'clock' (1 - 12), 'relative_altitude' (ft), 'closure_rate' (kt,
+        positive when closing)}
+    """
+    index = store.spatial_index()
+    states = index.states
+    heading = own.get('heading') or 0
+    altitude = own.get('altitude') or 0
+    own_x, own_y = index.project(own['latitude'], own['longitude'])
+    filter_direction = DIRECTIONS[direction]
+
+    def relative_bearing(rows):
+        bearing = np.degrees(np.arctan2(index.x[rows] - own_x, index.y[rows] - own_y))
+        return (bearing - heading + 180) % 360 - 180
+
+    def predicate(rows):
+        mask = filter_direction(relative_bearing(rows), states['altitude'][rows] - altitude)
+        mask &= index.flight_ids[rows] != own.get('id')
+        if own.get('callsign'):
+            mask &= states['icao24'][rows] != own['callsign']
+        return mask
+
+    rows, distances = index.nearest(own['latitude'], own['longitude'], k, predicate, max_distance)
+    if len(rows) == 0:
+        return []
+
+    # Closure rate : opposite of the derivative of the distance
+    px, py = index.x[rows] - own_x, index.y[rows] - own_y
+    own_vx, own_vy = velocity(own.get('speed') or 0, heading)
+    vx, vy = velocity(states['speed'][rows], states['heading'][rows])
+    closure = -((vx - own_vx) * px + (vy - own_vy) * py) / np.maximum(distances, 1e-6)
+
+    relative = relative_bearing(rows)
+    bearing = (relative + heading) % 360
+    clock = np.round(relative / 30).astype(int) % 12
+    return [{
+        'id' : str(index.flight_ids[r]),
+        'callsign' : str(states['icao24'][r]),
+        'distance' : float(distances[n]),
+        'bearing' : float(bearing[n]),
+        'relative_bearing' : float(relative[n]),
+        'clock' : int(clock[n]) or 12,
+        'relative_altitude' : int(states['altitude'][r] - altitude),
+        'closure_rate' : float(closure[n]),
+    } for n, r in enumerate(rows)]
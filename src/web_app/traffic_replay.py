@@ -0,0 +1,360 @@
+"""
+Record and replay of the traffic data APIs (FlightRadar24, OpenSkyNetwork)
+
+Recording : set TRAFFIC_RECORD to a folder, every raw response is appended to
+            a compressed timestamped file (traffic_<date>.jsonl.gz) in this folder.
+Replay    : set TRAFFIC_REPLAY to a recorded file, the handlers are then served
+            from this file instead of the network, at TRAFFIC_REPLAY_SPEED (default 1x).
+"""
+import bisect
+import copy
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from .flightradar.api import API
+from .log_utils import fprint, print_error
+from .metrics import UPSTREAM_LATENCY
+from .opensky_api import OpenSkyApi, StateVector
+
+
+TRAFFIC_RECORD = os.environ.get('TRAFFIC_RECORD')
+TRAFFIC_REPLAY = os.environ.get('TRAFFIC_REPLAY')
+TRAFFIC_REPLAY_SPEED = float(os.environ.get('TRAFFIC_REPLAY_SPEED', 1))
+
+# Positions of the timestamps to shift in the replayed responses
+FR24_LAST_CONTACT = 10
+OSN_TIME_POSITION, OSN_LAST_CONTACT = 3, 4
+# Positions of the coordinates, to filter the replayed responses by area
+FR24_LAT, FR24_LON = 1, 2
+OSN_ICAO24, OSN_LON, OSN_LAT = 0, 5, 6
+
+
+# =======================================================================
+# ===================== RECORD ==========================================
+# =======================================================================
+
+class TrafficRecorder:
+    """
+    Appends the raw responses of the APIs to a gzip file, one JSON object per line :
+    {"t": time of the response, "call": API method, "key": arguments, "response": raw response}
+    """
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.filename = os.path.join(folder, f"traffic_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz")
+        self.file = gzip.open(self.filename, 'at', encoding='utf-8')
+        self.lock = threading.Lock()
+
+
+    def record(self, call, key, response):
+        line = json.dumps({'t' : time.time(), 'call' : call, 'key' : key, 'response' : response})
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+recorder = None
+
+def get_recorder():
+    """ Returns the recorder shared by all the APIs (created at first use)
+    """
+    global recorder
+    if recorder is None:
+        recorder = TrafficRecorder(TRAFFIC_RECORD)
+    return recorder
+
+
+
+class RecordingAPI(API):
+    """ FlightRadar24 API recording its responses """
+    def __init__(self, recorder, **hooks):
+        super().__init__(**hooks)
+        self.recorder = recorder
+
+    def get_area_raw(self, area, VERBOSE=False):
+        response = super().get_area_raw(area, VERBOSE=VERBOSE)
+        self.recorder.record('get_area_raw', str(area), response)
+        return response
+
+    def get_flight_json(self, flight_id):
+        response = super().get_flight_json(flight_id)
+        self.recorder.record('get_flight_json', flight_id, response)
+        return response
+
+    def get_search_results(self, query, limit):
+        response = super().get_search_results(query, limit)
+        self.recorder.record('get_search_results', query, response)
+        return response
+
+
+
+class RecordingOpenSkyApi(OpenSkyApi):
+    """ OpenSkyNetwork API recording its responses """
+    def __init__(self, recorder, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recorder = recorder
+
+    def _get_json(self, url_post, callee, params=None):
+        response = super()._get_json(url_post, callee, params=params)
+        if response is not None:
+            self.recorder.record('osn' + url_post, params_key(params), response)
+        return response
+
+    def _get_static_json(self, url_post, kind, params=None):
+        response = super()._get_static_json(url_post, kind, params=params)
+        self.recorder.record('osn' + url_post, params_key(params), response)
+        return response
+
+    def find_state(self, callsign, chunk_size=65536):
+        state = super().find_state(callsign, chunk_size=chunk_size)
+        if state is not None:
+            self.recorder.record('osn/find_state', callsign, [getattr(state, k) for k in StateVector.keys])
+        return state
+
+
+def params_key(params):
+    if not params:
+        return ""
+    return json.dumps({k : v for k, v in params.items() if v is not None}, sort_keys=True)
+
+
+def area_bounds(area):
+    """ Returns the (south, north, west, east) bounds of an Area, or of its recorded key (str(area))
+    """
+    lat1, lon1, lat2, lon2 = [float(v) for v in str(area).split(',')]
+    return min(lat1, lat2), max(lat1, lat2), min(lon1, lon2), max(lon1, lon2)
+
+
+def covers(outer, inner):
+    """ Whether the (south, north, west, east) box outer contains the box inner
+    """
+    return outer[0] <= inner[0] and outer[1] >= inner[1] and outer[2] <= inner[2] and outer[3] >= inner[3]
+
+
+def in_bounds(latitude, longitude, bounds):
+    s, n, w, e = bounds
+    return latitude is not None and longitude is not None and s <= latitude <= n and w <= longitude <= e
+
+
+# =======================================================================
+# ===================== REPLAY ==========================================
+# =======================================================================
+
+class TrafficRecording:
+    """
+    Recorded responses, played back on a clock.
+    The recording time starts at the first response, when the first response is requested,
+    and moves at `speed` times the wall clock.
+    """
+    def __init__(self, filename, speed=1.0):
+        self.speed = speed
+        self.calls = {} # call -> (list of times, list of (key, response))
+        with gzip.open(filename, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                times, responses = self.calls.setdefault(entry['call'], ([], []))
+                times.append(entry['t'])
+                responses.append((entry['key'], entry['response']))
+
+        all_times = [t for times, _ in self.calls.values() for t in times]
+        self.first_time = min(all_times) if all_times else 0
+        self.last_time = max(all_times) if all_times else 0
+        self.start = None
+
+
+    def now(self):
+        """ Current time in the recording (loops at the end of the recording)
+        """
+        if self.start is None:
+            self.start = time.time()
+        duration = max(self.last_time - self.first_time, 1e-6)
+        elapsed = ((time.time() - self.start) * self.speed) % duration
+        return self.first_time + elapsed
+
+
+    def offset(self):
+        """ Time to add to the recorded timestamps to make them look current
+        """
+        return time.time() - self.now()
+
+
+    def get(self, call, key=None):
+        """ Returns the last response of a call recorded before the current recording time.
+        If a key is given, the last response recorded with this key is preferred.
+        """
+        if key is None:
+            return self.get_matching(call, lambda k: True)
+        return self.get_matching(call, lambda k: k == key)
+
+
+    def get_matching(self, call, accept):
+        """ Returns the last response of a call recorded before the current recording time with
+        a key accepted by a predicate, else the first one recorded after, None if there is none.
+        """
+        if call not in self.calls:
+            return None
+        times, responses = self.calls[call]
+        end = max(bisect.bisect_right(times, self.now()), 1)
+
+        for i in range(end - 1, -1, -1):
+            if accept(responses[i][0]):
+                return copy.deepcopy(responses[i][1])
+        # Not recorded before current time: first one recorded after
+        for i in range(end, len(responses)):
+            if accept(responses[i][0]):
+                return copy.deepcopy(responses[i][1])
+        return None
+
+
+
+class ReplayAPI(API):
+    """ FlightRadar24 API served from a recording """
+    def __init__(self, recording, **hooks):
+        super().__init__(**hooks)
+        self.recording = recording
+
+    def get_area_raw(self, area, VERBOSE=False):
+        # Several areas are polled (airspace, follower, tiles) : replay a response recorded for an
+        # area covering the requested one, restricted to the requested area
+        bounds = area_bounds(area)
+        data = self.recording.get_matching('get_area_raw', lambda key: covers(area_bounds(key), bounds)) or {}
+        offset = self.recording.offset()
+        flights = {}
+        for k, f in data.items():
+            if not isinstance(f, list):
+                flights[k] = f # stats entries
+            elif in_bounds(f[FR24_LAT], f[FR24_LON], bounds):
+                f[FR24_LAST_CONTACT] += offset
+                flights[k] = f
+        return flights
+
+    def get_flight_json(self, flight_id):
+        data = self.recording.get('get_flight_json', flight_id)
+        if data is None:
+            raise KeyError(flight_id)
+        return data
+
+    def get_search_results(self, query, limit):
+        return (self.recording.get('get_search_results', query) or [])[:limit]
+
+
+
+class ReplayOpenSkyApi(OpenSkyApi):
+    """ OpenSkyNetwork API served from a recording """
+    def __init__(self, recording, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recording = recording
+
+    def _wait_rate_limit(self, time_diff_noauth, time_diff_auth, func):
+        return True
+
+    def _shift_state(self, state, offset):
+        for i in (OSN_TIME_POSITION, OSN_LAST_CONTACT):
+            if state[i] is not None:
+                state[i] += offset
+        return state
+
+    def _covers(self, key, bounds, icao24):
+        """ Whether a response recorded with a params key contains the states of a request
+        """
+        recorded = json.loads(key) if key else {}
+        recorded_icao24 = recorded.get('icao24')
+        if recorded_icao24 is not None:
+            recorded_icao24 = [recorded_icao24] if isinstance(recorded_icao24, str) else recorded_icao24
+            if icao24 is None or not set(icao24) <= set(recorded_icao24):
+                return False
+        if 'lamin' in recorded:
+            recorded_bounds = (recorded['lamin'], recorded['lamax'], recorded['lomin'], recorded['lomax'])
+            if bounds is None or not covers(recorded_bounds, bounds):
+                return False
+        return True
+
+    def _get_json(self, url_post, callee, params=None):
+        # Replay a response recorded with params covering the requested ones, filtered to them
+        params = params or {}
+        icao24 = params.get('icao24')
+        icao24 = [icao24] if isinstance(icao24, str) else icao24
+        bounds = None
+        if 'lamin' in params:
+            bounds = (params['lamin'], params['lamax'], params['lomin'], params['lomax'])
+
+        data = self.recording.get_matching('osn' + url_post, lambda key: self._covers(key, bounds, icao24))
+        if data is None and icao24 and bounds is None:
+            # Aircraft not recorded alone : look for it in the recorded boxes
+            data = self.recording.get_matching('osn' + url_post, lambda key: self._covers(key, None, icao24)
+                                               or 'lamin' in (json.loads(key) if key else {}))
+        if data is None:
+            return None
+        offset = self.recording.offset()
+        data['time'] += offset
+        states = data.get('states') or []
+        if icao24:
+            states = [s for s in states if s[OSN_ICAO24] in icao24]
+        if bounds is not None:
+            states = [s for s in states if in_bounds(s[OSN_LAT], s[OSN_LON], bounds)]
+        data['states'] = [self._shift_state(s, offset) for s in states]
+        return data
+
+    def _get_static_json(self, url_post, kind, params=None):
+        return self.recording.get('osn' + url_post, params_key(params))
+
+    def find_state(self, callsign, chunk_size=65536):
+        state = self.recording.get('osn/find_state', callsign)
+        if state is None:
+            return None
+        return StateVector(self._shift_state(state, self.recording.offset()))
+
+
+# =======================================================================
+# ===================== FACTORIES =======================================
+# =======================================================================
+
+replay_recording = None
+
+def get_replay_recording():
+    """ Returns the recording shared by all the APIs (loaded at first use)
+    """
+    global replay_recording
+    if replay_recording is None:
+        replay_recording = TrafficRecording(TRAFFIC_REPLAY, speed=TRAFFIC_REPLAY_SPEED)
+    return replay_recording
+
+
+def observe_fr24_request(endpoint, duration):
+    UPSTREAM_LATENCY.observe(duration, endpoint=endpoint)
+
+
+def fr24_hooks():
+    """ Returns the hooks connecting the FlightRadar24 client to the metrics and the logger
+    """
+    return {'on_request' : observe_fr24_request,
+            'log' : lambda message, **fields: fprint(message, category='traffic', **fields),
+            'log_error' : lambda message, **fields: print_error(message, category='traffic', **fields)}
+
+
+def make_fr24_api():
+    """ Returns the FlightRadar24 API to use (live, recording or replay)
+    """
+    if TRAFFIC_REPLAY:
+        return ReplayAPI(get_replay_recording(), **fr24_hooks())
+    if TRAFFIC_RECORD:
+        return RecordingAPI(get_recorder(), **fr24_hooks())
+    return API(**fr24_hooks())
+
+
+def make_opensky_api(username=None, password=None):
+    """ Returns the OpenSkyNetwork API to use (live, recording or replay)
+    """
+    if TRAFFIC_REPLAY:
+        return ReplayOpenSkyApi(get_replay_recording(), username=username, password=password)
+    if TRAFFIC_RECORD:
+        return RecordingOpenSkyApi(get_recorder(), username=username, password=password)
+    return OpenSkyApi(username=username, password=password)
@@ -0,0 +1,204 @@
+"""
+Live traffic store shared by the traffic handlers and the queries
+
+"""
+import numpy as np
+from datetime import datetime
+from .dead_reckoning import extrapolate_states, MAX_EXTRAPOLATION
+from .traffic_index import TrafficIndex
+
+
+# One row per aircraft. Names of the fields are the ones sent to the client
+TRAFFIC_DTYPE = np.dtype([
+    ('icao24', 'U16'),
+    ('callsign', 'U16'),
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('heading', 'f8'),
+    ('altitude', 'i4'),
+    ('speed', 'i4'),
+    ('vertical_speed', 'i4'),
+    ('origin', 'U8'),
+    ('destination', 'U8'),
+    ('last_contact', 'f8'),
+])
+
+EMIT_FIELDS = ['icao24', 'callsign', 'latitude', 'longitude', 'heading', 'altitude',
+               'speed', 'vertical_speed', 'origin', 'destination']
+
+
+class TrafficStore:
+    """
+    Live traffic backed by a NumPy structured array, indexed by flight id.
+    Rows are updated in place at each poll, and rows of the aircraft that
+    were not seen during the last poll are released for later reuse.
+    """
+    def __init__(self, capacity=1024):
+        self.data = np.zeros(capacity, dtype=TRAFFIC_DTYPE)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.seen = np.zeros(capacity, dtype=bool)
+        self.index = {} # flight id -> row
+        self.ids = np.empty(capacity, dtype=object) # row -> flight id
+        self.free_rows = list(range(capacity - 1, -1, -1))
+        self.version = 0 # number of polls
+        self.index_snapshot = None
+
+
+    def __len__(self):
+        return len(self.index)
+
+
+    def __contains__(self, flight_id):
+        return flight_id in self.index
+
+
+    def _grow(self):
+        """ Doubles the capacity of the store
+        """
+        old_capacity = len(self.data)
+        new_capacity = 2 * old_capacity
+
+        data = np.zeros(new_capacity, dtype=TRAFFIC_DTYPE)
+        data[:old_capacity] = self.data
+        self.data = data
+        self.active = np.concatenate([self.active, np.zeros(old_capacity, dtype=bool)])
+        self.seen = np.concatenate([self.seen, np.zeros(old_capacity, dtype=bool)])
+        self.ids = np.concatenate([self.ids, np.empty(old_capacity, dtype=object)])
+        self.free_rows.extend(range(new_capacity - 1, old_capacity - 1, -1))
+
+
+    def begin_update(self):
+        """ Starts a poll: every aircraft is considered as not seen
+        """
+        self.seen[:] = False
+
+
+    def update(self, flight_id, icao24, callsign, latitude, longitude, heading,
+               altitude, speed, vertical_speed, origin, destination, last_contact):
+        """ Updates (or inserts) the state of an aircraft in place
+
+        Parameters
+        ----------
+        flight_id : str
+            Unique ID of the flight given by the data source
+        others :
+            Values of the fields of TRAFFIC_DTYPE
+
+        Returns
+        -------
+        int
+            Row of the aircraft
+        """
+        row = self.index.get(flight_id)
+        if row is None:
+            if not self.free_rows:
+                self._grow()
+            row = self.free_rows.pop()
+            self.index[flight_id] = row
+            self.ids[row] = flight_id
+            self.active[row] = True
+
+        self.data[row] = (icao24, callsign, latitude, longitude, heading,
+                          altitude, speed, vertical_speed, origin, destination, last_contact)
+        self.seen[row] = True
+        return row
+
+
+    def remove(self, flight_id):
+        """ Removes an aircraft from the store
+
+        Parameters
+        ----------
+        flight_id : str
+            Unique ID of the flight
+        """
+        row = self.index.pop(flight_id, None)
+        if row is None:
+            return
+        self.active[row] = False
+        self.seen[row] = False
+        self.ids[row] = None
+        self.free_rows.append(row)
+
+
+    def end_update(self):
+        """ Ends a poll: aircraft not seen since begin_update() are removed
+        """
+        for row in np.flatnonzero(self.active & ~self.seen):
+            self.remove(self.ids[row])
+        self.version += 1
+
+
+    def rows(self):
+        """ Returns the rows of the aircraft currently in the store
+        """
+        return np.flatnonzero(self.active)
+
+
+    def view(self):
+        """ Returns the (flight ids, states) of the aircraft currently in the store.
+        States is a copy of the structured array restricted to active rows
+        """
+        rows = self.rows()
+        return self.ids[rows], self.data[rows]
+
+
+    def spatial_index(self):
+        """ Returns the spatial index of the aircraft of the last poll (built at the first call after each poll)
+        """
+        index = self.index_snapshot
+        if index is None or index.version != self.version:
+            index = TrafficIndex(*self.view(), version=self.version)
+            self.index_snapshot = index
+        return index
+
+
+    def get(self, flight_id):
+        """ Returns the state of an aircraft as a dictionary, None if unknown
+
+        Parameters
+        ----------
+        flight_id : str
+            Unique ID of the flight
+        """
+        row = self.index.get(flight_id)
+        if row is None:
+            return None
+        return dict(zip(TRAFFIC_DTYPE.names, self.data[row].tolist()))
+
+
+    def to_records(self, now=None, max_horizon=MAX_EXTRAPOLATION):
+        """ Returns the list of aircraft in the format sent to the client
+
+        Parameters
+        ----------
+        now : float, optional
+            If given, positions are extrapolated to this time (s since epoch), by default None
+        max_horizon : float, optional
+            Maximum extrapolation horizon in seconds, by default MAX_EXTRAPOLATION
+        """
+        states = self.data[self.rows()]
+        if now is not None:
+            states = extrapolate_states(states, now, max_horizon)
+        values = states[EMIT_FIELDS].tolist()
+        return [dict(zip(EMIT_FIELDS, v)) for v in values]
+
+
+    def time_update_str(self):
+        """ Returns the range of the last contact times as a string
+        """
+        rows = self.rows()
+        if len(rows) == 0:
+            return "No flight"
+
+        last_contacts = self.data['last_contact'][rows]
+        oldest, newest = last_contacts.min(), last_contacts.max()
+        ancien_update_time = datetime.utcfromtimestamp(oldest).strftime('%H:%M:%S')
+        recent_update_time = datetime.utcfromtimestamp(newest).strftime('%H:%M:%S')
+        date_update_time = datetime.utcfromtimestamp(oldest).strftime('%Y-%m-%d')
+        return f"{date_update_time} [{ancien_update_time} >> {recent_update_time}]"
+
+
+
+# Store shared by the airspace handlers and the queries
+traffic_store = TrafficStore()
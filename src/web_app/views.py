@@ -4,17 +4,26 @@ Web app views
 """
 # Start with a basic flask app webpage.
 from flask_socketio import SocketIO, emit
-from flask import Flask, render_template, url_for, copy_current_request_context, request, jsonify
+from flask import Flask, render_template, url_for, copy_current_request_context, request, jsonify, Response, abort
 from random import random
+from collections import namedtuple
+from types import MappingProxyType
 import os
+import time
 from threading import Thread, Event
 from .flight_data_handler import *
 
 import logging
-import traceback
 from .log_utils import *
 from .query_ontology import *
 from .nlu import *
+from .track_store import track_store
+from .metrics import POLL_LAG, EMIT_PAYLOAD_SIZE, QUERY_TIME, FOCUS_CHANGES, render_metrics
+from .profiler import profiler
+from .serializer import sio_json, dumps, Fragment, FragmentDict
+from . import static_tiles
+from .static_diff import make_static_layers
+from .conflict_detection import ConflictDetector
 
 
 # =======================================================================
@@ -27,7 +36,7 @@ app.config['DEBUG'] = True
 
 log = logging.getLogger('werkzeug')
 log.disabled = True
-sio = SocketIO(app, async_mode=None, logger=False, engineio_logger=False, cors_allowed_origins="*")
+sio = SocketIO(app, async_mode=None, logger=False, engineio_logger=False, cors_allowed_origins="*", json=sio_json)
 # ====================================
 
 USE_FR24 = True # !!! IMPORTANT !!! Are you using FR24 or OSN ? Modify also in script.js
@@ -37,8 +46,28 @@ thread = Thread()
 USE_RADAR = True
 ontology_is_init = False
 SLEEP_TIME = .5 if USE_FR24 else 2
-
-autocomplete_handler = AutocompleteHandler()
+# Traffic is fetched every FETCH_TIME seconds, and extrapolated (dead reckoning) at each emit in between
+DEAD_RECKONING = True
+EMIT_TIME = .5
+FETCH_TIME = 2 if USE_FR24 else 5
+# Size of one 'airspace' message out of METRICS_EMIT_SAMPLE is measured (encoding it again is not free)
+METRICS_EMIT_SAMPLE = int(os.environ.get('METRICS_EMIT_SAMPLE', 20))
+# Static layers loaded by the client as HTTP tiles (/tiles), else sent as 'static_diff' messages when focus changes
+STATIC_TILES = os.environ.get('STATIC_TILES', '1') == '1'
+STATIC_RADIUS = 100
+# Conflicts between the aircraft detected at each poll, sent in the 'airspace' messages (list_alerts)
+CONFLICT_ALERTS = os.environ.get('CONFLICT_ALERTS', '1') == '1'
+
+autocomplete_handler = AutocompleteHandler(sleep=sio.sleep)
+
+# Immutable snapshots shared by the workers and the handlers : they are never modified once
+# published, a new snapshot replaces the previous one (single reference assignment)
+Focus = namedtuple('Focus', ['center', 'box', 'zoom', 'fields', 'fragments'])
+FollowTarget = namedtuple('FollowTarget', ['flight_id', 'static_info', 'latitude', 'longitude'])
+FOLLOW_STATIC_FIELDS = ['id', 'registration', 'callsign', 'model', 'model_text', 'origin', 'origin_icao',
+                        'destination', 'destination_icao', 'time_scheduled', 'time_estimated']
+# Token of the admin views (if not set, they are only served to localhost)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
 
 
@@ -56,11 +85,19 @@ class AirspaceBackgroundWorker:
     def __init__(self, sio, box=None, center=None):
         self.sio = sio
         self.switch = True
-        self.box = box
-        self.center = center
+        self.focus = Focus(center, box, None, MappingProxyType({}), MappingProxyType({}))
+        # Last traffic fetched, and last message emitted
+        self.traffic = {}
         self.surrounding_data = {}
-        self.flight_data_process = FlightRadar24Handler() if USE_FR24 else OpenSkyNetworkHandler()
+        self.flight_data_process = make_traffic_handler(USE_FR24)
         self.previous_error = ""
+        self.last_fetch = 0
+        self.n_emits = 0
+        self.static_layers = make_static_layers()
+        self.conflict_detector = ConflictDetector()
+        self.focus_request = None
+        self.focus_generation = 0
+        self.focus_task_running = False
         self.update_static_data()
 
         print_info("----- Background airspace worker initialized -----")
@@ -69,85 +106,166 @@ class AirspaceBackgroundWorker:
     def do_work(self):
         """ Main loop of the airspace thread
         """
+        next_tick = None
         while self.switch:
             try:
-                # Handle traffic
-                if USE_RADAR:
-                    self.flight_data_process.get_current_airspace(self.surrounding_data, center=self.center)
-                else:
-                    self.flight_data_process.get_current_airspace(self.surrounding_data, box=self.box)
-        
+                if next_tick is not None:
+                    POLL_LAG.observe(max(0, time.time() - next_tick), worker='airspace')
 
-                self.sio.emit('airspace', self.surrounding_data)
+                focus = self.focus
 
-                print_info(datetime.now().strftime("%d-%m-%Y %H:%M:%S"), 
-                    f"# Flights : {self.surrounding_data['number_flights']}", 
-                    f"# Airports : {len(self.surrounding_data['list_airports'])}",
-                    f"# Runways : {len(self.surrounding_data['list_runways'])}",
+                # Handle traffic
+                if not DEAD_RECKONING or time.time() - self.last_fetch >= FETCH_TIME:
+                    self.last_fetch = time.time()
+                    traffic = {}
+                    if USE_RADAR:
+                        self.flight_data_process.get_current_airspace(traffic, center=focus.center)
+                    else:
+                        self.flight_data_process.get_current_airspace(traffic, box=focus.box)
+                    if CONFLICT_ALERTS:
+                        self.conflict_detector.submit(self.flight_data_process.store, now=time.time())
+                    self.traffic = traffic
+
+                # Build the frame from the snapshots, then publish it
+                message = FragmentDict(self.traffic)
+                message.update(focus.fields)
+                message.update(focus.fragments)
+                if CONFLICT_ALERTS:
+                    # Alerts of the last detection completed (computed in the background at each poll)
+                    message['list_alerts'] = self.conflict_detector.alerts
+                if DEAD_RECKONING:
+                    message['list_flights'] = self.flight_data_process.store.to_records(now=time.time())
+                message['emit_time'] = time.time()
+                self.surrounding_data = message
+
+                self.sio.emit('airspace', message)
+                self.n_emits += 1
+                if METRICS_EMIT_SAMPLE and self.n_emits % METRICS_EMIT_SAMPLE == 0:
+                    EMIT_PAYLOAD_SIZE.observe(len(dumps(message)), event='airspace')
+
+                print_info("Airspace emitted", category='airspace', sample=20,
+                    flights=message.get('number_flights'),
+                    alerts=len(message.get('list_alerts', [])),
+                    static_version=message.get('static_version'),
                     )
 
-                self.sio.sleep(SLEEP_TIME)
+                period = EMIT_TIME if DEAD_RECKONING else SLEEP_TIME
+                next_tick = time.time() + period
+                self.sio.sleep(period)
 
             except Exception as e:
                 if str(e) != self.previous_error:
-                    print_error(f"Error airpsace : {type(e).__name__} {str(e)}")
-                    print_error(traceback.format_exc())
-                    print_error("------------------------------------------------------------")
+                    print_error(f"Error airspace : {type(e).__name__} {str(e)}", category='airspace', exc_info=True)
                     self.previous_error = str(e)
     
 
-    def update_static_data(self):
-        """ Updates static data (airport, runways, navaids, waypoints), when focus changes
+    def update_static_data(self, center=None, box=None, zoom=None, cancelled=None):
+        """ Updates static data (airport, runways, navaids, waypoints) for a new focus.
+        The new focus and its static data are published together, once everything is computed
+
+        Parameters
+        ----------
+        center, box, zoom : optional
+            New focus center, box and zoom level, by default None (unchanged)
+        cancelled : callable, optional
+            Called during the update, which is abandoned (nothing published) if it returns True
+
+        Returns
+        -------
+        bool
+            True if the new focus was published
         """
+        focus = self.focus
+        center = focus.center if center is None else center
+        box = focus.box if box is None else box
+        zoom = focus.zoom if zoom is None else zoom
         try:
-            self.surrounding_data['center'] = self.center
-            self.surrounding_data['box'] = self.box
-
-            # Handle airports
-            self.surrounding_data['list_airports'] = []
-            get_near_airports(self.surrounding_data, self.center)
-
-            # # Handle frequencies
-            get_near_frequencies(self.surrounding_data)
-
-            # # Handle runways
-            self.surrounding_data['list_runways'] = []
-            get_near_runways(self.surrounding_data, self.center)
-            
-            # # Handle navaids
-            self.surrounding_data['list_navaids'] = []
-            get_near_navaids(self.surrounding_data, self.center)
-
-            # # Handle waypoints
-            self.surrounding_data['list_waypoints'] = []
-            get_near_waypoints(self.surrounding_data, self.center)
+            diff = None
+            if not STATIC_TILES:
+                # Only the objects entering / leaving the box are sent to the clients
+                s, n, w, e = get_box_from_center(center, STATIC_RADIUS)
+                diff = self.static_layers.update(s, n, w, e, zoom, cancelled=cancelled)
+                if diff is None:
+                    return False
+            if STATIC_TILES:
+                fields = {'tiles_url' : static_tiles.tile_set.url_template()}
+            else:
+                fields = {'static_version' : diff['version']}
+
+            # Publish
+            self.focus = Focus(center, box, zoom, MappingProxyType(fields),
+                MappingProxyType({'center' : Fragment(center), 'box' : Fragment(box)}))
+            if diff is not None:
+                self.sio.emit('static_diff', diff)
+            return True
         
         except Exception as e:
-                print_error(f"Error airspace : {str(e)}")
+                print_error(f"Error airspace static data : {str(e)}", category='airspace', exc_info=True)
+                return False
 
 
-    def update_box(self, box):
+    def update_box(self, box, zoom=None):
         """ Updates the focus box
 
         Parameters
         ----------
         box : tuple
             New box
+        zoom : int, optional
+            New zoom level of the map, by default None (unchanged)
         """
-        self.box = box
-        self.update_static_data()
+        self.update_static_data(box=box, zoom=zoom)
 
     
-    def update_center(self, center):
+    def update_center(self, center, zoom=None):
         """ Updates the focus center
 
         Parameters
         ----------
         center : tuple
             New center
+        zoom : int, optional
+            New zoom level of the map, by default None (unchanged)
         """
-        self.center = center
-        self.update_static_data()
+        self.update_static_data(center=center, zoom=zoom)
+
+
+    def request_focus(self, center=None, box=None, zoom=None):
+        """ Queues a focus change, handled by a background task (the caller is not blocked).
+        During a burst of focus changes, only the latest one is handled : the update in progress
+        is cancelled and the intermediate ones are skipped
+
+        Parameters
+        ----------
+        center, box, zoom : optional
+            New focus center, box and zoom level, by default None (unchanged)
+        """
+        self.focus_request = (center, box, zoom)
+        self.focus_generation += 1
+        if not self.focus_task_running:
+            self.focus_task_running = True
+            self.sio.start_background_task(self.process_focus_requests)
+
+
+    def process_focus_requests(self):
+        """ Background task handling the queued focus changes, latest first
+        """
+        try:
+            while self.focus_request is not None:
+                (center, box, zoom), self.focus_request = self.focus_request, None
+                generation = self.focus_generation
+
+                def cancelled():
+                    # Let the other events run, and check whether a newer focus arrived meanwhile
+                    self.sio.sleep(0)
+                    return self.focus_generation != generation
+
+                if not self.update_static_data(center, box, zoom, cancelled=cancelled):
+                    FOCUS_CHANGES.inc(result='superseded')
+                else:
+                    FOCUS_CHANGES.inc(result='published')
+        finally:
+            self.focus_task_running = False
 
 
     def stop(self):
@@ -163,28 +281,12 @@ class FlightFollowerWorker:
     """
     def __init__(self, sio, airspace_worker):
         self.sio = sio
-        self.flight_id = ""
         self.switch = True
-        self.is_following = False
+        # Followed flight (None if not following) and last frame emitted
+        self.target = None
         self.flight_follower_query = FlightSpecificQueryHandlerFR24() if USE_FR24 else FlightSpecificQueryHandlerOSN()
 
-        # To search near this position
-        self.latitude = 0
-        self.longitude = 0
         self.flight_data = {}
-        self.static_info = {
-            'id' : "",
-            'registration' : "",
-            'callsign' : "",
-            'model' : "",
-            'model_text' : "",
-            'origin' : "",
-            'origin_icao' : "",
-            'destination' : "",
-            'destination_icao' : "",
-            'time_scheduled' : {},
-            'time_estimated' : {},
-        }
 
         self.airspace_worker = airspace_worker
         self.previous_error = ""
@@ -194,44 +296,59 @@ class FlightFollowerWorker:
         """ Main loop of the follow-up worker
         """
         dynamic_data = {'latitude' : 0, 'longitude' : 0, 'heading' : 0, 'altitude' : 0, 'speed' : 0, 'vertical_speed' : 0, 'last_contact' : 0}
+        # To search near this position
+        latitude, longitude = 0, 0
 
+        target = None
+        next_tick = None
         while self.switch:
             try:
-                if self.is_following:
+                if next_tick is not None:
+                    POLL_LAG.observe(max(0, time.time() - next_tick), worker='follow')
+                    next_tick = None
+
+                if self.target is not target:
+                    # New flight followed
+                    target = self.target
+                    if target is not None:
+                        latitude, longitude = target.latitude, target.longitude
+
+                if target is not None:
                     
                     if USE_FR24:
-                        dynamic_data =  self.flight_follower_query.query_dynamic_data(self.latitude, self.longitude, self.flight_id)
+                        dynamic_data =  self.flight_follower_query.query_dynamic_data(latitude, longitude, target.flight_id)
                     else:
-                        dynamic_data =  self.flight_follower_query.query_dynamic_data(self.latitude, self.longitude, self.flight_id, dynamic_data)
+                        dynamic_data =  self.flight_follower_query.query_dynamic_data(latitude, longitude, target.flight_id, dynamic_data)
                         if dynamic_data is None:
+                            next_tick = time.time() + SLEEP_TIME
                             self.sio.sleep(SLEEP_TIME)
                             continue
   
                     # Move box around the current followed flight
-                    self.latitude = dynamic_data['latitude']
-                    self.longitude = dynamic_data['longitude']
+                    latitude = dynamic_data['latitude']
+                    longitude = dynamic_data['longitude']
 
-                    self.flight_data = self.static_info.copy()
-                    for k in dynamic_data:
-                        self.flight_data[k] = dynamic_data[k]
+                    # New frame (static info of the target, current dynamic data)
+                    flight_data = {**target.static_info, **dynamic_data}
+                    flight_data['trail'] = track_store.trail(target.static_info['id'])
+                    flight_data['is_following'] = True
 
-                    print_info(datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
-                        f"Following {self.flight_id}")
+                    print_info(f"Following {target.flight_id}", category='follow', sample=20)
                 else:
-                    flight_data = {}
-                    print_info(datetime.now().strftime("%d-%m-%Y %H:%M:%S"),
-                        f"Not following")
-
-                self.flight_data['is_following'] = self.is_following
-                
-                self.sio.emit('follow_flight_info', self.flight_data)
+                    # Last frame, marked as not followed anymore
+                    flight_data = self.flight_data
+                    if flight_data.get('is_following', True):
+                        flight_data = {**flight_data, 'is_following' : False}
+                    print_info("Not following", category='follow', sample=20)
+
+                self.flight_data = flight_data
+                self.sio.emit('follow_flight_info', flight_data)
+                next_tick = time.time() + SLEEP_TIME
                 self.sio.sleep(SLEEP_TIME)
             
             except Exception as e:
                 if str(e) != self.previous_error:
-                    print_error(f"Error following flight : {type(e).__name__} {str(e)}")
-                    print_error(traceback.format_exc())
-                    print_error("------------------------------------------------------------")
+                    print_error(f"Error following flight : {type(e).__name__} {str(e)}", category='follow', exc_info=True)
                     self.previous_error = str(e)
 
 
@@ -243,19 +360,24 @@ class FlightFollowerWorker:
         flight_id : str
             Flight ID
         """
-        self.is_following = True
-        self.flight_id = flight_id
-        current_flight_data =  self.flight_follower_query.query_complete_flight(self.flight_id)
-        self.latitude = current_flight_data['latitude']
-        self.longitude = current_flight_data['longitude']
-
-        for k in self.static_info:
-            self.static_info[k] = current_flight_data[k]
+        current_flight_data =  self.flight_follower_query.query_complete_flight(flight_id)
+        static_info = {k : current_flight_data[k] for k in FOLLOW_STATIC_FIELDS}
+        self.target = FollowTarget(flight_id, MappingProxyType(static_info),
+                                   current_flight_data['latitude'], current_flight_data['longitude'])
 
 
     def stop_following(self):
-        self.is_following = False
-        self.flight_id = ''
+        self.target = None
+
+
+    @property
+    def is_following(self):
+        return self.target is not None
+
+
+    @property
+    def flight_id(self):
+        return self.target.flight_id if self.target is not None else ''
 
 
     @timeit
@@ -273,23 +395,33 @@ class FlightFollowerWorker:
             query_type, args_list = query_args[0], query_args[1:]
             arg1 = args_list[0]
             arg2 = args_list[1] if len(args_list) > 1 else None
-            print_event(f"Query: <{query_type}>. Argument 1: <{arg1}>. Argument 2: <{arg2}>")
+            print_event("Query", category='query', query=query_type, arg1=arg1, arg2=arg2)
         else:
             arg1, arg2 = None, None
-            print_event(f"Query: <{query_type}>")
+            print_event("Query", category='query', query=query_type)
 
         
         # Special requests that need other stuff
         if query_type == 'nearestTrafic':
-            arg1 = airspace_worker.surrounding_data['list_flights']
+            arg1 = airspace_worker.flight_data_process.store
+
+        elif query_type == 'trafficAround':
+            arg1, arg2 = airspace_worker.flight_data_process.store, arg1
             
         elif query_type == 'eta':
-            self.update_flight_static_info(self.flight_id)
-            arg1 = self.static_info.get('time_estimated')
+            # Only refresh the times, not the whole flight
+            target = self.target
+            times = self.flight_follower_query.query_flight_times(target.flight_id) if target is not None else {}
+            if target is not None and self.target is target:
+                self.target = target._replace(static_info=MappingProxyType({**target.static_info, **times}))
+            arg1 = times.get('time_estimated', {})
         # End special requests
 
 
-        response_dict = process_query(query_type, arg1, arg2, self.flight_data)
+        # Unknown types (sent by the client) are grouped, to bound the number of label values
+        intent = query_type if query_type in QUERY_TYPES else 'other'
+        with QUERY_TIME.time(intent=intent):
+            response_dict = process_query(query_type, arg1, arg2, self.flight_data)
         return response_dict
 
 
@@ -336,7 +468,7 @@ def start_work(sid):
 def index():
     """ Sends the webview
     """
-    print_event(request)
+    print_event("Page request", category='http', url=request.url)
     return render_template('index.html')
 
 
@@ -377,11 +509,81 @@ def get_speech_transcript():
     return jsonify({"success" : True, "response" : response_str})
 
 
+# Clustered static layers, by name
+CLUSTER_LAYERS = {'navaids' : query_map_near_navaids, 'waypoints' : query_map_near_waypoints}
+
+@app.route('/_clusters', methods=['GET'])
+def clusters():
+    """ Returns the navaids or waypoints (layer) within a box (s, n, w, e), clustered at a zoom level
+    (400 if a bound is missing or not a number, or if the layer is unknown)
+    """
+    layer = request.args.get('layer', 'waypoints')
+    s, n, w, e = (request.args.get(k, type=float) for k in ('s', 'n', 'w', 'e'))
+    zoom = request.args.get('zoom', type=int)
+    if None in (s, n, w, e) or layer not in CLUSTER_LAYERS:
+        abort(400)
+    results = CLUSTER_LAYERS[layer](s, n, w, e, zoom)
+    return jsonify(layer=layer, zoom=zoom, results=results)
+
+
+
+@app.route('/tiles/<build>/<int:z>/<int:x>/<int:y>.json', methods=['GET'])
+def static_tile(build, z, x, y):
+    """ Sends a tile of the static layers. Tiles never change for a given build of the static data
+    """
+    tile_set = static_tiles.tile_set
+    if build != tile_set.build or not (static_tiles.MIN_TILE_ZOOM <= z <= static_tiles.MAX_TILE_ZOOM) \
+            or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify(error="Unknown tile"), 404
+
+    response = Response(mimetype='application/json')
+    response.set_etag(tile_set.etag(z, x, y))
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if tile_set.etag(z, x, y) in request.if_none_match:
+        response.status_code = 304
+        return response
+    response.set_data(tile_set.get(z, x, y))
+    return response
+
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """ Exposes the app metrics (upstream latency, loop lag, query time, ...) in the Prometheus text format
+    """
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+
+@app.route('/admin/profiler', methods=['GET'])
+def admin_profiler():
+    """ Starts (action=start), stops (action=stop) the sampling profiler, or gets its status (default).
+    Stop returns the samples in the collapsed stack format (flamegraph.pl, speedscope)
+    """
+    if ADMIN_TOKEN:
+        if request.args.get('token') != ADMIN_TOKEN:
+            return jsonify(error="Forbidden"), 403
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify(error="Forbidden"), 403
+
+    action = request.args.get('action', 'status')
+    if action == 'start':
+        profiler.start()
+        print_event("Profiler started", category='http')
+    elif action == 'stop':
+        profiler.stop()
+        print_event("Profiler stopped", category='http', **profiler.status())
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    return jsonify(profiler.status())
+
+
 
 
 # =============== SOCKET =======================
 init_ontology_individuals()
 init_dataframes_individuals()
+sio.start_background_task(watch_checklists, sio.sleep)
+static_tiles.init_static_tiles()
 load_nlu_engine()
 
 @sio.on('init_worker')
@@ -395,15 +597,15 @@ def get_change_focus(data):
     """ Updates the view of the airspace worker when the followed flight moves, or
     the uses changes focus
     """ 
-    print_event(f"Change focus : {data}")
+    print_event("Change focus", category='socket', data=data)
     if USE_RADAR:
         center = (data['latitude'], data['longitude'])
-        airspace_worker.update_center(center)
+        airspace_worker.request_focus(center=center, zoom=data.get('zoom'))
     else:
         min_lat, max_lat = data['latitude'] - 1, data['latitude'] + 1
         min_long, max_long = data['longitude'] - 2, data['longitude'] + 2
         box = (min_lat, max_lat, min_long, max_long)
-        airspace_worker.update_box(box)
+        airspace_worker.request_focus(box=box, zoom=data.get('zoom'))
 
     if not(data['follow']):
         flight_follower_worker.stop_following()
@@ -415,12 +617,20 @@ def new_follow_flight(data):
     """ Updates the flight follower when the user selects another flight
     """
     flight_id = data['flight_id']
-    print_event(f"New follow flight : {data['label']}")
+    print_event("New follow flight", category='socket', label=data['label'])
     # Update a thread that moves center
     flight_follower_worker.update_flight_static_info(flight_id)
 
 
 
+@sio.on('get_static')
+def get_static_layers():
+    """ Sends the full static layers to a client (at connection, or when it missed a 'static_diff')
+    """
+    emit('static_full', airspace_worker.static_layers.full())
+
+
+
 @sio.on('disconnect')
 def test_disconnect():
-    print_event('Client disconnected')
+    print_event("Client disconnected", category='socket')
@@ -0,0 +1,337 @@
+"""
+Benchmark suite of the query and map pipelines, fully offline
+(ontology, checklists and NLU engine are read from src/, no traffic or weather API is called)
+
+Usage (from any folder):
+    python benchmarks.py                  # run, and compare with the stored baselines
+    python benchmarks.py --save           # run, and store the results as the new baselines
+    python benchmarks.py -k near          # only run the benchmarks whose name contains "near"
+    python benchmarks.py --threshold 1.5  # regression if slower than 1.5x the baseline
+
+The exit code is 1 if at least one benchmark regressed.
+The best round is compared to the baseline one : the median is too sensitive to the load of the machine.
+The benchmarks of the traffic pipeline only need numpy : when the app data cannot be loaded
+(missing dependencies, ontology not pulled with git-lfs), the other ones are skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "src"))
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# The app uses paths relative to src/
+sys.path.insert(0, SRC_PATH)
+os.chdir(SRC_PATH)
+
+
+# =======================================================================
+# ===================== HARNESS =========================================
+# =======================================================================
+
+BENCHMARKS = []
+
+def benchmark(rounds=20, warmup=2, needs_app=True):
+    """ Registers a benchmark function. The function takes a context dict and runs one iteration.
+    Benchmarks with needs_app use the app data (ontology, NLU engine)
+    """
+    def decorator(func):
+        BENCHMARKS.append((func.__name__, func, rounds, warmup, needs_app))
+        return func
+    return decorator
+
+
+def run_benchmark(func, context, rounds, warmup):
+    """ Runs a benchmark and returns its timings (s)
+    """
+    for _ in range(warmup):
+        func(context)
+    timings = []
+    for _ in range(rounds):
+        tic = time.perf_counter()
+        func(context)
+        timings.append(time.perf_counter() - tic)
+    return {
+        'median' : statistics.median(timings),
+        'min' : min(timings),
+        'max' : max(timings),
+        'rounds' : rounds,
+    }
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES_FILE):
+        return {}
+    with open(BASELINES_FILE) as f:
+        return json.load(f).get('results', {})
+
+
+def save_baselines(results):
+    with open(BASELINES_FILE, 'w') as f:
+        json.dump({
+            'machine' : platform.node(),
+            'python' : platform.python_version(),
+            'date' : time.strftime('%Y-%m-%d %H:%M:%S'),
+            'results' : results,
+        }, f, indent=2, sort_keys=True)
+
+
+# =======================================================================
+# ===================== CONTEXT =========================================
+# =======================================================================
+
+TOULOUSE = (43.59972466458162, 1.4492797572165728)
+
+FLIGHT_DATA = {
+    'id' : "2973b74b", 'registration' : "F-HBXN", 'callsign' : "AFR0000", 'model' : "A320",
+    'model_text' : "Airbus A320-214", 'origin' : "Toulouse Blagnac Airport", 'origin_icao' : "LFBO",
+    'destination' : "Paris Charles de Gaulle Airport", 'destination_icao' : "LFPG",
+    'time_scheduled' : {'departure' : 1633860000, 'arrival' : 1633864800},
+    'time_estimated' : {'departure' : 1633860300, 'arrival' : 1633865100},
+    'latitude' : TOULOUSE[0] + 0.3, 'longitude' : TOULOUSE[1] + 0.2, 'heading' : 20,
+    'speed' : 420, 'vertical_speed' : 1500, 'altitude' : 21000, 'last_contact' : 1633861000,
+}
+
+# (query_type, arg1, arg2) of the intents that can be answered offline
+OFFLINE_INTENTS = [
+    ('departureAirport', None, None),
+    ('arrivalAirport', None, None),
+    ('runwaysAtAirport', 'LFBO', None),
+    ('frequencyAtAirport', 'twr', 'LFBO'),
+    ('nearestAirport', None, None),
+    ('currentParam', 'altitude', None),
+    ('runwaysAtNearestAirport', None, None),
+    ('nearestTrafic', 'STORE', None),
+    ('trafficAround', 'STORE', 'above'),
+    ('lengthNearestRunway', None, None),
+    ('eta', FLIGHT_DATA['time_estimated'], None),
+    ('checklist', 'landing', None),
+]
+
+UTTERANCES = [
+    "what is the nearest airport",
+    "what are the runways at toulouse blagnac",
+    "what is the weather at paris",
+    "give me the landing checklist",
+]
+
+
+def make_traffic(store, n_flights, seed=0):
+    """ Fills a TrafficStore with n_flights synthetic aircraft around Toulouse
+    """
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    store.begin_update()
+    for i in range(n_flights):
+        store.update(f"id{i}",
+            icao24=f"AFR{i:04d}", callsign=f"F-{i:04d}",
+            latitude=TOULOUSE[0] + rng.uniform(-0.9, 0.9),
+            longitude=TOULOUSE[1] + rng.uniform(-1.2, 1.2),
+            heading=rng.uniform(0, 360), altitude=int(rng.uniform(0, 40000)),
+            speed=int(rng.uniform(120, 500)), vertical_speed=int(rng.uniform(-2000, 2000)),
+            origin="TLS", destination="CDG", last_contact=now - rng.uniform(0, 10))
+    store.end_update()
+    return store
+
+
+def make_context():
+    """ Loads the app data once (timed as the startup benchmarks)
+    """
+    from web_app.traffic_store import TrafficStore
+
+    context = {'startup' : {}, 'app' : False}
+    context['traffic'] = {n : make_traffic(TrafficStore(), n) for n in (100, 1000, 5000)}
+    try:
+        from web_app import query_ontology as qo
+        from web_app import nlu
+    except ImportError as e:
+        print(f"App data not loaded ({e}) : the benchmarks using it are skipped")
+        return context
+    context.update(qo=qo, nlu=nlu)
+
+    tic = time.perf_counter()
+    qo.init_ontology_individuals()
+    context['startup']['startup_load_ontology'] = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    qo.init_dataframes_individuals()
+    context['startup']['startup_load_dataframes'] = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    nlu.load_nlu_engine()
+    context['startup']['startup_load_nlu_engine'] = time.perf_counter() - tic
+
+    context['box'] = qo.get_box_from_center(TOULOUSE, 100)
+    context['app'] = True
+    return context
+
+
+# =======================================================================
+# ===================== BENCHMARKS ======================================
+# =======================================================================
+
+# ---------------- Map queries ----------------
+@benchmark()
+def query_map_near_airports(context):
+    context['qo'].query_map_near_airports(*context['box'])
+
+@benchmark()
+def query_map_near_runways(context):
+    context['qo'].query_map_near_runways(*context['box'])
+
+@benchmark()
+def query_map_near_frequencies(context):
+    context['qo'].query_map_near_frequencies("LFBO")
+
+@benchmark()
+def query_map_near_navaids(context):
+    context['qo'].query_map_near_navaids(*context['box'])
+
+@benchmark()
+def query_map_near_waypoints(context):
+    context['qo'].query_map_near_waypoints(*context['box'])
+
+@benchmark(rounds=10)
+def update_static_data(context):
+    # Same sequence as AirspaceBackgroundWorker.update_static_data()
+    qo = context['qo']
+    surrounding_data = {}
+    qo.get_near_airports(surrounding_data, TOULOUSE)
+    qo.get_near_frequencies(surrounding_data)
+    qo.get_near_runways(surrounding_data, TOULOUSE)
+    qo.get_near_navaids(surrounding_data, TOULOUSE)
+    qo.get_near_waypoints(surrounding_data, TOULOUSE)
+    context['static_data'] = surrounding_data
+
+
+# ---------------- User queries ----------------
+@benchmark(rounds=10)
+def query_nearest_airport(context):
+    context['qo'].query_nearest_airport(*TOULOUSE)
+
+
+def make_intent_benchmark(query_type, arg1, arg2):
+    def bench(context):
+        arg = context['traffic'][1000] if arg1 == 'STORE' else arg1
+        context['qo'].process_query(query_type, arg, arg2, FLIGHT_DATA)
+    bench.__name__ = f"process_query[{query_type}]"
+    return bench
+
+for _query_type, _arg1, _arg2 in OFFLINE_INTENTS:
+    _bench = make_intent_benchmark(_query_type, _arg1, _arg2)
+    BENCHMARKS.append((_bench.__name__, _bench, 10, 1, True))
+
+
+# ---------------- NLU ----------------
+@benchmark()
+def nlu_parse(context):
+    for utterance in UTTERANCES:
+        context['nlu'].nlu_engine.parse(utterance)
+
+
+# ---------------- Emit serialisation ----------------
+def make_emit_benchmark(n_flights):
+    def bench(context):
+        surrounding_data = dict(context.get('static_data', {}))
+        surrounding_data['list_flights'] = context['traffic'][n_flights].to_records(now=time.time())
+        json.dumps(surrounding_data)
+    bench.__name__ = f"emit_airspace[{n_flights}]"
+    return bench
+
+def make_sio_emit_benchmark(n_flights):
+    # Encoding of the app Socket.IO serializer, static layers pre-encoded once (see serializer.py)
+    from web_app.serializer import dumps, Fragment, FragmentDict
+    def bench(context):
+        if 'static_fragments' not in context:
+            context['static_fragments'] = {k : Fragment(v) for k, v in context.get('static_data', {}).items()}
+        message = FragmentDict(list_flights=context['traffic'][n_flights].to_records(now=time.time()))
+        message.update(context['static_fragments'])
+        dumps(['airspace', message])
+    bench.__name__ = f"emit_airspace_sio[{n_flights}]"
+    return bench
+
+for _n_flights in (100, 1000, 5000):
+    for _make in (make_emit_benchmark, make_sio_emit_benchmark):
+        _bench = _make(_n_flights)
+        BENCHMARKS.append((_bench.__name__, _bench, 20, 2, False))
+
+
+# ---------------- Traffic analysis ----------------
+def make_conflicts_benchmark(n_flights):
+    from web_app.conflict_detection import ConflictDetector
+    detector = ConflictDetector()
+    def bench(context):
+        detector.detect(context['traffic'][n_flights])
+    bench.__name__ = f"detect_conflicts[{n_flights}]"
+    return bench
+
+def make_nearest_benchmark(n_flights):
+    from web_app.traffic_index import k_nearest_traffic
+    def bench(context):
+        store = context['traffic'][n_flights]
+        store.version += 1 # index rebuilt, as after a poll
+        k_nearest_traffic(store, FLIGHT_DATA, k=3)
+    bench.__name__ = f"k_nearest_traffic[{n_flights}]"
+    return bench
+
+for _n_flights in (100, 1000, 5000):
+    for _make in (make_conflicts_benchmark, make_nearest_benchmark):
+        _bench = _make(_n_flights)
+        BENCHMARKS.append((_bench.__name__, _bench, 20, 2, False))
+
+
+
+# =======================================================================
+# ===================== MAIN ============================================
+# =======================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the Flight Assistant pipelines")
+    parser.add_argument('-k', dest='filter', default="", help="only run the benchmarks containing this string")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--threshold', type=float, default=1.25, help="regression ratio to the baseline best round")
+    args = parser.parse_args()
+
+    context = make_context()
+    baselines = load_baselines()
+    results = {}
+
+    for name, duration in context['startup'].items():
+        if args.filter in name:
+            results[name] = {'median' : duration, 'min' : duration, 'max' : duration, 'rounds' : 1}
+
+    for name, func, rounds, warmup, needs_app in BENCHMARKS:
+        if args.filter in name and (context['app'] or not needs_app):
+            results[name] = run_benchmark(func, context, rounds, warmup)
+
+    regressions = []
+    print(f"{'benchmark':<45}{'median (ms)':>14}{'best (ms)':>12}{'baseline (ms)':>16}{'ratio':>8}")
+    for name, result in results.items():
+        line = f"{name:<45}{1000 * result['median']:>14.3f}{1000 * result['min']:>12.3f}"
+        baseline = baselines.get(name)
+        if baseline is not None:
+            ratio = result['min'] / baseline['min']
+            line += f"{1000 * baseline['min']:>16.3f}{ratio:>8.2f}"
+            if ratio > args.threshold:
+                line += "  << REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    if args.save:
+        baselines.update(results)
+        save_baselines(baselines)
+        print(f"Baselines saved in {BASELINES_FILE}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) : {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
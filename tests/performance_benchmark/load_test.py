@@ -0,0 +1,246 @@
+"""
+End-to-end load generator: N simulated browsers connected to the Socket.IO server
+
+Each simulated client sends `init_worker`, then periodically `change_focus`, `new_follow`
+(if flight IDs are given) and `/_transcript` requests, and measures the `airspace` messages it receives.
+For each number of clients, the report gives the emit latency (server emit -> client reception),
+the message size, and the CPU / memory of the server processes.
+
+Usage:
+    # Server started by the tool, with a replayed traffic (see src/README.md)
+    python load_test.py --start-server ../../recordings/traffic_xxx.jsonl.gz --clients 1,5,10,25,50
+
+    # Already running server (give its PID to get CPU and memory)
+    python load_test.py --url http://localhost:5000 --server-pid 1234 --clients 1,10
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+import socketio
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "src"))
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+TRANSCRIPTS = [
+    "what is the nearest airport",
+    "what is my current altitude",
+    "give me the landing checklist",
+]
+
+
+# =======================================================================
+# ===================== SERVER MONITORING ===============================
+# =======================================================================
+
+def process_tree(pid):
+    """ Returns the PID of a process and of all its descendants (Linux only)
+    """
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    pids, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        pids.append(current)
+        stack.extend(children.get(current, []))
+    return pids
+
+
+def server_usage(pid):
+    """ Returns (CPU time in s, RSS in MB) of a process tree
+    """
+    cpu, rss = 0, 0
+    for p in process_tree(pid):
+        try:
+            with open(f'/proc/{p}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / CLK_TCK # utime + stime
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) / 1024
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+
+def start_server(recording, port):
+    """ Starts the app like in production (gunicorn + eventlet), with a replayed traffic
+    """
+    env = dict(os.environ, TRAFFIC_REPLAY=os.path.abspath(recording), PORT=str(port))
+    return subprocess.Popen(
+        ["gunicorn", "--worker-class", "eventlet", "-w", "1", "app:app", "-b", f"127.0.0.1:{port}"],
+        cwd=SRC_PATH, env=env)
+
+
+def wait_server(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(1)
+    raise TimeoutError(f"Server {url} not reachable")
+
+
+# =======================================================================
+# ===================== SIMULATED CLIENT ================================
+# =======================================================================
+
+class SimulatedClient:
+    """
+    One simulated browser
+    """
+    def __init__(self, url, flight_ids, action_period):
+        self.url = url
+        self.flight_ids = flight_ids
+        self.action_period = action_period
+        self.latencies = []
+        self.sizes = []
+        self.errors = 0
+        self.switch = True
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on('airspace', self.on_airspace)
+
+
+    def on_airspace(self, msg):
+        received = time.time()
+        if 'emit_time' in msg:
+            self.latencies.append(received - msg['emit_time'])
+        self.sizes.append(len(json.dumps(msg)))
+
+
+    def run(self):
+        try:
+            self.sio.connect(self.url)
+            self.sio.emit('init_worker')
+        except Exception:
+            self.errors += 1
+            return
+
+        while self.switch:
+            time.sleep(random.uniform(0.5, 1.5) * self.action_period)
+            if not self.switch:
+                break
+            try:
+                action = random.choice(['change_focus', 'new_follow', 'transcript'])
+                if action == 'change_focus':
+                    self.sio.emit('change_focus', {
+                        'latitude' : 43.6 + random.uniform(-0.5, 0.5),
+                        'longitude' : 1.45 + random.uniform(-0.5, 0.5),
+                        'follow' : False,
+                    })
+                elif action == 'new_follow' and self.flight_ids:
+                    flight_id = random.choice(self.flight_ids)
+                    self.sio.emit('new_follow', {'flight_id' : flight_id, 'label' : flight_id})
+                elif action == 'transcript':
+                    requests.get(f"{self.url}/_transcript",
+                                 params={'transcript' : random.choice(TRANSCRIPTS)}, timeout=10)
+            except Exception:
+                self.errors += 1
+
+
+    def stop(self):
+        self.switch = False
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+
+def run_step(url, n_clients, duration, flight_ids, action_period, server_pid):
+    """ Runs n_clients during duration seconds and returns the measures
+    """
+    clients = [SimulatedClient(url, flight_ids, action_period) for _ in range(n_clients)]
+    threads = [threading.Thread(target=c.run, daemon=True) for c in clients]
+
+    usage_start = server_usage(server_pid) if server_pid else None
+    tic = time.time()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    for c in clients:
+        c.stop()
+    elapsed = time.time() - tic
+    usage_end = server_usage(server_pid) if server_pid else None
+
+    latencies = sorted(l for c in clients for l in c.latencies)
+    sizes = [s for c in clients for s in c.sizes]
+    result = {
+        'clients' : n_clients,
+        'messages_per_s' : len(sizes) / elapsed,
+        'latency_median_ms' : 1000 * statistics.median(latencies) if latencies else None,
+        'latency_p95_ms' : 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        'message_kb' : statistics.mean(sizes) / 1024 if sizes else None,
+        'errors' : sum(c.errors for c in clients),
+    }
+    if server_pid:
+        result['cpu_percent'] = 100 * (usage_end[0] - usage_start[0]) / elapsed
+        result['rss_mb'] = usage_end[1]
+    return result
+
+
+def format_value(value, fmt):
+    return format(value, fmt) if value is not None else "N/A"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO load generator for the Flight Assistant server")
+    parser.add_argument('--url', default="http://127.0.0.1:5000")
+    parser.add_argument('--start-server', metavar='RECORDING', help="start gunicorn with this replayed traffic recording")
+    parser.add_argument('--server-pid', type=int, help="PID of an already running server (CPU / memory measures)")
+    parser.add_argument('--clients', default="1,5,10,25", help="comma separated numbers of clients")
+    parser.add_argument('--duration', type=float, default=30, help="duration of each step in seconds")
+    parser.add_argument('--action-period', type=float, default=5, help="mean time between two client actions in seconds")
+    parser.add_argument('--flight-ids', default="", help="comma separated flight IDs used for new_follow")
+    parser.add_argument('--output', help="JSON file where the results are written")
+    args = parser.parse_args()
+
+    server = None
+    server_pid = args.server_pid
+    if args.start_server:
+        port = int(args.url.rsplit(':', 1)[1])
+        server = start_server(args.start_server, port)
+        server_pid = server.pid
+    wait_server(args.url)
+
+    flight_ids = [f for f in args.flight_ids.split(',') if f]
+    results = []
+    try:
+        print(f"{'clients':>8}{'msg/s':>10}{'lat. med (ms)':>15}{'lat. p95 (ms)':>15}{'msg (kB)':>10}{'CPU %':>8}{'RSS (MB)':>10}{'errors':>8}")
+        for n_clients in [int(n) for n in args.clients.split(',')]:
+            r = run_step(args.url, n_clients, args.duration, flight_ids, args.action_period, server_pid)
+            results.append(r)
+            print(f"{r['clients']:>8}{r['messages_per_s']:>10.1f}"
+                  f"{format_value(r['latency_median_ms'], '.1f'):>15}{format_value(r['latency_p95_ms'], '.1f'):>15}"
+                  f"{format_value(r['message_kb'], '.1f'):>10}{format_value(r.get('cpu_percent'), '.1f'):>8}"
+                  f"{format_value(r.get('rss_mb'), '.0f'):>10}{r['errors']:>8}")
+            sys.stdout.flush()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()